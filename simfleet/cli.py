@@ -3,7 +3,6 @@
 """Console script for SimFleet."""
 import logging
 import sys
-import time
 
 import click
 from loguru import logger
@@ -32,6 +31,12 @@ from .simulator import SimulatorAgent
     help="Run simulation as soon as the agents are ready.",
     is_flag=True,
 )
+@click.option(
+    "-ts",
+    "--time-scale",
+    help="Speed multiplier of the simulation clock. (default: 1)",
+    type=float,
+)
 @click.option("-c", "--config", help="Filename of JSON file with initial config.")
 @click.option(
     "-v",
@@ -39,7 +44,7 @@ from .simulator import SimulatorAgent
     count=True,
     help="Show verbose debug level: -v level 1, -vv level 2, -vvv level 3, -vvvv level 4",
 )
-def main(name, output, oformat, max_time, autorun, config, verbose):
+def main(name, output, oformat, max_time, autorun, time_scale, config, verbose):
     """
     Console script for SimFleet.
     """
@@ -62,7 +67,7 @@ def main(name, output, oformat, max_time, autorun, config, verbose):
     else:
         logging.getLogger("aioxmpp").setLevel(logging.WARNING)
 
-    simfleet_config = SimfleetConfig(config, name, max_time, verbose)
+    simfleet_config = SimfleetConfig(config, name, max_time, verbose, time_scale)
 
     simulator_name = "simulator_{}@{}".format(name, simfleet_config.host)
 
@@ -72,11 +77,10 @@ def main(name, output, oformat, max_time, autorun, config, verbose):
     if autorun:
         simulator.run()
 
-    while not simulator.is_simulation_finished():
-        try:
-            time.sleep(0.5)
-        except KeyboardInterrupt:
-            break
+    try:
+        simulator.wait_until_finished()
+    except KeyboardInterrupt:
+        pass
 
     simulator.stop().result()
     if output:
@@ -0,0 +1,287 @@
+"""
+Clock module
+
+All the time-based behaviours of the simulation (movement, charging, delayed launches and the time statistics) read
+the time from a single process-wide clock. By default it is the wall clock, but it can be replaced by a
+:class:`DiscreteEventClock`, where sleeping agents are scheduled as events in a priority queue and the clock jumps
+straight to the next event, once the simulation is idle, instead of waiting for it.
+
+The work that takes real time to complete (e.g. a route request) is wrapped in :func:`Clock.busy`, so the discrete
+event clock does not jump while it is in flight.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+
+from loguru import logger
+from spade import behaviour
+
+
+class Clock(object, metaclass=ABCMeta):
+    """
+    Base class of the simulation clocks.
+    """
+
+    @abstractmethod
+    def time(self):
+        """
+        Returns the current time.
+
+        Returns:
+            float: the current time in seconds since the epoch
+        """
+        raise NotImplementedError
+
+    def now(self):
+        """
+        Returns the current time as a datetime, as used by the ``start_at`` argument of the behaviours.
+
+        Returns:
+            datetime.datetime: the current time
+        """
+        return datetime.fromtimestamp(self.time())
+
+    @abstractmethod
+    async def sleep(self, seconds):
+        """
+        Suspends the calling coroutine for some seconds of clock time.
+
+        Args:
+            seconds (float): the seconds to sleep
+        """
+        raise NotImplementedError
+
+    def hold(self):
+        """
+        Registers a piece of outstanding work (e.g. a route request) that the clock must wait for.
+        """
+        pass
+
+    def release(self):
+        """
+        Marks a piece of outstanding work registered with :func:`hold` as finished.
+        """
+        pass
+
+    @contextmanager
+    def busy(self):
+        """
+        A context manager that holds the clock while the work inside it is in flight::
+
+            with get_clock().busy():
+                path, distance, duration = await request_route(...)
+        """
+        self.hold()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self):
+        """
+        Drives the clock. It runs until :func:`stop` is called. The wall clock does not need to be driven.
+        """
+        pass
+
+    def stop(self):
+        """
+        Stops driving the clock.
+        """
+        pass
+
+
+class RealTimeClock(Clock):
+    """
+    The wall clock, optionally accelerated by a constant factor.
+    """
+
+    def __init__(self, time_scale=1.0):
+        """
+        Args:
+            time_scale (float): how many clock seconds elapse in a real second
+        """
+        if time_scale <= 0:
+            raise ValueError("The time scale must be greater than zero.")
+        self.time_scale = time_scale
+        self._origin = time.time()
+
+    def time(self):
+        if self.time_scale == 1:
+            return time.time()
+        return self._origin + (time.time() - self._origin) * self.time_scale
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self.time_scale)
+
+
+class DiscreteEventClock(Clock):
+    """
+    A clock that only moves forward when the simulation is idle. Each call to :func:`sleep` is scheduled as an event.
+    The clock jumps to the next event and wakes it up once the simulation has been idle for ``settle`` (real)
+    seconds. The simulation is idle when there is no outstanding work (see :func:`Clock.busy`) and the ``pending``
+    function, if any, reports no pending work (e.g. messages waiting in the mailboxes of the agents). While no event is
+    scheduled the clock waits for one without polling.
+    """
+
+    def __init__(self, settle=0.01, resolution=0.1, start=None, pending=None):
+        """
+        Args:
+            settle (float): real seconds the simulation must be idle before the clock jumps to the next event
+            resolution (float): events closer than these seconds are woken up together
+            start (float, optional): the initial time in seconds since the epoch (default: the current time)
+            pending (function, optional): a function that returns the amount of pending work (0 when idle)
+        """
+        self.settle = settle
+        self.resolution = resolution
+        self.pending = pending
+        self._now = time.time() if start is None else start
+        self._events = []
+        self._counter = itertools.count()
+        self._running = False
+        self._holds = 0
+        self._wakeup = None
+
+    def time(self):
+        return self._now
+
+    def __len__(self):
+        return len(self._events)
+
+    def hold(self):
+        self._holds += 1
+
+    def release(self):
+        self._holds -= 1
+
+    def is_idle(self):
+        """
+        Returns:
+            bool: whether there is no outstanding nor pending work
+        """
+        return self._holds <= 0 and (self.pending is None or not self.pending())
+
+    def _wake(self):
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def sleep(self, seconds):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._events, (self._now + seconds, next(self._counter), future))
+        self._wake()
+        await future
+
+    def advance(self):
+        """
+        Jumps to the next event and wakes up all the events within ``resolution`` seconds of it.
+
+        Returns:
+            int: the number of woken up events
+        """
+        woken = 0
+        while self._events and woken == 0:
+            limit = self._events[0][0] + self.resolution
+            while self._events and self._events[0][0] <= limit:
+                at, _, future = heapq.heappop(self._events)
+                if future.done():  # the sleeping behaviour was cancelled
+                    continue
+                self._now = max(self._now, at)
+                future.set_result(None)
+                woken += 1
+        return woken
+
+    async def wait_idle(self):
+        """
+        Waits until the simulation has been idle for ``settle`` seconds.
+        """
+        while self._running:
+            await asyncio.sleep(self.settle)
+            if self.is_idle():
+                return
+
+    async def run(self):
+        self._running = True
+        logger.info("Discrete event clock started.")
+        while self._running:
+            if not self._events:
+                self._wakeup = asyncio.get_event_loop().create_future()
+                await self._wakeup
+                self._wakeup = None
+                continue
+            await self.wait_idle()
+            if self._running:
+                self.advance()
+
+    def stop(self):
+        self._running = False
+        self._wake()
+
+
+_clock = RealTimeClock()
+
+
+def set_clock(clock):
+    """
+    Sets the process-wide simulation clock.
+
+    Args:
+        clock (Clock): the clock, or None to use the wall clock
+    """
+    global _clock
+    _clock = clock if clock is not None else RealTimeClock()
+
+
+def get_clock():
+    """
+    Returns the process-wide simulation clock.
+
+    Returns:
+        Clock: the clock
+    """
+    return _clock
+
+
+class PeriodicBehaviour(behaviour.PeriodicBehaviour, metaclass=ABCMeta):
+    """
+    A ``spade.behaviour.PeriodicBehaviour`` that follows the simulation clock.
+    """
+
+    def __init__(self, period, start_at=None):
+        super().__init__(period, start_at=start_at)
+        if not start_at:
+            self._next_activation = get_clock().now()
+
+    async def _run(self):
+        clock = get_clock()
+        if clock.now() >= self._next_activation:
+            await self.run()
+            if self.period.total_seconds() <= 0:
+                self._next_activation = clock.now()
+            else:
+                while self._next_activation <= clock.now():
+                    self._next_activation += self.period
+        else:
+            seconds = (self._next_activation - clock.now()).total_seconds()
+            if seconds > 0:
+                await clock.sleep(seconds)
+
+
+class TimeoutBehaviour(behaviour.TimeoutBehaviour, metaclass=ABCMeta):
+    """
+    A ``spade.behaviour.TimeoutBehaviour`` that follows the simulation clock.
+    """
+
+    async def _run(self):
+        clock = get_clock()
+        seconds = (self._timeout - clock.now()).total_seconds()
+        if seconds > 0:
+            await clock.sleep(seconds)
+        await self.run()
+        self._timeout_triggered = True
@@ -21,7 +21,9 @@ class SimfleetConfig(object):
     A scenario object reads a file with a JSON representation of a scenario and is used to create the participant agents.
     """
 
-    def __init__(self, filename=None, name=None, max_time=None, verbose=None):
+    def __init__(
+        self, filename=None, name=None, max_time=None, verbose=None, time_scale=None
+    ):
         """
         The SimfleetConfig constructor reads the JSON file and sets.
         Args:
@@ -42,6 +44,11 @@ class SimfleetConfig(object):
         self.__config["max_time"] = self.__config.get("max_time", max_time)
         self.__config["verbose"] = self.__config.get("verbose", verbose)
 
+        self.__config["time_scale"] = self.__config.get("time_scale", time_scale) or 1
+        self.__config["discrete_events"] = self.__config.get("discrete_events", False)
+        self.__config["clock_settle"] = self.__config.get("clock_settle", 0.01)
+        self.__config["clock_resolution"] = self.__config.get("clock_resolution", 0.1)
+
         self.__config["coords"] = self.__config.get("coords", [39.47, -0.37])
         self.__config["zoom"] = self.__config.get("zoom", 12)
 
@@ -67,8 +74,74 @@ class SimfleetConfig(object):
         self.__config["fleetmanager_password"] = self.__config.get(
             "fleetmanager_passwd", "fleetmanager_passwd"
         )
-        self.__config["route_host"] = self.__config.get(
-            "route_host", "http://router.project-osrm.org/"
+        route_hosts = self.__config.get("route_host", "http://router.project-osrm.org/")
+        if not isinstance(route_hosts, list):
+            route_hosts = [route_hosts]
+        self.__config["route_hosts"] = route_hosts
+        # the first host names the routing service of the agents (e.g. to coalesce their requests)
+        first_host = route_hosts[0]
+        self.__config["route_host"] = (
+            first_host["url"] if isinstance(first_host, dict) else first_host
+        )
+        self.__config["route_balancing"] = self.__config.get(
+            "route_balancing", "round_robin"
+        )
+        self.__config["route_host_max_concurrency"] = self.__config.get(
+            "route_host_max_concurrency", 0
+        )
+        self.__config["route_health_interval"] = self.__config.get(
+            "route_health_interval", 10
+        )
+        self.__config["route_host_timeout"] = self.__config.get(
+            "route_host_timeout", 5
+        )
+        self.__config["route_geometry"] = self.__config.get(
+            "route_geometry", "polyline6"
+        )
+        self.__config["route_overview"] = self.__config.get("route_overview", "full")
+        self.__config["route_warmup"] = self.__config.get("route_warmup", False)
+        self.__config["route_warmup_concurrency"] = self.__config.get(
+            "route_warmup_concurrency", 50
+        )
+        self.__config["route_warmup_neighbours"] = self.__config.get(
+            "route_warmup_neighbours", 3
+        )
+        self.__config["route_warmup_timeout"] = self.__config.get(
+            "route_warmup_timeout", 60
+        )
+        self.__config["route_backend"] = self.__config.get(
+            "route_backend", "simfleet.routing.OSRMBackend"
+        )
+        self.__config["route_graph"] = self.__config.get("route_graph", None)
+        self.__config["route_cache_size"] = self.__config.get(
+            "route_cache_size", 10000
+        )
+        self.__config["route_cache_file"] = self.__config.get("route_cache_file", None)
+        self.__config["route_cache_precision"] = self.__config.get(
+            "route_cache_precision", 5
+        )
+        self.__config["route_max_connections"] = self.__config.get(
+            "route_max_connections", 100
+        )
+        self.__config["route_max_connections_per_host"] = self.__config.get(
+            "route_max_connections_per_host", 0
+        )
+        self.__config["route_max_concurrency"] = self.__config.get(
+            "route_max_concurrency", 100
+        )
+        self.__config["route_keepalive"] = self.__config.get("route_keepalive", 30)
+        self.__config["route_timeout"] = self.__config.get("route_timeout", 10)
+        self.__config["route_retries"] = self.__config.get("route_retries", 3)
+        self.__config["route_backoff"] = self.__config.get("route_backoff", 0.5)
+        self.__config["route_breaker_threshold"] = self.__config.get(
+            "route_breaker_threshold", 5
+        )
+        self.__config["route_breaker_cooldown"] = self.__config.get(
+            "route_breaker_cooldown", 30
+        )
+        self.__config["route_fallback"] = self.__config.get("route_fallback", None)
+        self.__config["distance_method"] = self.__config.get(
+            "distance_method", "haversine"
         )
         self.__config["route_name"] = self.__config.get("route_name", "route")
         self.__config["route_password"] = self.__config.get(
@@ -83,8 +156,19 @@ class SimfleetConfig(object):
 
         self.__config["host"] = self.__config.get("host", "127.0.0.1")
         self.__config["xmpp_port"] = self.__config.get("xmpp_port", 5222)
+        self.__config["local_messaging"] = self.__config.get("local_messaging", False)
+        self.__config["lightweight_agents"] = self.__config.get(
+            "lightweight_agents", False
+        )
+        self.__config["startup_window"] = self.__config.get("startup_window", 20)
+        self.__config["startup_max_window"] = self.__config.get(
+            "startup_max_window", 200
+        )
+        self.__config["startup_retries"] = self.__config.get("startup_retries", 3)
+        self.__config["startup_timeout"] = self.__config.get("startup_timeout", 30)
         self.__config["http_port"] = self.__config.get("http_port", 9000)
         self.__config["http_ip"] = self.__config.get("http_ip", "127.0.0.1")
+        self.__config["stream_fps"] = self.__config.get("stream_fps", 10)
 
         logger.debug("Config loaded: {}".format(self))
 
@@ -1,5 +1,4 @@
 import json
-import time
 from asyncio import CancelledError
 
 from loguru import logger
@@ -8,6 +7,9 @@ from spade.behaviour import CyclicBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from .clock import get_clock
+from .frames import get_entity_registry
+from .messaging import LightweightAgentMixin
 from .helpers import random_position
 from .protocol import (
     REQUEST_PROTOCOL,
@@ -17,6 +19,7 @@ from .protocol import (
     REFUSE_PERFORMATIVE,
     QUERY_PROTOCOL,
 )
+from .stats import get_stats_aggregator
 from .utils import (
     CUSTOMER_WAITING,
     CUSTOMER_IN_DEST,
@@ -25,14 +28,16 @@ from .utils import (
     TRANSPORT_IN_CUSTOMER_PLACE,
     CUSTOMER_LOCATION,
     StrategyBehaviour,
+    next_version,
     request_path,
     status_to_str,
 )
 
 
-class CustomerAgent(Agent):
+class CustomerAgent(LightweightAgentMixin, Agent):
     def __init__(self, agentjid, password):
         super().__init__(agentjid, password)
+        self.version = 0
         self.agent_id = None
         self.strategy = None
         self.icon = None
@@ -41,7 +46,7 @@ class CustomerAgent(Agent):
         self.fleetmanagers = None
         self.route_host = None
         self.status = CUSTOMER_WAITING
-        self.current_pos = None
+        self._current_pos = None
         self.dest = None
         self.port = None
         self.transport_assigned = None
@@ -89,9 +94,68 @@ class CustomerAgent(Agent):
             template1.set_metadata("protocol", REQUEST_PROTOCOL)
             template2 = Template()
             template2.set_metadata("protocol", QUERY_PROTOCOL)
+            # the customer is registered here and not in the strategy, which can be replaced
+            self.init_time = get_clock().time()
+            get_stats_aggregator().customer_started(self.name, self.init_time)
             self.add_behaviour(self.strategy(), template1 | template2)
             self.running_strategy = True
 
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        self._status = status
+        self.touch()
+        get_entity_registry().customers.set_status(self.name, status)
+
+    @property
+    def current_pos(self):
+        """
+        The position of the customer. While it travels in a transport of the same process, it is the position of
+        the transport, so the transport does not need to send it a message at every step.
+        """
+        if self.status == CUSTOMER_IN_TRANSPORT and self.transport_assigned:
+            transport = self.transport_assigned.split("@")[0]
+            position = get_entity_registry().transports.get_position(transport)
+            if position is not None:
+                return position
+        return self._current_pos
+
+    @current_pos.setter
+    def current_pos(self, position):
+        self._current_pos = position
+
+    @property
+    def is_launched(self):
+        return self._is_launched
+
+    @is_launched.setter
+    def is_launched(self, launched):
+        self._is_launched = launched
+        get_entity_registry().customers.set_visible(self.name, launched)
+
+    def touch(self):
+        """
+        Marks the customer as changed for the delta updates of the web interface.
+        """
+        self.version = next_version()
+
+    def changed_since(self, version):
+        """
+        Returns whether the customer has to be sent in a delta update of the web interface.
+        The customers that are waiting to be picked up always change, since their waiting time keeps growing.
+
+        Args:
+            version (int): the change sequence number of the last update
+
+        Returns:
+            bool: whether the customer changed after the given version
+        """
+        waiting = self.init_time and not self.pickup_time and not self.stopped
+        return self.version > version or bool(waiting)
+
     def set_id(self, agent_id):
         """
         Sets the agent identifier
@@ -150,6 +214,8 @@ class CustomerAgent(Agent):
             self.current_pos = coords
         else:
             self.current_pos = random_position()
+        self.touch()
+        get_entity_registry().customers.set_position(self.name, self._current_pos)
         logger.debug(
             "Customer {} position is {}".format(self.agent_id, self.current_pos)
         )
@@ -175,6 +241,7 @@ class CustomerAgent(Agent):
             self.dest = coords
         else:
             self.dest = random_position()
+        self.touch()
         logger.debug(
             "Customer {} target position is {}".format(self.agent_id, self.dest)
         )
@@ -234,7 +301,7 @@ class CustomerAgent(Agent):
             if self.pickup_time:
                 t = self.pickup_time - self.init_time
             elif not self.stopped:
-                t = time.time() - self.init_time
+                t = get_clock().time() - self.init_time
                 self.waiting_for_pickup_time = t
             else:
                 t = self.waiting_for_pickup_time
@@ -315,14 +382,22 @@ class TravelBehaviour(CyclicBehaviour):
                     logger.info(
                         "Customer {} waiting for transport.".format(self.agent.name)
                     )
-                    self.agent.waiting_for_pickup_time = time.time()
+                    self.agent.waiting_for_pickup_time = get_clock().time()
                 elif status == TRANSPORT_IN_CUSTOMER_PLACE:
                     self.agent.status = CUSTOMER_IN_TRANSPORT
                     logger.info("Customer {} in transport.".format(self.agent.name))
-                    self.agent.pickup_time = time.time()
+                    self.agent.pickup_time = get_clock().time()
+                    get_stats_aggregator().customer_picked_up(
+                        self.agent.name, self.agent.init_time, self.agent.pickup_time
+                    )
                 elif status == CUSTOMER_IN_DEST:
+                    if "location" in content:
+                        self.agent.set_position(content["location"])
                     self.agent.status = CUSTOMER_IN_DEST
-                    self.agent.end_time = time.time()
+                    self.agent.end_time = get_clock().time()
+                    get_stats_aggregator().customer_in_destination(
+                        self.agent.name, self.agent.init_time, self.agent.end_time
+                    )
                     logger.info(
                         "Customer {} arrived to destination after {} seconds.".format(
                             self.agent.name, self.agent.total_time()
@@ -354,14 +429,13 @@ class CustomerStrategyBehaviour(StrategyBehaviour):
 
     async def on_start(self):
         """
-        Initializes the logger and timers. Call to parent method if overloaded.
+        Initializes the logger. Call to parent method if overloaded.
         """
         logger.debug(
             "Strategy {} started in customer {}".format(
                 type(self).__name__, self.agent.name
             )
         )
-        self.agent.init_time = time.time()
 
     async def send_get_managers(self, content=None):
         """
@@ -443,6 +517,7 @@ class CustomerStrategyBehaviour(StrategyBehaviour):
         reply.body = json.dumps(content)
         await self.send(reply)
         self.agent.transport_assigned = str(transport_id)
+        self.agent.touch()
         logger.info(
             "Customer {} accepted proposal from transport {}".format(
                 self.agent.name, transport_id
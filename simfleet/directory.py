@@ -6,6 +6,7 @@ from spade.agent import Agent
 from spade.message import Message
 from spade.template import Template
 
+from .messaging import LightweightAgentMixin
 from .protocol import (
     REGISTER_PROTOCOL,
     INFORM_PERFORMATIVE,
@@ -17,7 +18,7 @@ from .protocol import (
 from .utils import StrategyBehaviour, CyclicBehaviour
 
 
-class DirectoryAgent(Agent):
+class DirectoryAgent(LightweightAgentMixin, Agent):
     def __init__(self, agentjid, password):
         super().__init__(jid=agentjid, password=password)
         self.strategy = None
@@ -10,19 +10,28 @@ from spade.behaviour import CyclicBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from .messaging import LightweightAgentMixin
 from .protocol import (
     REQUEST_PROTOCOL,
     REGISTER_PROTOCOL,
     ACCEPT_PERFORMATIVE,
     REQUEST_PERFORMATIVE,
     REFUSE_PERFORMATIVE,
+    INFORM_PERFORMATIVE,
+    POSITION_PROTOCOL,
+)
+from .spatial import GridIndex
+from .utils import (
+    TRANSPORT_WAITING,
+    StrategyBehaviour,
+    request_routes_to_server,
+    request_table_to_server,
 )
-from .utils import StrategyBehaviour
 
 faker_factory = faker.Factory.create()
 
 
-class FleetManagerAgent(Agent):
+class FleetManagerAgent(LightweightAgentMixin, Agent):
     """
     FleetManager agent that manages the requests between transports and customers
     """
@@ -32,6 +41,7 @@ class FleetManagerAgent(Agent):
         super().__init__(jid=agentjid, password=password)
         self.strategy = None
         self.running_strategy = False
+        self.route_host = None
         self.transports_in_fleet = 0
         self.agent_id = None
         self.fleet_type = None
@@ -51,6 +61,7 @@ class FleetManagerAgent(Agent):
         Resets the set of transports and customers. Resets the simulation clock.
         """
         self.set("transport_agents", {})
+        self.transport_index = GridIndex()
 
     async def setup(self):
         logger.info("FleetManager agent {} running".format(self.name))
@@ -66,6 +77,9 @@ class FleetManagerAgent(Agent):
                     )
                 )
                 self.add_behaviour(register_behaviour, template)
+            template = Template()
+            template.set_metadata("protocol", POSITION_PROTOCOL)
+            self.add_behaviour(TransportPositionBehaviour(), template)
             self.ready = True
         except Exception as e:
             logger.error(
@@ -123,6 +137,15 @@ class FleetManagerAgent(Agent):
         """
         self.fleet_type = fleet_type
 
+    def set_route_host(self, route_host):
+        """
+        Sets the route host server address
+        Args:
+            route_host (str): route host server address
+
+        """
+        self.route_host = route_host
+
 
 class TransportRegistrationForFleetBehaviour(CyclicBehaviour):
     async def on_start(self):
@@ -137,6 +160,10 @@ class TransportRegistrationForFleetBehaviour(CyclicBehaviour):
         """
         self.agent.transports_in_fleet += 1
         self.get("transport_agents")[agent["name"]] = agent
+        if agent.get("position"):
+            self.agent.transport_index.update(
+                agent["name"], agent["position"], agent.get("status")
+            )
 
     def remove_transport(self, key):
         """
@@ -147,6 +174,7 @@ class TransportRegistrationForFleetBehaviour(CyclicBehaviour):
         """
         if key in self.get("transport_agents"):
             del self.get("transport_agents")[key]
+            self.agent.transport_index.remove(key)
             logger.debug("Deregistration of the TransporterAgent {}".format(key))
             self.agent.transports_in_fleet -= 1
         else:
@@ -157,7 +185,12 @@ class TransportRegistrationForFleetBehaviour(CyclicBehaviour):
         Send a ``spade.message.Message`` with an acceptance to transport to register in the fleet.
         """
         reply = Message()
-        content = {"icon": self.agent.fleet_icon, "fleet_type": self.agent.fleet_type}
+        content = {
+            "icon": self.agent.fleet_icon,
+            "fleet_type": self.agent.fleet_type,
+            # the transports only inform of their positions if the strategy needs them
+            "spatial_index": getattr(self.agent.strategy, "uses_spatial_index", False),
+        }
         reply.to = str(agent_id)
         reply.set_metadata("protocol", REGISTER_PROTOCOL)
         reply.set_metadata("performative", ACCEPT_PERFORMATIVE)
@@ -204,6 +237,21 @@ class TransportRegistrationForFleetBehaviour(CyclicBehaviour):
             )
 
 
+class TransportPositionBehaviour(CyclicBehaviour):
+    """
+    Keeps the spatial index of the fleet up to date with the positions and statuses informed by the transports.
+    """
+
+    async def run(self):
+        msg = await self.receive(timeout=5)
+        if msg and msg.get_metadata("performative") == INFORM_PERFORMATIVE:
+            content = json.loads(msg.body)
+            if content["name"] in self.get("transport_agents") and content["position"]:
+                self.agent.transport_index.update(
+                    content["name"], content["position"], content["status"]
+                )
+
+
 class FleetManagerStrategyBehaviour(StrategyBehaviour):
     """
     Class from which to inherit to create a coordinator strategy.
@@ -211,8 +259,16 @@ class FleetManagerStrategyBehaviour(StrategyBehaviour):
 
     Helper functions:
         * :func:`get_transport_agents`
+        * :func:`get_nearest_transports`
+        * :func:`request_table`
+        * :func:`request_routes`
+
+    Strategies that use :func:`get_nearest_transports` must set ``uses_spatial_index`` to True, so the transports
+    of the fleet inform the manager of their position every time their status changes.
     """
 
+    uses_spatial_index = False
+
     async def on_start(self):
         logger.debug("Strategy {} started in manager".format(type(self).__name__))
 
@@ -225,6 +281,23 @@ class FleetManagerStrategyBehaviour(StrategyBehaviour):
         """
         return self.get("transport_agents")
 
+    def get_nearest_transports(self, position, k=1, free=True):
+        """
+        Gets the registered transports closest (as the crow flies) to a position using the spatial index of the fleet.
+
+        Args:
+            position (list): the coordinates (latitude, longitude)
+            k (int): the maximum number of transports to return
+            free (bool): whether to return only the transports that are waiting for a customer
+
+        Returns:
+            list: a list of transports sorted by distance
+        """
+        condition = (lambda key, status: status == TRANSPORT_WAITING) if free else None
+        transports = self.get_transport_agents()
+        nearest = self.agent.transport_index.nearest(position, k, condition)
+        return [transports[key] for key, _ in nearest if key in transports]
+
     async def send_registration(self):
         """
         Send a ``spade.message.Message`` with a proposal to directory to register.
@@ -242,5 +315,33 @@ class FleetManagerStrategyBehaviour(StrategyBehaviour):
         msg.body = json.dumps(content)
         await self.send(msg)
 
+    async def request_table(self, sources, destinations):
+        """
+        Requests the durations and distances between every source and every destination using the route server
+        in a single batch (OSRM table service).
+
+        Args:
+            sources (list): a list of origin coordinates
+            destinations (list): a list of target coordinates
+
+        Returns:
+            list, list: the durations matrix and the distances matrix indexed by [source][destination]
+        """
+        return await request_table_to_server(
+            sources, destinations, self.agent.route_host
+        )
+
+    async def request_routes(self, pairs):
+        """
+        Requests a batch of paths concurrently using the route server.
+
+        Args:
+            pairs (list): a list of (origin, destination) coordinate pairs
+
+        Returns:
+            list: a list with a (path, distance, duration) tuple for each pair
+        """
+        return await request_routes_to_server(pairs, self.agent.route_host)
+
     async def run(self):
         raise NotImplementedError
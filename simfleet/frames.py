@@ -0,0 +1,235 @@
+"""
+Frames module
+
+Keeps the position and status of every transport, customer and station in preallocated NumPy arrays, updated by the
+agents themselves, so the state of the whole simulation can be packed into a compact binary frame without building
+a dict per agent. The agents of the same process can also read each other's position from it (e.g. a customer
+travelling in a transport is wherever the transport is) instead of exchanging messages.
+
+A binary frame is made of little-endian 32-bit values. It starts with a header::
+
+    magic (4 bytes: b"SFB1"), epoch (uint32), cursor (uint32),
+    number of transports (uint32), number of customers (uint32), number of stations (uint32)
+
+followed, for the transports, the customers and the stations, by four arrays of their length::
+
+    ids (int32), latitudes (float32), longitudes (float32), status codes (int32)
+
+The ids are the indexes of the names returned by :meth:`EntityRegistry.names` and the status codes are the ones used by
+:func:`simfleet.utils.status_to_str` (0 for an unknown status).
+"""
+
+import struct
+
+import numpy as np
+
+from .utils import status_to_code
+
+MAGIC = b"SFB1"
+HEADER = struct.Struct("<4s5I")
+
+
+class EntityArrays(object):
+    """
+    The positions and statuses of a set of agents, stored in arrays indexed by a slot assigned to each agent.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        Args:
+            capacity (int): the number of agents the arrays are allocated for (they grow as needed)
+        """
+        self.names = []
+        self.slots = {}
+        self.latitudes = np.zeros(capacity)
+        self.longitudes = np.zeros(capacity)
+        self.located = np.zeros(capacity, dtype=bool)
+        self.statuses = np.zeros(capacity, dtype=np.int32)
+        self.visible = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return int(self.visible[: len(self.names)].sum())
+
+    def slot(self, name):
+        """
+        Returns the slot of an agent, assigning a new one if it has none.
+
+        Args:
+            name (str): the name of the agent
+
+        Returns:
+            int: the slot of the agent
+        """
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = len(self.names)
+            if slot == len(self.visible):
+                self._grow()
+            self.names.append(name)
+            self.slots[name] = slot
+        return slot
+
+    def _grow(self):
+        capacity = 2 * len(self.visible)
+        for attr in ("latitudes", "longitudes", "located", "statuses", "visible"):
+            old = getattr(self, attr)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, attr, new)
+
+    def set_position(self, name, position):
+        """
+        Args:
+            name (str): the name of the agent
+            position (list): the coordinates of the agent (latitude, longitude), or None
+        """
+        if position is None:
+            return
+        slot = self.slot(name)
+        self.latitudes[slot] = position[0]
+        self.longitudes[slot] = position[1]
+        self.located[slot] = True
+
+    def get_position(self, name):
+        """
+        Args:
+            name (str): the name of the agent
+
+        Returns:
+            list: the coordinates of the agent (latitude, longitude), or None if it has not been located
+        """
+        slot = self.slots.get(name)
+        if slot is None or not self.located[slot]:
+            return None
+        return [float(self.latitudes[slot]), float(self.longitudes[slot])]
+
+    def set_status(self, name, status):
+        """
+        Args:
+            name (str): the name of the agent
+            status (str): the status of the agent
+        """
+        self.statuses[self.slot(name)] = status_to_code(status)
+
+    def set_visible(self, name, visible=True):
+        """
+        Sets whether an agent is included in the frames (e.g. once it has been launched).
+
+        Args:
+            name (str): the name of the agent
+            visible (bool): whether the agent is included
+        """
+        self.visible[self.slot(name)] = visible
+
+    def pack(self):
+        """
+        Returns:
+            int, bytes: the number of visible agents and their ids, latitudes, longitudes and status codes
+        """
+        ids = np.flatnonzero(self.visible[: len(self.names)]).astype("<i4")
+        arrays = (
+            ids,
+            self.latitudes[ids].astype("<f4"),
+            self.longitudes[ids].astype("<f4"),
+            self.statuses[ids].astype("<i4"),
+        )
+        return len(ids), b"".join(array.tobytes() for array in arrays)
+
+
+class EntityRegistry(object):
+    """
+    The array-backed state of the transports, customers and stations of a simulation.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all the agents.
+        """
+        self.transports = EntityArrays()
+        self.customers = EntityArrays()
+        self.stations = EntityArrays()
+
+    def names(self):
+        """
+        Returns:
+            dict: the names of the transports, customers and stations, indexed by their id in the binary frames
+        """
+        return {
+            "transports": list(self.transports.names),
+            "customers": list(self.customers.names),
+            "stations": list(self.stations.names),
+        }
+
+    def pack(self, epoch=0, cursor=0):
+        """
+        Packs the visible agents in a binary frame.
+
+        Args:
+            epoch (int): the epoch of the simulation, as in the entities controller
+            cursor (int): the change sequence number of the frame
+
+        Returns:
+            bytes: the binary frame
+        """
+        kinds = (self.transports, self.customers, self.stations)
+        counts, bodies = zip(*(arrays.pack() for arrays in kinds))
+        return HEADER.pack(MAGIC, epoch, cursor, *counts) + b"".join(bodies)
+
+
+def unpack(frame):
+    """
+    Decodes a binary frame.
+
+    Args:
+        frame (bytes): the binary frame
+
+    Returns:
+        dict: the epoch, cursor and, for the transports, customers and stations, a dict of NumPy arrays with their
+              ids, latitudes, longitudes and status codes
+    """
+    magic, epoch, cursor, *counts = HEADER.unpack_from(frame)
+    if magic != MAGIC:
+        raise ValueError("Not a SimFleet binary frame.")
+    result = {"epoch": epoch, "cursor": cursor}
+    offset = HEADER.size
+    for kind, count in zip(("transports", "customers", "stations"), counts):
+        arrays = {}
+        for field, dtype in (
+            ("ids", "<i4"),
+            ("latitudes", "<f4"),
+            ("longitudes", "<f4"),
+            ("statuses", "<i4"),
+        ):
+            arrays[field] = np.frombuffer(
+                frame, dtype=dtype, count=count, offset=offset
+            )
+            offset += 4 * count
+        result[kind] = arrays
+    return result
+
+
+_registry = EntityRegistry()
+
+
+def set_entity_registry(registry):
+    """
+    Sets the process-wide registry of the array-backed agent state.
+
+    Args:
+        registry (EntityRegistry): the registry
+    """
+    global _registry
+    _registry = registry
+
+
+def get_entity_registry():
+    """
+    Returns the process-wide registry of the array-backed agent state.
+
+    Returns:
+        EntityRegistry: the registry
+    """
+    return _registry
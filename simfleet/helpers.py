@@ -8,8 +8,11 @@ import json
 import os
 import random
 
+import numpy as np
 from geopy.distance import vincenty
 
+EARTH_RADIUS_IN_METERS = 6371008.8
+
 
 def random_position():
     """
@@ -65,6 +68,78 @@ def distance_in_meters(coord1, coord2):
     return vincenty(coord1, coord2).meters
 
 
+def haversine_in_meters(lat1, lng1, lat2, lng2):
+    """
+    Returns the great-circle distance between coordinates in meters using the haversine formula.
+    It is faster (and slightly less accurate) than :func:`distance_in_meters` and accepts both
+    numbers and NumPy arrays, so many distances can be computed at once.
+
+    Args:
+        lat1 (float or numpy.ndarray): latitude of the first coordinates
+        lng1 (float or numpy.ndarray): longitude of the first coordinates
+        lat2 (float or numpy.ndarray): latitude of the second coordinates
+        lng2 (float or numpy.ndarray): longitude of the second coordinates
+
+    Returns:
+        float or numpy.ndarray: distance in meters between the coordinates
+    """
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_IN_METERS * np.arcsin(np.sqrt(a))
+
+
+def equirectangular_in_meters(lat1, lng1, lat2, lng2):
+    """
+    Returns the distance between coordinates in meters using the equirectangular approximation.
+    It is the fastest of the distance functions and is accurate enough for the short segments of a route.
+    Accepts both numbers and NumPy arrays.
+
+    Args:
+        lat1 (float or numpy.ndarray): latitude of the first coordinates
+        lng1 (float or numpy.ndarray): longitude of the first coordinates
+        lat2 (float or numpy.ndarray): latitude of the second coordinates
+        lng2 (float or numpy.ndarray): longitude of the second coordinates
+
+    Returns:
+        float or numpy.ndarray: distance in meters between the coordinates
+    """
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    x = (lng2 - lng1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_IN_METERS * np.sqrt(x * x + y * y)
+
+
+def distances_in_meters(coords1, coords2, method="haversine"):
+    """
+    Returns the distances between two arrays of coordinates in meters.
+
+    Args:
+        coords1 (numpy.ndarray): an array of coordinates (latitude, longitude) with shape (n, 2)
+        coords2 (numpy.ndarray): another array of coordinates (latitude, longitude) with shape (n, 2)
+        method (str): ``geodesic`` (exact and slow), ``haversine`` or ``equirectangular`` (the fastest)
+
+    Returns:
+        numpy.ndarray: the distance in meters between each pair of coordinates
+    """
+    coords1 = np.asarray(coords1, dtype=np.float64).reshape(-1, 2)
+    coords2 = np.asarray(coords2, dtype=np.float64).reshape(-1, 2)
+    if method == "haversine":
+        function = haversine_in_meters
+    elif method == "equirectangular":
+        function = equirectangular_in_meters
+    elif method == "geodesic":
+        return np.array(
+            [distance_in_meters(c1, c2) for c1, c2 in zip(coords1, coords2)],
+            dtype=np.float64,
+        )
+    else:
+        raise ValueError("Unknown distance method: {}".format(method))
+    return function(coords1[:, 0], coords1[:, 1], coords2[:, 0], coords2[:, 1])
+
+
 def kmh_to_ms(speed_in_kmh):
     """
     Convert kilometers/hour to meters/second.
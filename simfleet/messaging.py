@@ -0,0 +1,233 @@
+"""
+Messaging module
+
+All the agents of a simulation usually live in the same process. SPADE's ``Container.send`` already hands the
+messages sent by a behaviour to a recipient of the same process without XMPP. When it is enabled, the
+:class:`MessageBus` takes its place and adds:
+
+* a copy of every message it delivers, so the sender and the recipient never share the same (mutable) object;
+* the same in-process delivery for the messages sent by the agents themselves (e.g. ``TransportAgent.send``);
+* the count of the messages waiting in the mailboxes (:func:`MessageBus.pending_messages`), so the discrete event
+  clock does not jump while the agents still have messages to process;
+* the lightweight start of the agents.
+
+Messages to agents of other processes are still sent through XMPP.
+
+In lightweight mode the agents that inherit from :class:`LightweightAgentMixin` do not even log in to the XMPP server:
+they are started by running their setup and behaviours in the shared event loop, so a simulation with thousands of
+agents needs no sockets nor authentications for them. They can only exchange messages with the agents of this process.
+"""
+
+from loguru import logger
+from spade.behaviour import FSMBehaviour
+from spade.container import Container
+from spade.message import Message
+
+from .clock import get_clock
+
+
+def copy_message(msg):
+    """
+    Returns a copy of a message, so the sender and the recipient do not share the same (mutable) object.
+
+    Args:
+        msg (spade.message.Message): the message
+
+    Returns:
+        spade.message.Message: the copy
+    """
+    return Message(
+        to=str(msg.to),
+        sender=str(msg.sender),
+        body=msg.body,
+        thread=msg.thread,
+        metadata=dict(msg.metadata),
+    )
+
+
+class MessageDeliveryError(Exception):
+    """
+    Raised when a message cannot be delivered: its recipient is not in this process and the sender is not connected
+    to the XMPP server.
+    """
+
+    pass
+
+
+class MessageBus(object):
+    """
+    An in-process message transport. It is attached to the agents in place of their ``spade.container.Container``,
+    so the messages sent by their behaviours go through :func:`send`. Any other use of the container is forwarded to
+    the SPADE container.
+    """
+
+    def __init__(self, local=False, lightweight=False):
+        """
+        Args:
+            local (bool): whether the messages between agents of this process are delivered without XMPP
+            lightweight (bool): whether the agents are started without connecting to the XMPP server
+                                (it implies ``local``)
+        """
+        self.local = local or lightweight
+        self.lightweight = lightweight
+        self.delivered = 0
+        self.dropped = 0
+        self._recipients = set()
+
+    @property
+    def container(self):
+        return Container()
+
+    def __getattr__(self, name):
+        return getattr(self.container, name)
+
+    def attach(self, agent):
+        """
+        Makes the behaviours of an agent send their messages through the bus. If the bus is not local the agent keeps
+        the SPADE container.
+
+        Args:
+            agent (spade.agent.Agent): the agent
+        """
+        if self.local:
+            agent.set_container(self)
+
+    def get_local_agent(self, jid):
+        """
+        Returns the agent of this process a message is addressed to.
+
+        Args:
+            jid (aioxmpp.JID): the recipient of the message
+
+        Returns:
+            spade.agent.Agent: the agent, or None if it is not in this process (or the bus is not local)
+        """
+        if not self.local or jid is None:
+            return None
+        container = self.container
+        for key in (str(jid), str(jid.bare())):
+            if container.has_agent(key):
+                return container.get_agent(key)
+        return None
+
+    async def deliver(self, msg, agent):
+        """
+        Sends a message on behalf of an agent, directly to the recipient if it is in this process or through XMPP
+        otherwise.
+
+        Args:
+            msg (spade.message.Message): the message
+            agent (spade.agent.Agent): the sender
+
+        Raises:
+            MessageDeliveryError: if the recipient is not in this process and the sender is not connected to XMPP
+        """
+        if not msg.sender:
+            msg.sender = str(agent.jid)
+            logger.debug(f"Adding agent's jid as sender to message: {msg}")
+        recipient = self.get_local_agent(msg.to)
+        if recipient is not None:
+            recipient.dispatch(copy_message(msg))
+            self._recipients.add(recipient)
+            self.delivered += 1
+        elif agent.client is not None:
+            with get_clock().busy():
+                await agent.client.send(msg.prepare())
+        else:
+            self.dropped += 1
+            raise MessageDeliveryError(
+                "Agent {} is not connected to XMPP. Message to {} dropped.".format(
+                    agent.jid, msg.to
+                )
+            )
+
+    def pending_messages(self):
+        """
+        Returns the number of messages delivered locally that are still waiting in the mailboxes of their recipients.
+
+        Returns:
+            int: the number of pending messages
+        """
+        pending = 0
+        for agent in list(self._recipients):
+            waiting = sum(
+                behaviour.mailbox_size()
+                for behaviour in agent.behaviours
+                if behaviour.queue is not None
+            )
+            if waiting:
+                pending += waiting
+            else:
+                self._recipients.discard(agent)
+        return pending
+
+    async def send(self, msg, behaviour):
+        """
+        The ``spade.container.Container.send`` counterpart, called by ``behaviour.send``.
+
+        Args:
+            msg (spade.message.Message): the message
+            behaviour (spade.behaviour.CyclicBehaviour): the behaviour that sends the message
+        """
+        await self.deliver(msg, behaviour.agent)
+
+
+class LightweightAgentMixin(object):
+    """
+    A mixin for ``spade.agent.Agent`` subclasses that attaches them to the process-wide :class:`MessageBus` and, in
+    lightweight mode, starts and stops them without connecting to the XMPP server.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        get_message_bus().attach(self)
+
+    async def _async_start(self, auto_register=True):
+        if not get_message_bus().lightweight:
+            await super()._async_start(auto_register=auto_register)
+            return
+        await self._hook_plugin_before_connection()
+        await self._hook_plugin_after_connection()
+        await self.setup()
+        self._alive.set()
+        for behaviour in self.behaviours:
+            if not behaviour.is_running:
+                behaviour.set_agent(self)
+                if issubclass(type(behaviour), FSMBehaviour):
+                    for _, state in behaviour.get_states().items():
+                        state.set_agent(self)
+                behaviour.start()
+
+    async def _async_stop(self):
+        if self.client is not None:
+            await super()._async_stop()
+            return
+        for behaviour in self.behaviours:
+            behaviour.kill()
+        if self.web.is_started():
+            await self.web.runner.cleanup()
+        self._alive.clear()
+
+
+_bus = MessageBus()
+
+
+def set_message_bus(bus):
+    """
+    Sets the process-wide message bus.
+
+    Args:
+        bus (MessageBus): the message bus
+    """
+    global _bus
+    _bus = bus
+
+
+def get_message_bus():
+    """
+    Returns the process-wide message bus.
+
+    Returns:
+        MessageBus: the message bus
+    """
+    return _bus
@@ -7,6 +7,7 @@ CREATE_PROTOCOL = "CREATE"
 REQUEST_PROTOCOL = "REQUEST"
 QUERY_PROTOCOL = "QUERY"
 TRAVEL_PROTOCOL = "INFORM"
+POSITION_PROTOCOL = "POSITION"
 
 REQUEST_PERFORMATIVE = "request"
 ACCEPT_PERFORMATIVE = "accept"
@@ -0,0 +1,433 @@
+"""
+Road graph module
+
+An in-process routing engine that answers shortest-path queries over a road graph without any network access.
+The graph is loaded from a GeoJSON extract of the road network (a FeatureCollection of LineStrings) or from a
+precomputed CSR adjacency file (``.npz``) created with :func:`RoadGraph.save`.
+"""
+
+import asyncio
+import heapq
+import json
+import math
+import re
+
+import numpy as np
+from loguru import logger
+
+from .helpers import (
+    EARTH_RADIUS_IN_METERS,
+    haversine_in_meters,
+    kmh_to_ms,
+    PathRequestException,
+)
+from .routing import RoutingBackend
+from .spatial import GridIndex
+
+DEFAULT_SPEED_IN_KMH = 50
+NODE_PRECISION = 7
+NODE_CELL_SIZE = 0.002  # about 200 meters of latitude
+NODE_SEARCH_MARGIN = 0.05  # degrees around the graph where the nodes are looked up in the grid
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    # scalar version of haversine_in_meters, much faster inside the search loops
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_IN_METERS * math.asin(math.sqrt(a))
+
+
+def _parse_speed(value, default):
+    if value is None:
+        return default
+    match = re.match(r"\s*(\d+(\.\d+)?)", str(value))
+    return float(match.group(1)) if match else default
+
+
+class RoadGraph(object):
+    """
+    A directed road graph stored in compressed sparse row (CSR) format.
+    Nodes are coordinates (latitude, longitude) and edges store their length in meters and duration in seconds.
+    """
+
+    def __init__(self, lats, lngs, indptr, indices, lengths, durations):
+        """
+        Args:
+            lats (numpy.ndarray): latitude of each node
+            lngs (numpy.ndarray): longitude of each node
+            indptr (numpy.ndarray): the edges of node ``i`` are ``indptr[i]:indptr[i+1]``
+            indices (numpy.ndarray): target node of each edge
+            lengths (numpy.ndarray): length of each edge in meters
+            durations (numpy.ndarray): duration of each edge in seconds
+        """
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.durations = np.asarray(durations, dtype=np.float64)
+
+        # plain lists are much faster than numpy arrays when accessed item by item
+        self._lats = self.lats.tolist()
+        self._lngs = self.lngs.tolist()
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._lengths = self.lengths.tolist()
+        self._durations = self.durations.tolist()
+
+        self._node_index = None
+        self._node_bounds = None
+
+    @property
+    def num_nodes(self):
+        return len(self._lats)
+
+    @property
+    def num_edges(self):
+        return len(self._indices)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads a road graph from a GeoJSON file or from a CSR ``.npz`` file.
+
+        Args:
+            filename (str): the name of the file
+
+        Returns:
+            RoadGraph: the loaded graph
+        """
+        if filename.endswith(".npz"):
+            graph = cls.from_npz(filename)
+        else:
+            graph = cls.from_geojson(filename)
+        logger.info(
+            "Road graph loaded from {} ({} nodes, {} edges)".format(
+                filename, graph.num_nodes, graph.num_edges
+            )
+        )
+        return graph
+
+    @classmethod
+    def from_npz(cls, filename):
+        """
+        Loads a road graph saved with :func:`save`.
+
+        Args:
+            filename (str): the name of the ``.npz`` file
+
+        Returns:
+            RoadGraph: the loaded graph
+        """
+        data = np.load(filename)
+        return cls(
+            data["lats"],
+            data["lngs"],
+            data["indptr"],
+            data["indices"],
+            data["lengths"],
+            data["durations"],
+        )
+
+    @classmethod
+    def from_geojson(cls, filename, default_speed_in_kmh=DEFAULT_SPEED_IN_KMH):
+        """
+        Builds a road graph from a GeoJSON FeatureCollection of LineStrings (or MultiLineStrings).
+        Consecutive points of a line are connected in both directions unless the ``oneway`` property is set.
+        The ``maxspeed`` property (km/h) is used to estimate the durations.
+
+        Args:
+            filename (str): the name of the GeoJSON file
+            default_speed_in_kmh (float): speed used for the roads without ``maxspeed``
+
+        Returns:
+            RoadGraph: the built graph
+        """
+        with open(filename) as f:
+            features = json.load(f)["features"]
+
+        node_ids = {}
+        lats, lngs = [], []
+        sources, targets, lengths, durations = [], [], [], []
+
+        def node(point):
+            key = (round(point[1], NODE_PRECISION), round(point[0], NODE_PRECISION))
+            if key not in node_ids:
+                node_ids[key] = len(lats)
+                lats.append(key[0])
+                lngs.append(key[1])
+            return node_ids[key]
+
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            properties = feature.get("properties") or {}
+            if geometry.get("type") == "LineString":
+                lines = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiLineString":
+                lines = geometry["coordinates"]
+            else:
+                continue
+            oneway = str(properties.get("oneway", "no")).lower()
+            speed = kmh_to_ms(_parse_speed(properties.get("maxspeed"), default_speed_in_kmh))
+            for line in lines:
+                for _cur, _next in zip(line, line[1:]):
+                    u, v = node(_cur), node(_next)
+                    if u == v:
+                        continue
+                    length = _haversine(lats[u], lngs[u], lats[v], lngs[v])
+                    if oneway != "-1":
+                        sources.append(u)
+                        targets.append(v)
+                        lengths.append(length)
+                        durations.append(length / speed)
+                    if oneway not in ("yes", "true", "1"):
+                        sources.append(v)
+                        targets.append(u)
+                        lengths.append(length)
+                        durations.append(length / speed)
+
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(len(lats) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(lats)), out=indptr[1:])
+        return cls(
+            lats,
+            lngs,
+            indptr,
+            np.asarray(targets, dtype=np.int64)[order],
+            np.asarray(lengths)[order],
+            np.asarray(durations)[order],
+        )
+
+    def save(self, filename):
+        """
+        Saves the graph in CSR format to a ``.npz`` file that loads much faster than the GeoJSON.
+
+        Args:
+            filename (str): the name of the ``.npz`` file
+        """
+        np.savez(
+            filename,
+            lats=self.lats,
+            lngs=self.lngs,
+            indptr=self.indptr,
+            indices=self.indices,
+            lengths=self.lengths,
+            durations=self.durations,
+        )
+
+    def nearest_node(self, coord):
+        """
+        Returns the node closest to a coordinate. The nodes are looked up in a grid index, built the first time it
+        is needed. The coordinates far from the graph, which would need to visit many empty cells, are compared with
+        all the nodes instead.
+
+        Args:
+            coord (list): a coordinate (latitude, longitude)
+
+        Returns:
+            int: the id of the closest node
+        """
+        if self._node_index is None:
+            self._build_node_index()
+        min_lat, max_lat, min_lng, max_lng = self._node_bounds
+        if min_lat <= coord[0] <= max_lat and min_lng <= coord[1] <= max_lng:
+            return self._node_index.nearest(coord, k=1)[0][0]
+        distances = haversine_in_meters(coord[0], coord[1], self.lats, self.lngs)
+        return int(np.argmin(distances))
+
+    def _build_node_index(self):
+        if self.num_nodes == 0:
+            raise ValueError("The road graph has no nodes.")
+        index = GridIndex(cell_size=NODE_CELL_SIZE)
+        for node, position in enumerate(zip(self._lats, self._lngs)):
+            index.update(node, position)
+        self._node_bounds = (
+            min(self._lats) - NODE_SEARCH_MARGIN,
+            max(self._lats) + NODE_SEARCH_MARGIN,
+            min(self._lngs) - NODE_SEARCH_MARGIN,
+            max(self._lngs) + NODE_SEARCH_MARGIN,
+        )
+        self._node_index = index
+
+    def node_position(self, node):
+        return [self._lats[node], self._lngs[node]]
+
+    def shortest_path(self, source, target):
+        """
+        Computes the shortest path (in meters) between two nodes with the A* algorithm,
+        using the great-circle distance as heuristic.
+
+        Args:
+            source (int): id of the origin node
+            target (int): id of the destination node
+
+        Returns:
+            list, float, float: the list of nodes of the path, its length in meters and its duration in seconds,
+                                or None, None, None if the target is not reachable
+        """
+        lats, lngs = self._lats, self._lngs
+        indptr, indices = self._indptr, self._indices
+        lengths, durations = self._lengths, self._durations
+        target_lat, target_lng = lats[target], lngs[target]
+
+        best = {source: 0.0}
+        previous = {source: (None, 0.0)}
+        closed = set()
+        heap = [(0.0, source)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if u in closed:
+                continue
+            closed.add(u)
+            cost_u = best[u]
+            for edge in range(indptr[u], indptr[u + 1]):
+                v = indices[edge]
+                cost = cost_u + lengths[edge]
+                if cost < best.get(v, math.inf):
+                    best[v] = cost
+                    previous[v] = (u, durations[edge])
+                    estimate = cost + _haversine(lats[v], lngs[v], target_lat, target_lng)
+                    heapq.heappush(heap, (estimate, v))
+        if target not in best:
+            return None, None, None
+
+        nodes, duration = [], 0.0
+        node = target
+        while node is not None:
+            nodes.append(node)
+            node, edge_duration = previous[node]
+            duration += edge_duration
+        nodes.reverse()
+        return nodes, best[target], duration
+
+    def costs_from(self, source, targets):
+        """
+        Computes the length and duration of the shortest paths from a node to a set of nodes with the Dijkstra
+        algorithm. The search stops as soon as all the targets are reached.
+
+        Args:
+            source (int): id of the origin node
+            targets (list): ids of the destination nodes
+
+        Returns:
+            dict: a dict with the (length, duration) of every reachable target
+        """
+        indptr, indices = self._indptr, self._indices
+        lengths, durations = self._lengths, self._durations
+        pending = set(targets)
+        best = {source: (0.0, 0.0)}
+        closed = set()
+        result = {}
+        heap = [(0.0, 0.0, source)]
+        while heap and pending:
+            length_u, duration_u, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            closed.add(u)
+            if u in pending:
+                pending.discard(u)
+                result[u] = (length_u, duration_u)
+            for edge in range(indptr[u], indptr[u + 1]):
+                v = indices[edge]
+                length = length_u + lengths[edge]
+                if length < best.get(v, (math.inf,))[0]:
+                    best[v] = (length, duration_u + durations[edge])
+                    heapq.heappush(heap, (length, best[v][1], v))
+        return result
+
+
+class LocalRoutingBackend(RoutingBackend):
+    """
+    Routing backend that computes the routes in-process over a :class:`RoadGraph`. It needs no network and its
+    results are reproducible. Select it with ``"route_backend": "simfleet.roadgraph.LocalRoutingBackend"`` and
+    set the graph file in the ``route_graph`` config field.
+    """
+
+    def __init__(self, graph, speed_in_kmh=DEFAULT_SPEED_IN_KMH, name=None):
+        """
+        Args:
+            graph (RoadGraph): the road graph
+            speed_in_kmh (float): speed used to estimate the duration of the stretches out of the graph
+            name (str, optional): a name of the graph (e.g. its file) that identifies its routes in the route cache
+        """
+        self.graph = graph
+        self.speed = kmh_to_ms(speed_in_kmh)
+        self.name = name
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.route_graph:
+            raise ValueError("A route_graph file is needed to use the local routing backend.")
+        return cls(RoadGraph.load(config.route_graph), name=config.route_graph)
+
+    @property
+    def cache_namespace(self):
+        return "local:{}".format(self.name)
+
+    async def route(self, origin, destination):
+        """
+        The search runs in a worker thread so it does not block the agents in the event loop. It still holds the GIL,
+        so the searches do not run in parallel.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._route, origin, destination)
+
+    async def table(self, sources, destinations):
+        """
+        The searches run in a worker thread so they do not block the agents in the event loop. They still hold the
+        GIL, so they do not run in parallel.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._table, sources, destinations)
+
+    def _route(self, origin, destination):
+        source = self.graph.nearest_node(origin)
+        target = self.graph.nearest_node(destination)
+        nodes, distance, duration = self.graph.shortest_path(source, target)
+        if nodes is None:
+            raise PathRequestException(
+                "No path from {} to {} in the road graph.".format(origin, destination)
+            )
+        path = [self.graph.node_position(node) for node in nodes]
+        off_graph = distance_off_graph(origin, path[0]) + distance_off_graph(
+            path[-1], destination
+        )
+        return path, distance + off_graph, duration + off_graph / self.speed
+
+    def _table(self, sources, destinations):
+        source_nodes = [self.graph.nearest_node(coord) for coord in sources]
+        target_nodes = [self.graph.nearest_node(coord) for coord in destinations]
+        durations = [[None] * len(destinations) for _ in sources]
+        distances = [[None] * len(destinations) for _ in sources]
+        for i, source in enumerate(source_nodes):
+            costs = self.graph.costs_from(source, target_nodes)
+            for j, target in enumerate(target_nodes):
+                if target in costs:
+                    off_graph = distance_off_graph(
+                        sources[i], self.graph.node_position(source)
+                    ) + distance_off_graph(
+                        self.graph.node_position(target), destinations[j]
+                    )
+                    distances[i][j] = costs[target][0] + off_graph
+                    durations[i][j] = costs[target][1] + off_graph / self.speed
+        return durations, distances
+
+
+def distance_off_graph(coord1, coord2):
+    """
+    Returns the straight distance between a coordinate and its closest point of the graph.
+
+    Args:
+        coord1 (list): a coordinate (latitude, longitude)
+        coord2 (list): another coordinate (latitude, longitude)
+
+    Returns:
+        float: the distance in meters
+    """
+    return _haversine(coord1[0], coord1[1], coord2[0], coord2[1])
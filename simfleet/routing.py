@@ -0,0 +1,1187 @@
+"""
+Routing module
+
+Infrastructure shared by all the agents of a simulation to obtain routes: a two-tier route cache
+(in-memory LRU plus an optional on-disk SQLite store that survives between runs), a pooled HTTP
+client used to talk to the routing servers and the pluggable routing backends.
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import time
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+import aiohttp
+import numpy as np
+from loguru import logger
+
+from .helpers import PathRequestException, haversine_in_meters
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_PRECISION = 5
+DISK_COMMIT_INTERVAL = 100
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 0
+DEFAULT_MAX_CONCURRENCY = 100
+DEFAULT_KEEPALIVE = 30
+
+DEFAULT_ROUTE_HOST = "http://router.project-osrm.org/"
+DEFAULT_MAX_TABLE_SIZE = 100
+DEFAULT_BALANCING = "round_robin"
+DEFAULT_HOST_MAX_FAILURES = 3
+DEFAULT_HEALTH_INTERVAL = 10
+DEFAULT_HEALTH_PATH = "nearest/v1/car/0,0"
+DEFAULT_HOST_TIMEOUT = 5
+BALANCING_METHODS = ("round_robin", "least_outstanding")
+GEOMETRIES = ("polyline6", "polyline", "geojson")
+OVERVIEWS = ("full", "simplified")
+
+DEFAULT_ROUTE_TIMEOUT = 10
+DEFAULT_ROUTE_RETRIES = 3
+DEFAULT_ROUTE_BACKOFF = 0.5
+DEFAULT_ROUTE_MAX_BACKOFF = 10
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30
+DEFAULT_FALLBACK_SPEED = 30  # km/h
+DEFAULT_NEIGHBOUR_RADIUS = 300  # meters
+FALLBACKS = (None, "straight_line", "neighbour")
+
+
+def quantize(coord, precision=DEFAULT_CACHE_PRECISION):
+    """
+    Rounds a coordinate to a fixed number of decimals so that near-identical points share the same key.
+
+    Args:
+        coord (list): a coordinate (latitude, longitude)
+        precision (int): number of decimals to keep (5 decimals are ~1 meter)
+
+    Returns:
+        tuple: the rounded coordinate
+    """
+    return round(float(coord[0]), precision), round(float(coord[1]), precision)
+
+
+def route_key(origin, destination, precision=DEFAULT_CACHE_PRECISION):
+    """
+    Builds the key of a route between two coordinates.
+
+    Args:
+        origin (list): origin coordinate (latitude, longitude)
+        destination (list): target coordinate (latitude, longitude)
+        precision (int): number of decimals used to quantize the coordinates
+
+    Returns:
+        str: the key of the route
+    """
+    src = quantize(origin, precision)
+    dst = quantize(destination, precision)
+    return "{},{};{},{}".format(src[0], src[1], dst[0], dst[1])
+
+
+def decode_polyline(encoded, precision=6):
+    """
+    Decodes a path encoded with the Google polyline algorithm (as returned by OSRM with ``geometries=polyline6``,
+    or ``polyline`` with a precision of 5). The whole string is decoded at once with NumPy.
+
+    Args:
+        encoded (str): the encoded polyline
+        precision (int): the number of decimals of the encoded coordinates
+
+    Returns:
+        numpy.ndarray: an array of shape (n, 2) with the coordinates (latitude, longitude) of the path
+    """
+    if not encoded:
+        return np.zeros((0, 2))
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8)
+    chunks = chunks.astype(np.int64) - 63
+    # every value is split in chunks of 5 bits, all but the last one with the 0x20 bit set
+    last = chunks < 0x20
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    lengths = np.diff(np.append(starts, len(chunks)))
+    offsets = np.arange(len(chunks)) - np.repeat(starts, lengths)
+    values = np.add.reduceat((chunks & 0x1F) << (5 * offsets), starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+class RouteCache(object):
+    """
+    A route cache with an in-memory LRU tier and an optional on-disk tier backed by SQLite.
+    Routes are indexed by the quantized coordinates of their origin and destination.
+    """
+
+    def __init__(
+        self,
+        size=DEFAULT_CACHE_SIZE,
+        filename=None,
+        precision=DEFAULT_CACHE_PRECISION,
+        namespace=None,
+    ):
+        """
+        Args:
+            size (int): maximum number of routes kept in memory
+            filename (str, optional): path of the SQLite file used as on-disk tier. If None only memory is used.
+            precision (int): number of decimals used to quantize the coordinates
+            namespace (str, optional): prefix of the keys, so the routes of different routing backends stored in
+                                       the same file are not mixed (see :attr:`RoutingBackend.cache_namespace`)
+        """
+        self.size = size
+        self.filename = filename
+        self.precision = precision
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._db = None
+        self._pending_writes = 0
+        if filename:
+            self.open(filename)
+
+    def open(self, filename):
+        """
+        Opens (and creates if needed) the on-disk tier of the cache.
+
+        Args:
+            filename (str): path of the SQLite file
+        """
+        try:
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                "key TEXT PRIMARY KEY, path TEXT, distance REAL, duration REAL)"
+            )
+            self._db.commit()
+            logger.info("Route cache loaded from {}".format(filename))
+        except sqlite3.Error as e:
+            logger.warning("Could not open route cache file {}: {}".format(filename, e))
+            self._db = None
+
+    def _key(self, origin, destination):
+        key = route_key(origin, destination, self.precision)
+        if self.namespace:
+            key = "{}|{}".format(self.namespace, key)
+        return key
+
+    def get(self, origin, destination):
+        """
+        Looks for a route in the cache. Memory is checked first and then the disk.
+
+        Args:
+            origin (list): origin coordinate (latitude, longitude)
+            destination (list): target coordinate (latitude, longitude)
+
+        Returns:
+            list, float, float: the path, the distance of the path and the estimated duration, or None if not cached
+        """
+        key = self._key(origin, destination)
+        route = self._memory.get(key)
+        if route is not None:
+            self._memory.move_to_end(key)
+        elif self._db is not None:
+            row = self._db.execute(
+                "SELECT path, distance, duration FROM routes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                route = (json.loads(row[0]), row[1], row[2])
+                self._remember(key, route)
+        if route is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        path, distance, duration = route
+        path = list(path)
+        if path[-1] != destination:
+            path.append(destination)
+        return path, distance, duration
+
+    def put(self, origin, destination, path, distance, duration):
+        """
+        Stores a route in the cache.
+
+        Args:
+            origin (list): origin coordinate (latitude, longitude)
+            destination (list): target coordinate (latitude, longitude)
+            path (list): the list of points of the route
+            distance (float): the distance of the route in meters
+            duration (float): the estimated duration of the route in seconds
+        """
+        key = self._key(origin, destination)
+        self._remember(key, (path, distance, duration))
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(path), distance, duration),
+                )
+                self._pending_writes += 1
+                if self._pending_writes >= DISK_COMMIT_INTERVAL:
+                    self.flush()
+            except sqlite3.Error as e:
+                logger.warning("Could not store route in cache file: {}".format(e))
+
+    def nearest(self, origin, destination, radius=DEFAULT_NEIGHBOUR_RADIUS):
+        """
+        Looks in the memory tier for the route whose origin and destination are closest to the given ones.
+        It scans the whole tier, so it is meant to be used only when the routing server is not available.
+
+        Args:
+            origin (list): origin coordinate (latitude, longitude)
+            destination (list): target coordinate (latitude, longitude)
+            radius (float): the maximum distance in meters between the origins and between the destinations
+
+        Returns:
+            list, float, float: the path, the distance of the path and the estimated duration, or None if there is
+                                no route close enough
+        """
+        best, best_offset = None, None
+        for key, route in self._memory.items():
+            src, dst = key.rsplit("|", 1)[-1].split(";")
+            src, dst = src.split(","), dst.split(",")
+            to_origin = haversine_in_meters(
+                origin[0], origin[1], float(src[0]), float(src[1])
+            )
+            to_destination = haversine_in_meters(
+                destination[0], destination[1], float(dst[0]), float(dst[1])
+            )
+            if to_origin > radius or to_destination > radius:
+                continue
+            offset = to_origin + to_destination
+            if best is None or offset < best_offset:
+                best, best_offset = route, offset
+        if best is None:
+            return None
+        path, distance, duration = best
+        return list(path), distance, duration
+
+    def _remember(self, key, route):
+        if self.size <= 0:
+            return
+        self._memory[key] = route
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        """
+        Commits the pending writes of the on-disk tier.
+        """
+        if self._db is not None and self._pending_writes:
+            self._db.commit()
+            self._pending_writes = 0
+
+    def close(self):
+        """
+        Flushes and closes the on-disk tier of the cache.
+        """
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+        logger.debug(
+            "Route cache closed ({} hits, {} misses)".format(self.hits, self.misses)
+        )
+
+    def __contains__(self, item):
+        origin, destination = item
+        key = self._key(origin, destination)
+        if key in self._memory:
+            return True
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT 1 FROM routes WHERE key = ?", (key,)
+            ).fetchone()
+            return row is not None
+        return False
+
+    def __len__(self):
+        return len(self._memory)
+
+
+_route_cache = None
+
+
+def set_route_cache(cache):
+    """
+    Sets the process-wide route cache used by ``request_route_to_server``.
+
+    Args:
+        cache (RouteCache): the cache to be used, or None to disable caching
+    """
+    global _route_cache
+    _route_cache = cache
+
+
+def get_route_cache():
+    """
+    Returns the process-wide route cache.
+
+    Returns:
+        RouteCache: the route cache in use or None if caching is disabled
+    """
+    return _route_cache
+
+
+class RoutingClient(object):
+    """
+    A process-wide HTTP client for the routing servers. It keeps a single ``aiohttp.ClientSession`` with a pool of
+    keep-alive connections, and limits the number of concurrent requests with a semaphore.
+    The session is lazily created inside the event loop the first time it is used.
+    """
+
+    def __init__(
+        self,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        keepalive=DEFAULT_KEEPALIVE,
+    ):
+        """
+        Args:
+            max_connections (int): total number of simultaneous connections in the pool (0 is unlimited)
+            max_connections_per_host (int): simultaneous connections to the same host (0 is unlimited)
+            max_concurrency (int): maximum number of in-flight requests
+            keepalive (float): seconds that an idle connection is kept open to be reused
+        """
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.max_concurrency = max_concurrency
+        self.keepalive = keepalive
+        self._session = None
+        self._semaphore = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def get_json(self, url):
+        """
+        Performs a GET request through the shared session and decodes the JSON response.
+
+        Args:
+            url (str): the url to be requested
+
+        Returns:
+            dict: the decoded JSON response
+        """
+        session = self._get_session()
+        async with self._semaphore:
+            async with session.get(url) as response:
+                return await response.json()
+
+    async def ping(self, url, timeout=None):
+        """
+        Checks whether a server answers a request.
+
+        Args:
+            url (str): the url to be requested
+            timeout (float): the seconds the server is given to answer (None uses the default of the session)
+
+        Returns:
+            bool: whether the server answered without a server error in time
+        """
+        session = self._get_session()
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        try:
+            async with session.get(url, **kwargs) as response:
+                return response.status < 500
+        except Exception:
+            return False
+
+    async def close(self):
+        """
+        Closes the shared session and all its pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_routing_client = None
+
+
+def set_routing_client(client):
+    """
+    Sets the process-wide routing client used by ``request_route_to_server``.
+
+    Args:
+        client (RoutingClient): the client to be used
+    """
+    global _routing_client
+    _routing_client = client
+
+
+def get_routing_client():
+    """
+    Returns the process-wide routing client. A client with the default settings is created if none was set.
+
+    Returns:
+        RoutingClient: the routing client in use
+    """
+    global _routing_client
+    if _routing_client is None:
+        _routing_client = RoutingClient()
+    return _routing_client
+
+
+class RouteHost(object):
+    """
+    A routing server of a :class:`HostPool` and its load.
+    """
+
+    def __init__(self, url, weight=1, max_concurrency=0):
+        """
+        Args:
+            url (str): url of the server
+            weight (float): the share of the requests sent to the server, relative to the other servers
+            max_concurrency (int): maximum number of requests in flight to the server (0 is unlimited)
+        """
+        if weight <= 0:
+            raise ValueError("The weight of route host {} must be positive.".format(url))
+        self.url = url
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.healthy = True
+        self.checked_at = 0
+        self.current_weight = 0
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None and self.max_concurrency > 0:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    @property
+    def saturated(self):
+        return 0 < self.max_concurrency <= self.outstanding
+
+    def __repr__(self):
+        return "RouteHost({!r}, weight={}, outstanding={}, healthy={})".format(
+            self.url, self.weight, self.outstanding, self.healthy
+        )
+
+
+class HostPool(object):
+    """
+    Spreads the requests among several routing servers. A server is chosen for every request, among the healthy ones
+    that are below their concurrency cap, with one of the balancing methods:
+
+    * ``round_robin``: smooth weighted round-robin, each server receives a share of the requests proportional to its
+      weight.
+    * ``least_outstanding``: the server with the fewest requests in flight relative to its weight.
+
+    A server is marked unhealthy after ``max_failures`` consecutive failed requests and receives no more requests
+    until a health check (a request to ``health_path``, made at most every ``health_interval`` seconds) finds it
+    answering again. If all the servers are unhealthy the requests are spread among all of them. A request that does
+    not get an answer in ``timeout`` seconds counts as a failure, so a server that hangs is marked unhealthy too.
+    """
+
+    def __init__(
+        self,
+        hosts,
+        balancing=DEFAULT_BALANCING,
+        max_concurrency=0,
+        max_failures=DEFAULT_HOST_MAX_FAILURES,
+        health_interval=DEFAULT_HEALTH_INTERVAL,
+        health_path=DEFAULT_HEALTH_PATH,
+        timeout=DEFAULT_HOST_TIMEOUT,
+    ):
+        """
+        Args:
+            hosts (str or list): the url of a server or a list of servers, each one an url or a dict with the ``url``
+                                 and, optionally, its ``weight`` and ``max_concurrency``
+            balancing (str): the balancing method (``round_robin`` or ``least_outstanding``)
+            max_concurrency (int): the concurrency cap of the servers that do not set their own (0 is unlimited)
+            max_failures (int): the consecutive failures that mark a server as unhealthy
+            health_interval (float): the minimum seconds between the health checks of an unhealthy server
+            health_path (str): the path requested to check the health of a server
+            timeout (float): the seconds a server is given to answer a request or a health check (None waits forever)
+        """
+        if balancing not in BALANCING_METHODS:
+            raise ValueError(
+                "Unknown balancing method {}. Use one of {}.".format(
+                    balancing, BALANCING_METHODS
+                )
+            )
+        if isinstance(hosts, (str, dict)):
+            hosts = [hosts]
+        if not hosts:
+            raise ValueError("At least one route host is needed.")
+        self.hosts = []
+        for host in hosts:
+            if isinstance(host, str):
+                host = {"url": host}
+            self.hosts.append(
+                RouteHost(
+                    host["url"],
+                    weight=host.get("weight", 1),
+                    max_concurrency=host.get("max_concurrency", max_concurrency),
+                )
+            )
+        self.balancing = balancing
+        self.max_failures = max_failures
+        self.health_interval = health_interval
+        self.health_path = health_path
+        self.timeout = timeout
+        self._checks = set()
+        self._tasks = set()
+
+    def _candidates(self):
+        healthy = [host for host in self.hosts if host.healthy]
+        if not healthy:
+            return self.hosts
+        available = [host for host in healthy if not host.saturated]
+        return available or healthy
+
+    def select(self):
+        """
+        Chooses the server for a new request.
+
+        Returns:
+            RouteHost: the server
+        """
+        self.check_unhealthy()
+        candidates = self._candidates()
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.balancing == "least_outstanding":
+            return min(candidates, key=lambda host: host.outstanding / host.weight)
+        total = 0
+        best = None
+        for host in candidates:
+            host.current_weight += host.weight
+            total += host.weight
+            if best is None or host.current_weight > best.current_weight:
+                best = host
+        best.current_weight -= total
+        return best
+
+    def record_success(self, host):
+        host.failures = 0
+        if not host.healthy:
+            logger.info("Route host {} is healthy again.".format(host.url))
+        host.healthy = True
+
+    def record_failure(self, host):
+        host.failures += 1
+        if host.healthy and host.failures >= self.max_failures:
+            logger.warning(
+                "Route host {} marked as unhealthy after {} failures.".format(
+                    host.url, host.failures
+                )
+            )
+            host.healthy = False
+            host.checked_at = time.monotonic()
+
+    def check_unhealthy(self):
+        """
+        Starts the health check of the unhealthy servers that were not checked recently.
+        """
+        now = time.monotonic()
+        for host in self.hosts:
+            if (
+                not host.healthy
+                and host not in self._checks
+                and now - host.checked_at >= self.health_interval
+            ):
+                host.checked_at = now
+                self._checks.add(host)
+                task = asyncio.ensure_future(self.check(host))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def check(self, host):
+        """
+        Checks the health of a server.
+
+        Args:
+            host (RouteHost): the server
+        """
+        try:
+            if await get_routing_client().ping(
+                host.url + self.health_path, self.timeout
+            ):
+                self.record_success(host)
+        finally:
+            self._checks.discard(host)
+
+    async def get_json(self, path):
+        """
+        Requests a path to one of the servers and decodes the JSON response.
+
+        Args:
+            path (str): the path of the request, relative to the url of the server
+
+        Returns:
+            dict: the decoded JSON response
+        """
+        host = self.select()
+        host.outstanding += 1
+        host.requests += 1
+        url = host.url + path
+        try:
+            if host.semaphore is None:
+                result = await asyncio.wait_for(
+                    get_routing_client().get_json(url), self.timeout
+                )
+            else:
+                async with host.semaphore:
+                    result = await asyncio.wait_for(
+                        get_routing_client().get_json(url), self.timeout
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # a timeout is a failure of the server too
+            self.record_failure(host)
+            raise
+        finally:
+            host.outstanding -= 1
+        self.record_success(host)
+        return result
+
+
+class RoutingBackend(object, metaclass=ABCMeta):
+    """
+    The interface that all routing backends must implement. The backend used by the simulation is selected with the
+    ``route_backend`` config field, in the format module.file.Class, and built with :func:`from_config`.
+    """
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds the backend from the simulation config.
+
+        Args:
+            config (SimfleetConfig): the simulation config
+
+        Returns:
+            RoutingBackend: the new backend
+        """
+        return cls()
+
+    @property
+    def cache_namespace(self):
+        """
+        Returns:
+            str: the prefix of the keys of the routes of this backend in the route cache
+        """
+        return type(self).__name__
+
+    @abstractmethod
+    async def route(self, origin, destination):
+        """
+        Computes the path between two coordinates.
+
+        Args:
+            origin (list): origin coordinate (latitude, longitude)
+            destination (list): target coordinate (latitude, longitude)
+
+        Returns:
+            list, float, float: the path, the distance of the path in meters and the estimated duration in seconds
+
+        Raises:
+            Exception: if the path could not be computed
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def table(self, sources, destinations):
+        """
+        Computes the durations and distances between every source and every destination.
+
+        Args:
+            sources (list): a list of origin coordinates (latitude, longitude)
+            destinations (list): a list of target coordinates (latitude, longitude)
+
+        Returns:
+            list, list: the durations matrix (seconds) and the distances matrix (meters), indexed by
+                        [source][destination]. Unreachable pairs are None.
+
+        Raises:
+            Exception: if the table could not be computed
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        Releases the resources held by the backend.
+        """
+        pass
+
+
+class OSRMBackend(RoutingBackend):
+    """
+    Routing backend that queries an OSRM server through the process-wide :class:`RoutingClient`.
+    """
+
+    def __init__(
+        self,
+        route_host=DEFAULT_ROUTE_HOST,
+        max_table_size=DEFAULT_MAX_TABLE_SIZE,
+        balancing=DEFAULT_BALANCING,
+        max_concurrency_per_host=0,
+        health_interval=DEFAULT_HEALTH_INTERVAL,
+        host_timeout=DEFAULT_HOST_TIMEOUT,
+        geometry="polyline6",
+        overview="full",
+    ):
+        """
+        Args:
+            route_host (str or list): url of the OSRM server, or a list of OSRM servers to spread the requests among
+                                      (see :class:`HostPool`)
+            max_table_size (int): maximum number of coordinates accepted by the server in a single table request
+            balancing (str): the balancing method among the servers (``round_robin`` or ``least_outstanding``)
+            max_concurrency_per_host (int): maximum number of requests in flight to each server (0 is unlimited)
+            health_interval (float): the minimum seconds between the health checks of an unhealthy server
+            host_timeout (float): the seconds a server is given to answer before the request counts as a failure of
+                                  the server
+            geometry (str): the encoding of the paths requested to the server (``polyline6``, ``polyline`` or
+                            ``geojson``). The polylines are much smaller to transfer and faster to decode
+            overview (str): ``full`` for the paths with all the points of the road or ``simplified`` for a path
+                            with the points needed to draw it at the zoom level of the whole route
+        """
+        if geometry not in GEOMETRIES:
+            raise ValueError(
+                "Unknown route geometry {}. Use one of {}.".format(geometry, GEOMETRIES)
+            )
+        if overview not in OVERVIEWS:
+            raise ValueError(
+                "Unknown route overview {}. Use one of {}.".format(overview, OVERVIEWS)
+            )
+        self.geometry = geometry
+        self.overview = overview
+        self.pool = HostPool(
+            route_host,
+            balancing=balancing,
+            max_concurrency=max_concurrency_per_host,
+            health_interval=health_interval,
+            timeout=host_timeout,
+        )
+        self.route_host = self.pool.hosts[0].url
+        self.max_table_size = max_table_size
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            route_host=config.route_hosts,
+            balancing=config.route_balancing,
+            max_concurrency_per_host=config.route_host_max_concurrency,
+            health_interval=config.route_health_interval,
+            host_timeout=config.route_host_timeout,
+            geometry=config.route_geometry,
+            overview=config.route_overview,
+        )
+
+    @property
+    def cache_namespace(self):
+        return "osrm:{}".format(self.route_host)
+
+    async def route(self, origin, destination):
+        url = "route/v1/car/{src1},{src2};{dest1},{dest2}?geometries={geometry}&overview={overview}"
+        src1, src2, dest1, dest2 = origin[1], origin[0], destination[1], destination[0]
+        url = url.format(
+            src1=src1,
+            src2=src2,
+            dest1=dest1,
+            dest2=dest2,
+            geometry=self.geometry,
+            overview=self.overview,
+        )
+
+        result = await self.pool.get_json(url)
+        if result.get("code") != "Ok" or not result.get("routes"):
+            raise NoRouteError(
+                "No route from {} to {}: {}".format(
+                    origin, destination, result.get("message", result.get("code"))
+                )
+            )
+
+        geometry = result["routes"][0]["geometry"]
+        if self.geometry == "geojson":
+            path = [[point[1], point[0]] for point in geometry["coordinates"]]
+        else:
+            precision = 6 if self.geometry == "polyline6" else 5
+            path = decode_polyline(geometry, precision).tolist()
+        duration = result["routes"][0]["duration"]
+        distance = result["routes"][0]["distance"]
+        return path, distance, duration
+
+    async def table(self, sources, destinations):
+        """
+        Large tables are split in several requests of at most ``max_table_size`` coordinates that are
+        sent concurrently.
+        """
+        durations = [[None] * len(destinations) for _ in sources]
+        distances = [[None] * len(destinations) for _ in sources]
+        if not sources or not destinations:
+            return durations, distances
+
+        async def request_block(src_index, dst_index, src_block, dst_block):
+            coords = ";".join(
+                "{},{}".format(coord[1], coord[0]) for coord in src_block + dst_block
+            )
+            url = "table/v1/car/{coords}?sources={src}&destinations={dst}&annotations=duration,distance".format(
+                coords=coords,
+                src=";".join(str(i) for i in range(len(src_block))),
+                dst=";".join(
+                    str(i)
+                    for i in range(len(src_block), len(src_block) + len(dst_block))
+                ),
+            )
+            result = await self.pool.get_json(url)
+            for i, row in enumerate(result["durations"]):
+                durations[src_index + i][dst_index : dst_index + len(row)] = row
+            for i, row in enumerate(result["distances"]):
+                distances[src_index + i][dst_index : dst_index + len(row)] = row
+
+        src_size = max(1, self.max_table_size // 2)
+        blocks = []
+        for i in range(0, len(sources), src_size):
+            src_block = sources[i : i + src_size]
+            dst_size = max(1, self.max_table_size - len(src_block))
+            for j in range(0, len(destinations), dst_size):
+                blocks.append(
+                    request_block(i, j, src_block, destinations[j : j + dst_size])
+                )
+        await asyncio.gather(*blocks)
+        return durations, distances
+
+
+_routing_backend = None
+_default_backends = {}
+
+
+def set_routing_backend(backend):
+    """
+    Sets the process-wide routing backend used by ``request_route_to_server``.
+
+    Args:
+        backend (RoutingBackend): the backend to be used, or None to use the OSRM server of each request
+    """
+    global _routing_backend
+    _routing_backend = backend
+
+
+def get_routing_backend(route_host=DEFAULT_ROUTE_HOST):
+    """
+    Returns the process-wide routing backend. If none was set an :class:`OSRMBackend` for ``route_host`` is returned.
+
+    Args:
+        route_host (str): url of the OSRM server to be used if no backend was set
+
+    Returns:
+        RoutingBackend: the routing backend in use
+    """
+    if _routing_backend is not None:
+        return _routing_backend
+    if route_host not in _default_backends:
+        _default_backends[route_host] = OSRMBackend(route_host)
+    return _default_backends[route_host]
+
+
+class NoRouteError(PathRequestException):
+    """
+    Raised when the routing server answers that there is no route between two points. Asking again gives the same
+    answer, so it is not retried.
+    """
+
+    pass
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a route is not requested because the circuit breaker of its routing server is open.
+    """
+
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Stops sending requests to a routing server that keeps failing. After ``threshold`` consecutive failures the circuit
+    opens and every request is rejected for ``cooldown`` seconds. Then a single probe request is let through
+    (half-open): if it succeeds the circuit closes again, and if it fails it opens for another cooldown.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN
+    ):
+        """
+        Args:
+            threshold (int): the consecutive failures that open the circuit
+            cooldown (float): the seconds the circuit stays open
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """
+        Returns:
+            bool: whether a request can be sent to the server
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self):
+        """
+        Lets another probe through if the current one was abandoned without an outcome.
+        """
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            if self.opened_at is None or self._probing:
+                logger.warning(
+                    "Routing circuit opened after {} failures. Retrying in {} seconds.".format(
+                        self.failures, self.cooldown
+                    )
+                )
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class RoutingPolicy(object):
+    """
+    Makes the route requests resilient to a slow or failing routing server. Every request is given a timeout and the
+    failed ones are retried after a jittered exponential backoff, so the retries of many agents do not hit the server
+    at the same time. Each routing backend has its own :class:`CircuitBreaker`: while it is open the requests fail
+    immediately instead of piling up on the server. The breaker of a backend with a :class:`HostPool` only opens when
+    the pool as a whole keeps failing, since the pool already stops using its failing servers.
+
+    When a route cannot be obtained an optional fallback path is synthesized so the simulation keeps flowing:
+
+    * ``straight_line``: a straight path between origin and destination travelled at ``fallback_speed``.
+    * ``neighbour``: the cached route with the closest origin and destination (within ``neighbour_radius`` meters),
+      joined to the origin and destination by straight segments. If there is none a straight path is used.
+    """
+
+    def __init__(
+        self,
+        timeout=DEFAULT_ROUTE_TIMEOUT,
+        retries=DEFAULT_ROUTE_RETRIES,
+        backoff=DEFAULT_ROUTE_BACKOFF,
+        max_backoff=DEFAULT_ROUTE_MAX_BACKOFF,
+        breaker_threshold=DEFAULT_BREAKER_THRESHOLD,
+        breaker_cooldown=DEFAULT_BREAKER_COOLDOWN,
+        fallback=None,
+        fallback_speed=DEFAULT_FALLBACK_SPEED,
+        neighbour_radius=DEFAULT_NEIGHBOUR_RADIUS,
+    ):
+        """
+        Args:
+            timeout (float): the seconds a route request is given (None waits forever)
+            retries (int): the number of times a failed request is retried
+            backoff (float): the upper bound in seconds of the delay before the first retry (doubled on every retry)
+            max_backoff (float): the maximum upper bound of the delay between retries
+            breaker_threshold (int): the consecutive failures that open the circuit of a routing server
+            breaker_cooldown (float): the seconds the circuit of a routing server stays open
+            fallback (str): the fallback path synthesized when there is no route (None, ``straight_line`` or
+                            ``neighbour``)
+            fallback_speed (float): the speed in km/h used to estimate the duration of the fallback paths
+            neighbour_radius (float): the maximum distance in meters to the endpoints of a neighbour route
+        """
+        if fallback not in FALLBACKS:
+            raise ValueError(
+                "Unknown route fallback {}. Use one of {}.".format(fallback, FALLBACKS)
+            )
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.fallback = fallback
+        self.fallback_speed = fallback_speed
+        self.neighbour_radius = neighbour_radius
+        self.breakers = {}
+        self.fallbacks = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            timeout=config.route_timeout,
+            retries=config.route_retries,
+            backoff=config.route_backoff,
+            breaker_threshold=config.route_breaker_threshold,
+            breaker_cooldown=config.route_breaker_cooldown,
+            fallback=config.route_fallback,
+        )
+
+    def get_breaker(self, backend):
+        """
+        Args:
+            backend (RoutingBackend): the routing backend
+
+        Returns:
+            CircuitBreaker: the circuit breaker of the backend
+        """
+        if backend not in self.breakers:
+            self.breakers[backend] = CircuitBreaker(
+                self.breaker_threshold, self.breaker_cooldown
+            )
+        return self.breakers[backend]
+
+    def backoff_delay(self, attempt):
+        """
+        Returns the delay before a retry, drawn uniformly between zero and an exponentially growing bound.
+
+        Args:
+            attempt (int): the number of the retry, starting at 0
+
+        Returns:
+            float: the delay in seconds
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def route(self, backend, route_host, origin, destination):
+        """
+        Requests a route to a backend with a timeout, retrying it with backoff while the circuit of the backend is
+        closed.
+
+        Args:
+            backend (RoutingBackend): the routing backend
+            route_host (str): url of the routing server, used in the log messages
+            origin (list): origin coordinate (latitude, longitude)
+            destination (list): target coordinate (latitude, longitude)
+
+        Returns:
+            list, float, float: the path, the distance of the path in meters and the estimated duration in seconds
+
+        Raises:
+            CircuitOpenError: if the circuit of the backend is open
+            PathRequestException: if there is no route between the points (it is neither retried nor counted as a
+                                  failure of the server)
+            Exception: the error of the last attempt if all of them failed
+        """
+        breaker = self.get_breaker(backend)
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(
+                    "Routing server {} is not available.".format(route_host)
+                )
+            try:
+                result = await asyncio.wait_for(
+                    backend.route(origin, destination), self.timeout
+                )
+            except (asyncio.CancelledError, PathRequestException):
+                breaker.release()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.debug(
+                    "Route request to {} failed ({!r}). Retrying in {:.2f} seconds.".format(
+                        route_host, e, delay
+                    )
+                )
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    def fallback_route(self, origin, destination):
+        """
+        Synthesizes a path between two coordinates without the routing server.
+
+        Args:
+            origin (list): origin coordinate (latitude, longitude)
+            destination (list): target coordinate (latitude, longitude)
+
+        Returns:
+            list, float, float: the path, the distance of the path in meters and the estimated duration in seconds,
+                                or None, None, None if no fallback is configured
+        """
+        if self.fallback is None:
+            return None, None, None
+        meters_per_second = self.fallback_speed / 3.6
+        cache = get_route_cache()
+        neighbour = None
+        if self.fallback == "neighbour" and cache is not None:
+            neighbour = cache.nearest(origin, destination, self.neighbour_radius)
+        self.fallbacks += 1
+        if neighbour is not None:
+            path, distance, duration = neighbour
+            extra = float(
+                haversine_in_meters(origin[0], origin[1], path[0][0], path[0][1])
+                + haversine_in_meters(
+                    path[-1][0], path[-1][1], destination[0], destination[1]
+                )
+            )
+            path = [list(origin)] + [list(p) for p in path] + [list(destination)]
+            return path, distance + extra, duration + extra / meters_per_second
+        distance = float(
+            haversine_in_meters(origin[0], origin[1], destination[0], destination[1])
+        )
+        return [list(origin), list(destination)], distance, distance / meters_per_second
+
+
+_routing_policy = RoutingPolicy()
+
+
+def set_routing_policy(policy):
+    """
+    Sets the process-wide policy used by ``request_route_to_server`` to request routes.
+
+    Args:
+        policy (RoutingPolicy): the policy to be used
+    """
+    global _routing_policy
+    _routing_policy = policy
+
+
+def get_routing_policy():
+    """
+    Returns the process-wide routing policy.
+
+    Returns:
+        RoutingPolicy: the routing policy in use
+    """
+    return _routing_policy
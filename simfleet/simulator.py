@@ -2,7 +2,6 @@ import asyncio
 import io
 import json
 import threading
-import time
 from datetime import datetime
 from pathlib import Path
 from typing import List
@@ -12,20 +11,47 @@ import pandas as pd
 from aiohttp import web as aioweb
 from loguru import logger
 from spade.agent import Agent
-from spade.behaviour import TimeoutBehaviour, OneShotBehaviour
+from spade.behaviour import OneShotBehaviour
 from tabulate import tabulate
 
+from .clock import (
+    DiscreteEventClock,
+    RealTimeClock,
+    TimeoutBehaviour,
+    set_clock,
+)
 from .customer import CustomerAgent
 from .directory import DirectoryAgent
 from .fleetmanager import FleetManagerAgent
+from .frames import EntityRegistry, set_entity_registry
+from .messaging import LightweightAgentMixin, MessageBus, set_message_bus
+from .routing import (
+    RouteCache,
+    RoutingClient,
+    set_route_cache,
+    get_route_cache,
+    set_routing_client,
+    set_routing_backend,
+    RoutingPolicy,
+    set_routing_policy,
+)
 from .station import StationAgent
+from .startup import StartupPipeline
+from .stats import StatsAggregator, set_stats_aggregator
+from .stream import EntityStream
 from .transport import TransportAgent
-from .utils import load_class, status_to_str, avg, request_path as async_request_path
+from .utils import (
+    current_version,
+    load_class,
+    status_to_str,
+    request_path as async_request_path,
+)
+from .warmup import RouteWarmup
 
 faker_factory = faker.Factory.create()
 
 
-class SimulatorAgent(Agent):
+class SimulatorAgent(LightweightAgentMixin, Agent):
     """
     The Simulator. It manages all the simulation processes.
     Tasks done by the simulator at initialization:
@@ -42,6 +68,13 @@ class SimulatorAgent(Agent):
     ):
         self.config = config
 
+        # the discrete event clock needs the bus to know about the messages waiting to be processed
+        self.message_bus = MessageBus(
+            local=config.local_messaging or config.discrete_events,
+            lightweight=config.lightweight_agents,
+        )
+        set_message_bus(self.message_bus)
+
         super().__init__(jid=agentjid, password=password)
 
         self.pretty_name = (
@@ -77,6 +110,11 @@ class SimulatorAgent(Agent):
 
         self.delayed_launch_agents = {}
 
+        self.startup_pipeline = StartupPipeline.from_config(config)
+        self.startup = None
+        self.route_warmup = RouteWarmup.from_config(config)
+        self.warmup = None
+
         logger.info("Starting SimFleet {}".format(self.pretty_name))
 
         self.set_default_strategies(
@@ -87,10 +125,61 @@ class SimulatorAgent(Agent):
             config.station_strategy,
         )
 
+        if config.discrete_events:
+            if config.time_scale != 1:
+                logger.warning("The time scale is ignored in discrete event mode.")
+            self.clock = DiscreteEventClock(
+                settle=config.clock_settle,
+                resolution=config.clock_resolution,
+                pending=self.message_bus.pending_messages,
+            )
+        else:
+            self.clock = RealTimeClock(time_scale=config.time_scale)
+        set_clock(self.clock)
+
+        self.simulation_finished = threading.Event()
+        self.stats = StatsAggregator()
+        self.stats.watch_arrivals(self.check_simulation_finished)
+        set_stats_aggregator(self.stats)
+
         self.route_host = config.route_host
 
+        self.routing_backend = load_class(config.route_backend).from_config(config)
+        set_routing_backend(self.routing_backend)
+
+        self.route_cache = None
+        if config.route_cache_size > 0 or config.route_cache_file:
+            self.route_cache = RouteCache(
+                size=config.route_cache_size,
+                filename=config.route_cache_file,
+                precision=config.route_cache_precision,
+                namespace=self.routing_backend.cache_namespace,
+            )
+        set_route_cache(self.route_cache)
+
+        self.routing_client = RoutingClient(
+            max_connections=config.route_max_connections,
+            max_connections_per_host=config.route_max_connections_per_host,
+            max_concurrency=config.route_max_concurrency,
+            keepalive=config.route_keepalive,
+        )
+        set_routing_client(self.routing_client)
+
+        self.routing_policy = RoutingPolicy.from_config(config)
+        set_routing_policy(self.routing_policy)
+
+        self.entity_registry = EntityRegistry()
+        set_entity_registry(self.entity_registry)
+
+        self.entities_epoch = 0
         self.clear_agents()
 
+        self.entity_stream = EntityStream(
+            self.get_entities,
+            fps=config.stream_fps,
+            tree_every=round(config.stream_fps),
+        )
+
         self.base_path = Path(__file__).resolve().parent
 
         self._icons = None
@@ -118,6 +207,11 @@ class SimulatorAgent(Agent):
         self.web.add_get("/app", self.index_controller, "index.html")
         self.web.add_get("/init", self.init_controller, None)
         self.web.add_get("/entities", self.entities_controller, None)
+        self.web.add_get("/stream", self.entity_stream.handle, None, raw=True)
+        self.web.add_get(
+            "/entities.bin", self.entities_binary_controller, None, raw=True
+        )
+        self.web.add_get("/entities.names", self.entity_names_controller, None)
         self.web.add_get("/run", self.run_controller, None)
         self.web.add_get("/stop", self.stop_agents_controller, None)
         self.web.add_get("/clean", self.clean_controller, None)
@@ -157,61 +251,80 @@ class SimulatorAgent(Agent):
             strategy = manager.get("strategy")
             icon = manager.get("icon")
             agent = self.create_fleetmanager_agent(
-                name, password, fleet_type=fleet_type, strategy=strategy
+                name, password, fleet_type=fleet_type, strategy=strategy, start=False
             )
 
             self.set_icon(agent, icon, default=fleet_type)
 
-        while len(self.manager_agents) < self.config.num_managers:
-            time.sleep(0.1)
+        # the transports register in their fleet managers, so these are started first
+        self.submit(self.start_agents(list(self.manager_agents.values()))).result()
 
-        all_coroutines = []
+        agents = []
         try:
             future = self.submit(
                 self.async_create_agents_batch_transport(self.config["transports"])
             )
-            all_coroutines += future.result()
+            agents += future.result()
         except Exception as e:
             logger.exception("EXCEPTION creating Transport agents batch {}".format(e))
         try:
             future = self.submit(
                 self.async_create_agents_batch_customer(self.config["customers"])
             )
-            all_coroutines += future.result()
+            agents += future.result()
         except Exception as e:
             logger.exception("EXCEPTION creating Customer agents batch {}".format(e))
         try:
             future = self.submit(
                 self.async_create_agents_batch_station(self.config["stations"])
             )
-            all_coroutines += future.result()
+            agents += future.result()
         except Exception as e:
             logger.exception("EXCEPTION creating Station agents batch {}".format(e))
 
-        assert all([asyncio.iscoroutine(x) for x in all_coroutines])
-        self.submit(self.gather_batch(all_coroutines))
-
-    async def gather_batch(self, all_coroutines):
-        agents_batch = 20
-        number = max(len(all_coroutines), 0)
-        iterations = [agents_batch] * (number // agents_batch)
-        if number % agents_batch:
-            iterations.append(number % agents_batch)
-        current_index = 0
-        for iteration in iterations:
-            logger.info(
-                "Agent Batch Creation. Iteration current_index = {}".format(
-                    current_index
-                )
-            )
-            current_coros = all_coroutines[current_index : current_index + iteration]
-            current_index += iteration
-            await asyncio.sleep(0.1)
-            await asyncio.gather(*current_coros)
-        logger.success("All agents gathered")
+        self.startup = self.submit(self.start_agents(agents))
+
+        if self.config.route_warmup:
+            # the routes are prefetched while the agents start
+            self.warmup = self.submit(self.warm_up_routes())
+
+    async def start_agents(self, agents):
+        """
+        Starts a list of agents through the startup pipeline.
+
+        Args:
+            agents (list): the agents to start
+
+        Returns:
+            StartupReport: the outcome of the startup
+        """
+        report = await self.startup_pipeline.run(agents)
+        logger.success("Agents started: {}".format(report))
+        return report
+
+    async def warm_up_routes(self):
+        """
+        Prefetches the first routes of the scenario into the route cache: the routes of the customers and the routes
+        from their closest transports to them.
+
+        Returns:
+            WarmupReport: the outcome of the warm-up
+        """
+        transports = [
+            transport.get_position() for transport in self.transport_agents.values()
+        ]
+        customers = [
+            (customer.current_pos, customer.dest)
+            for customer in self.customer_agents.values()
+        ]
+        pairs = self.route_warmup.pairs(transports, customers)
+        logger.info("Prefetching {} routes...".format(len(pairs)))
+        report = await self.route_warmup.run(pairs, self.route_host)
+        logger.success("Routes warmed up: {}".format(report))
+        return report
 
     async def async_create_agents_batch_transport(self, agents: list) -> List:
-        coros = []
+        starting = []
         for transport in agents:
             name = transport["name"]
             logger.debug("transport creation batch = {}".format(name))
@@ -255,11 +368,11 @@ class SimulatorAgent(Agent):
                     self.delayed_launch_agents[delay] = []
                 self.delayed_launch_agents[delay].append(agent)
             else:
-                coros.append(agent.start())
-        return coros
+                starting.append(agent)
+        return starting
 
     async def async_create_agents_batch_customer(self, agents: list) -> List:
-        coros = []
+        starting = []
         for customer in agents:
             name = customer["name"]
             logger.debug("customer creation batch = {}".format(name))
@@ -297,11 +410,11 @@ class SimulatorAgent(Agent):
                     self.delayed_launch_agents[delay] = []
                 self.delayed_launch_agents[delay].append(agent)
             else:
-                coros.append(agent.start())
-        return coros
+                starting.append(agent)
+        return starting
 
     async def async_create_agents_batch_station(self, agents: list) -> List:
-        coros = []
+        starting = []
         for station in agents:
             logger.debug("station creation batch = {}".format(station["name"]))
             password = (
@@ -321,8 +434,8 @@ class SimulatorAgent(Agent):
             )
             self.set_icon(agent, icon, default="electric_station")
 
-            coros.append(agent.start())
-        return coros
+            starting.append(agent)
+        return starting
 
     def load_icons(self, filename):
         with filename.open() as f:
@@ -364,6 +477,25 @@ class SimulatorAgent(Agent):
             return False
         return self.time_is_out() or self.all_customers_in_destination()
 
+    def check_simulation_finished(self, *args):
+        """
+        Sets the ``simulation_finished`` event if the simulation is finished.
+        """
+        if self.is_simulation_finished():
+            self.simulation_finished.set()
+
+    def wait_until_finished(self, timeout=None):
+        """
+        Blocks until the simulation is finished, without polling the agents.
+
+        Args:
+            timeout (float, optional): maximum (real) seconds to wait
+
+        Returns:
+            bool: whether the simulation is finished
+        """
+        return self.simulation_finished.wait(timeout)
+
     def time_is_out(self):
         """
         Checks if the max simulation time has been reached.
@@ -371,7 +503,7 @@ class SimulatorAgent(Agent):
         Returns:
             bool: whether the max simulation time has been reached or not.
         """
-        return self.get_simulation_time() > self.config.max_time
+        return self.get_simulation_time() >= self.config.max_time
 
     def run(self):
         """
@@ -384,12 +516,22 @@ class SimulatorAgent(Agent):
                 if not self.agent.simulation_running:
                     self.agent.kill_simulator.clear()
                     with self.agent.simulation_mutex:
-                        all_agents = (
-                            list(self.agent.manager_agents.values())
+                        failed = set()
+                        if self.agent.startup is not None:
+                            report = await asyncio.wrap_future(self.agent.startup)
+                            failed = set(report.failed)
+                        if self.agent.warmup is not None:
+                            await self.agent.route_warmup.wait(
+                                asyncio.wrap_future(self.agent.warmup)
+                            )
+                        all_agents = [
+                            agent
+                            for agent in list(self.agent.manager_agents.values())
                             + list(self.agent.transport_agents.values())
                             + list(self.agent.customer_agents.values())
                             + list(self.agent.station_agents.values())
-                        )
+                            if str(agent.jid) not in failed
+                        ]
                         while not all([agent.is_ready() for agent in all_agents]):
                             logger.debug("Waiting for all agents to be ready")
                             await asyncio.sleep(0.5)
@@ -415,7 +557,18 @@ class SimulatorAgent(Agent):
                             )
 
                     self.agent.simulation_running = True
-                    self.agent.simulation_init_time = time.time()
+                    self.agent.simulation_init_time = self.agent.clock.time()
+                    self.agent.submit(self.agent.clock.run())
+
+                    if self.agent.config.max_time:
+                        self.agent.add_behaviour(
+                            MaxTimeBehaviour(
+                                start_at=datetime.fromtimestamp(
+                                    self.agent.simulation_init_time
+                                    + self.agent.config.max_time
+                                )
+                            )
+                        )
 
                     for delay in self.agent.delayed_launch_agents:
                         agents = self.agent.delayed_launch_agents[delay]
@@ -448,8 +601,30 @@ class SimulatorAgent(Agent):
 
         self.stop_agents()
 
+        self.clock.stop()
+
+        logger.debug(
+            "{} messages were delivered in-process.".format(
+                self.message_bus.delivered
+            )
+        )
+        if self.message_bus.dropped:
+            logger.error(
+                "{} messages could not be delivered.".format(self.message_bus.dropped)
+            )
+
         self.print_stats()
 
+        self.submit(self.entity_stream.close()).result()
+
+        self.submit(self.routing_backend.close()).result()
+        self.submit(self.routing_client.close()).result()
+
+        if self.route_cache is not None:
+            self.route_cache.close()
+            if get_route_cache() is self.route_cache:
+                set_route_cache(None)
+
         return super().stop()
 
     def collect_stats(self):
@@ -630,6 +805,11 @@ class SimulatorAgent(Agent):
         """
         Web controller that returns a dict with the entities of the simulator and their statuses.
 
+        The client can send the ``cursor`` and ``epoch`` returned by a previous call as query parameters to receive
+        only the entities that changed since then (the transports only include their ``path`` if it changed too).
+        In that case the tree view is only included if the ``tree`` parameter is set. A full snapshot (with
+        ``"full": True``) is returned when there is no cursor or it is no longer valid (e.g. the simulation was reset).
+
         Example of the entities returned data::
 
             {
@@ -689,26 +869,117 @@ class SimulatorAgent(Agent):
                         "id": "michaelstewart"
                     }
                 ],
+                "cursor": 1024,
+                "epoch": 1,
+                "full": True
             }
 
         Returns:
             dict:  no template is returned since this is an AJAX controller, a dict with the list of transports, the list of customers, the tree view to be showed in the sidebar and the stats of the simulation.
         """
+        try:
+            cursor = int(request.query["cursor"])
+            epoch = int(request.query["epoch"])
+        except (KeyError, ValueError):
+            cursor, epoch = None, None
+        return self.get_entities(cursor, epoch, tree="tree" in request.query)
+
+    async def entities_binary_controller(self, request):
+        """
+        Web controller that returns the position and status of the launched transports and customers and of the
+        stations as a binary frame (see :mod:`simfleet.frames`), packed from the array-backed agent state.
+
+        Args:
+            request (aiohttp.web.Request): the request
+
+        Returns:
+            aiohttp.web.Response: the binary frame
+        """
+        frame = self.entity_registry.pack(self.entities_epoch, current_version())
+        return aioweb.Response(
+            body=frame,
+            content_type="application/octet-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    async def entity_names_controller(self, request):
+        """
+        Web controller that returns the names of the agents indexed by their ids in the binary frames.
+
+        Returns:
+            dict: the names of the transports, customers and stations and the epoch of the simulation
+        """
+        names = self.entity_registry.names()
+        names["epoch"] = self.entities_epoch
+        return names
+
+    def get_entities(self, cursor=None, epoch=None, tree=True):
+        """
+        Returns the entities of the simulator and their statuses, as the entities controller.
+
+        Args:
+            cursor (int, optional): the change sequence number of a previous call
+            epoch (int, optional): the epoch of a previous call
+            tree (bool): whether the tree view is included in a delta
+
+        Returns:
+            dict: a full snapshot if there is no cursor or it is no longer valid, or the entities that changed since
+                  the cursor otherwise
+        """
+        since = cursor
+        if (
+            epoch != self.entities_epoch
+            or since is None
+            or since < 0
+            or since > current_version()
+        ):
+            since = None
+        cursor = current_version()
+        if since is None:
+            return {
+                "transports": [
+                    transport.to_json()
+                    for transport in self.transport_agents.values()
+                    if transport.is_launched
+                ],
+                "customers": [
+                    customer.to_json()
+                    for customer in self.customer_agents.values()
+                    if customer.is_launched
+                ],
+                "tree": self.generate_tree(),
+                "stats": self.get_stats(),
+                "stations": [
+                    station.to_json() for station in self.station_agents.values()
+                ],
+                "cursor": cursor,
+                "epoch": self.entities_epoch,
+                "full": True,
+            }
+
         result = {
             "transports": [
-                transport.to_json()
+                transport.to_json(since=since)
                 for transport in self.transport_agents.values()
-                if transport.is_launched
+                if transport.is_launched and transport.version > since
             ],
             "customers": [
                 customer.to_json()
                 for customer in self.customer_agents.values()
-                if customer.is_launched
+                if customer.is_launched and customer.changed_since(since)
             ],
-            "tree": self.generate_tree(),
             "stats": self.get_stats(),
-            "stations": [station.to_json() for station in self.station_agents.values()],
+            "stations": [
+                station.to_json()
+                for station in self.station_agents.values()
+                if station.version > since
+            ],
+            "cursor": cursor,
+            "epoch": self.entities_epoch,
+            "full": False,
         }
+        if tree:
+            result["tree"] = self.generate_tree()
         return result
 
     def generate_tree(self):
@@ -766,46 +1037,10 @@ class SimulatorAgent(Agent):
             dict: a dict with the total time, waiting time, is_running and finished values
 
         """
-        if len(self.customer_agents) > 0:
-            waiting = avg(
-                [
-                    customer.get_waiting_time()
-                    for customer in self.customer_agents.values()
-                ]
-            )
-            total = avg(
-                [
-                    customer.total_time()
-                    for customer in self.customer_agents.values()
-                    if customer.total_time()
-                ]
-            )
-        else:
-            waiting, total = 0, 0
-
-        if len(self.transport_agents) > 0:
-            t_waiting = avg(
-                [
-                    transport.total_waiting_time
-                    for transport in self.transport_agents.values()
-                ]
-            )
-            t_charging = avg(
-                [
-                    transport.total_charging_time
-                    for transport in self.transport_agents.values()
-                ]
-            )
-            distance = avg(
-                [
-                    sum(transport.distances)
-                    for transport in self.transport_agents.values()
-                ]
-            )
-        else:
-            t_waiting = 0
-            t_charging = 0
-            distance = 0
+        averages = self.stats.get_averages(self.get_stats_time())
+        waiting, total = averages["waiting"], averages["totaltime"]
+        t_waiting, t_charging = averages["t_waiting"], averages["t_charging"]
+        distance = averages["distance"]
 
         return {
             "waiting": "{0:.2f}".format(waiting),
@@ -817,6 +1052,17 @@ class SimulatorAgent(Agent):
             "is_running": self.simulation_running,
         }
 
+    def get_stats_time(self):
+        """
+        Returns the current time for the statistics, which is frozen when the simulation stops.
+
+        Returns:
+            float: the current time
+        """
+        if self.simulation_init_time and not self.simulation_running:
+            return self.simulation_init_time + (self.simulation_time or 0)
+        return self.clock.time()
+
     def all_customers_in_destination(self):
         """
         Checks whether the simulation has finished or not.
@@ -827,12 +1073,7 @@ class SimulatorAgent(Agent):
             bool: whether the simulation has finished or not.
         """
         if len(self.customer_agents) > 0:
-            return all(
-                [
-                    customer.is_in_destination()
-                    for customer in self.customer_agents.values()
-                ]
-            )
+            return self.stats.customers_arrived >= len(self.customer_agents)
         else:
             return False
 
@@ -942,6 +1183,10 @@ class SimulatorAgent(Agent):
         self.set("transport_agents", {})
         self.set("customer_agents", {})
         self.set("station_agents", {})
+        self.stats.reset()
+        self.entity_registry.reset()
+        self.simulation_finished.clear()
+        self.entities_epoch += 1
         self.simulation_time = None
         self.simulation_init_time = None
 
@@ -949,6 +1194,14 @@ class SimulatorAgent(Agent):
         """
         Removes from the transport and customer sets every agent that is stopped.
         """
+        for kind, arrays in (
+            ("transport_agents", self.entity_registry.transports),
+            ("customer_agents", self.entity_registry.customers),
+            ("station_agents", self.entity_registry.stations),
+        ):
+            for agent in self.get(kind).values():
+                if agent.stopped:
+                    arrays.set_visible(agent.name, False)
         agents = self.get("manager_agents")
         self.set(
             "manager_agents",
@@ -960,6 +1213,9 @@ class SimulatorAgent(Agent):
             {jid: agent for jid, agent in agents.items() if not agent.stopped},
         )
         agents = self.get("customer_agents")
+        self.stats.forget_customers(
+            [agent.name for agent in agents.values() if agent.stopped]
+        )
         self.set(
             "customer_agents",
             {jid: agent for jid, agent in agents.items() if not agent.stopped},
@@ -969,6 +1225,7 @@ class SimulatorAgent(Agent):
             "station_agents",
             {jid: agent for jid, agent in agents.items() if not agent.stopped},
         )
+        self.entities_epoch += 1
         self.simulation_time = None
         self.simulation_init_time = None
 
@@ -981,7 +1238,7 @@ class SimulatorAgent(Agent):
         results = []
         if not self.simulation_time:
             self.simulation_time = (
-                time.time() - self.simulation_init_time
+                self.clock.time() - self.simulation_init_time
                 if self.simulation_init_time
                 else 0
             )
@@ -1261,7 +1518,7 @@ class SimulatorAgent(Agent):
         agent.start().result()
 
     def create_fleetmanager_agent(
-        self, name, password, fleet_type, strategy=None, icon=None
+        self, name, password, fleet_type, strategy=None, icon=None, start=True
     ):
         jid = f"{name}@{self.jid.domain}"
         agent = FleetManagerAgent(jid, password)
@@ -1270,6 +1527,7 @@ class SimulatorAgent(Agent):
         agent.set_directory(self.get_directory().jid)
         logger.debug("Assigning type {} to fleet manager {}".format(fleet_type, name))
         agent.set_fleet_type(fleet_type)
+        agent.set_route_host(self.route_host)
 
         if strategy:
             agent.strategy = load_class(strategy)
@@ -1283,7 +1541,8 @@ class SimulatorAgent(Agent):
 
         agent.is_launched = True
 
-        self.submit(self.async_start_agent(agent))
+        if start:
+            self.submit(self.async_start_agent(agent))
 
         return agent
 
@@ -1309,6 +1568,7 @@ class SimulatorAgent(Agent):
         agent.set_fleet_type(fleet_type)
         agent.set_fleetmanager(fleetmanager)
         agent.set_route_host(self.route_host)
+        agent.set_distance_method(self.config.distance_method)
         agent.set_directory(self.get_directory().jid)
         if autonomy:
             agent.set_autonomy(autonomy, current_autonomy=current_autonomy)
@@ -1510,7 +1770,7 @@ class SimulatorAgent(Agent):
         if not self.simulation_init_time:
             return 0
         if self.simulation_running:
-            return time.time() - self.simulation_init_time
+            return self.clock.time() - self.simulation_init_time
         return self.simulation_time
 
     def request_path(self, origin, destination):
@@ -1535,4 +1795,17 @@ class DelayedLaunchBehaviour(TimeoutBehaviour):
     async def run(self):
         for agent in self.agents:
             agent.is_launched = True
+            agent.touch()
             await agent.start()
+
+
+class MaxTimeBehaviour(TimeoutBehaviour):
+    """
+    Finishes the simulation when the max simulation time is reached.
+    """
+
+    async def run(self):
+        # the behaviour is woken up at the max time, which may be a few microseconds short of it once converted to a
+        # datetime, so the time is not checked again
+        logger.info("Max simulation time reached.")
+        self.agent.simulation_finished.set()
@@ -0,0 +1,199 @@
+"""
+Spatial module
+
+A grid index that buckets moving or static items (transports, stations...) by their coordinates so that the items
+closest to a point can be found without scanning all of them.
+"""
+
+import math
+from collections import defaultdict
+
+from .helpers import EARTH_RADIUS_IN_METERS, haversine_in_meters
+
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_IN_METERS / 180
+DEFAULT_CELL_SIZE = 0.01  # about 1 km of latitude
+
+
+class GridIndex(object):
+    """
+    An index of items located at coordinates (latitude, longitude) bucketed in a regular grid of cells.
+    Every item has a key, a position and an optional value (e.g. its status).
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        """
+        Args:
+            cell_size (float): the side of the cells in degrees
+        """
+        self.cell_size = cell_size
+        self.cells = defaultdict(dict)
+        self.items = {}
+        # the cells ever used (min lat, max lat, min lng, max lng), which bound the search rings
+        self._bounds = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def _cell(self, position):
+        return (
+            int(math.floor(position[0] / self.cell_size)),
+            int(math.floor(position[1] / self.cell_size)),
+        )
+
+    def update(self, key, position, value=None):
+        """
+        Adds an item to the index or updates its position and value.
+
+        Args:
+            key (str): the key of the item
+            position (list): the coordinates of the item (latitude, longitude)
+            value (object, optional): any data attached to the item
+        """
+        cell = self._cell(position)
+        if key in self.items:
+            old_cell = self.items[key][2]
+            if old_cell != cell:
+                del self.cells[old_cell][key]
+                if not self.cells[old_cell]:
+                    del self.cells[old_cell]
+        self.items[key] = (position, value, cell)
+        self.cells[cell][key] = position
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_lat, max_lat, min_lng, max_lng = self._bounds
+            self._bounds = (
+                min(min_lat, cell[0]),
+                max(max_lat, cell[0]),
+                min(min_lng, cell[1]),
+                max(max_lng, cell[1]),
+            )
+
+    def set_value(self, key, value):
+        """
+        Updates the value of an item keeping its position.
+
+        Args:
+            key (str): the key of the item
+            value (object): the new value
+        """
+        position, _, cell = self.items[key]
+        self.items[key] = (position, value, cell)
+
+    def get(self, key):
+        """
+        Returns the position and value of an item.
+
+        Args:
+            key (str): the key of the item
+
+        Returns:
+            list, object: the position and value of the item, or None, None if it is not in the index
+        """
+        if key not in self.items:
+            return None, None
+        position, value, _ = self.items[key]
+        return position, value
+
+    def remove(self, key):
+        """
+        Removes an item from the index (if it is in it).
+
+        Args:
+            key (str): the key of the item
+        """
+        if key not in self.items:
+            return
+        _, _, cell = self.items.pop(key)
+        del self.cells[cell][key]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def nearest(self, position, k=1, condition=None):
+        """
+        Returns the ``k`` items closest to a position (as the crow flies).
+        The cells are visited in rings around the position until no closer item can be found.
+
+        Args:
+            position (list): the coordinates (latitude, longitude)
+            k (int): the number of items to return
+            condition (function, optional): a function ``f(key, value)`` that returns whether an item can be returned
+
+        Returns:
+            list: a list of (key, distance in meters) tuples sorted by distance
+        """
+        if not self.cells or k <= 0:
+            return []
+        center = self._cell(position)
+        min_lat, max_lat, min_lng, max_lng = self._bounds
+        max_ring = max(
+            abs(center[0] - min_lat),
+            abs(center[0] - max_lat),
+            abs(center[1] - min_lng),
+            abs(center[1] - max_lng),
+        )
+        found = []
+        for ring in range(max_ring + 1):
+            if len(found) >= k:
+                # every item in this ring is at least (ring - 1) cells away
+                lat = min(89.9, abs(position[0]) + ring * self.cell_size)
+                bound = (
+                    (ring - 1)
+                    * self.cell_size
+                    * METERS_PER_DEGREE
+                    * math.cos(math.radians(lat))
+                )
+                if bound > found[k - 1][1]:
+                    break
+            for cell in self._ring(center, ring):
+                for key, item_position in self.cells.get(cell, {}).items():
+                    if condition is not None and not condition(
+                        key, self.items[key][1]
+                    ):
+                        continue
+                    distance = float(
+                        haversine_in_meters(
+                            position[0], position[1], item_position[0], item_position[1]
+                        )
+                    )
+                    found.append((key, distance))
+            found.sort(key=lambda item: item[1])
+        return found[:k]
+
+    @staticmethod
+    def _ring(center, ring):
+        if ring == 0:
+            yield center
+            return
+        lat, lng = center
+        for i in range(-ring, ring + 1):
+            yield lat - ring, lng + i
+            yield lat + ring, lng + i
+        for i in range(-ring + 1, ring):
+            yield lat + i, lng - ring
+            yield lat + i, lng + ring
+
+
+def get_station_index(stations, index=None):
+    """
+    Returns a spatial index of the stations informed by the directory. It is built once per directory answer, in
+    linear time. If the index of a previous answer with the same stations is given, it is updated in place instead.
+
+    Args:
+        stations (dict): the stations informed by the directory, indexed by jid,
+                         each one with (at least) its ``position`` and ``status``
+        index (GridIndex, optional): the index of a previous answer
+
+    Returns:
+        GridIndex: an index with the station jids as keys and their status as values
+    """
+    if index is None or len(index) != len(stations) or any(
+        jid not in index for jid in stations
+    ):
+        index = GridIndex()
+    for jid, station in stations.items():
+        index.update(jid, list(station["position"]), station.get("status"))
+    return index
@@ -0,0 +1,205 @@
+"""
+Startup module
+
+Starts the agents of a scenario through a pipeline that keeps a window of agents logging in at the same time. The
+window grows while the XMPP server acknowledges the logins quickly and shrinks when it slows down or logins fail, the
+failed starts are retried with a growing delay, and the progress is reported as the agents start.
+"""
+
+import asyncio
+import time
+
+from loguru import logger
+
+
+class StartupReport(object):
+    """
+    The outcome of starting a set of agents.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.started = 0
+        self.retried = 0
+        self.failed = []
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def pending(self):
+        return self.total - self.started - len(self.failed)
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    def __str__(self):
+        return "{}/{} agents started, {} failed, {} retries in {:.1f} seconds".format(
+            self.started, self.total, len(self.failed), self.retried, self.elapsed
+        )
+
+
+class StartupPipeline(object):
+    """
+    Starts agents with a bounded (and adaptive) number of concurrent logins.
+    """
+
+    def __init__(
+        self,
+        window=20,
+        max_window=200,
+        retries=3,
+        retry_delay=0.5,
+        timeout=30,
+        progress_interval=2.0,
+    ):
+        """
+        Args:
+            window (int): the number of agents started concurrently at first
+            max_window (int): the maximum number of agents started concurrently. If it is not greater than
+                              ``window`` the window does not adapt
+            retries (int): the number of times a failed start is retried
+            retry_delay (float): the seconds to wait before the first retry (doubled on every retry)
+            timeout (float): the seconds an agent is given to start
+            progress_interval (float): the seconds between progress reports
+        """
+        self.min_window = 1
+        self.window = max(self.min_window, int(window))
+        self.max_window = max(self.window, int(max_window))
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.progress_interval = progress_interval
+        self.latency = None
+        self.base_latency = None
+        self._last_progress = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            window=config.startup_window,
+            max_window=config.startup_max_window,
+            retries=config.startup_retries,
+            timeout=config.startup_timeout,
+        )
+
+    def _adapt(self, latency=None, failed=False):
+        """
+        Adapts the window: it grows by one agent per window of fast starts and halves when a start fails or the
+        latency of the starts doubles its best value.
+        """
+        if failed:
+            self.window = max(self.min_window, self.window // 2)
+            return
+        self.latency = (
+            latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        )
+        if self.base_latency is None or latency < self.base_latency:
+            self.base_latency = latency
+        if self.latency > 2 * self.base_latency:
+            self.window = max(self.min_window, self.window // 2)
+            # forget the history so the window does not keep shrinking
+            self.latency = self.base_latency
+        elif self.window < self.max_window:
+            self.window += 1 / self.window
+
+    async def start_agent(self, agent, report):
+        """
+        Starts an agent, retrying it if it fails.
+
+        Args:
+            agent (spade.agent.Agent): the agent
+            report (StartupReport): the report where the outcome is recorded
+        """
+        delay = self.retry_delay
+        # the behaviours added before the start (e.g. in the constructor) are kept on a retry
+        behaviours = len(agent.behaviours)
+        for attempt in range(self.retries + 1):
+            started = time.time()
+            try:
+                await asyncio.wait_for(agent.start(), self.timeout)
+            except Exception as e:
+                self._adapt(failed=True)
+                if attempt == self.retries:
+                    logger.error("Agent {} could not start: {}".format(agent.jid, e))
+                    report.failed.append(str(agent.jid))
+                    return
+                logger.warning(
+                    "Agent {} failed to start ({}). Retrying in {:.1f} seconds.".format(
+                        agent.jid, e, delay
+                    )
+                )
+                report.retried += 1
+                await self.reset_agent(agent, behaviours)
+                await asyncio.sleep(delay)
+                delay *= 2
+            else:
+                self._adapt(latency=time.time() - started)
+                report.started += 1
+                return
+
+    async def reset_agent(self, agent, behaviours=0):
+        """
+        Undoes a partial start of an agent before it is started again. A start that failed or timed out after
+        connecting to the XMPP server may have run the setup of the agent, which would add its behaviours twice.
+
+        Args:
+            agent (spade.agent.Agent): the agent
+            behaviours (int): the number of behaviours the agent had before it was started, which are kept
+        """
+        for behaviour in agent.behaviours[behaviours:]:
+            behaviour.kill()
+        del agent.behaviours[behaviours:]
+        # the agent is not stopped, which would kill the behaviours that are kept: it is only disconnected and the
+        # next start connects it again
+        try:
+            client = getattr(agent, "client", None)
+            if client is not None and client.running:
+                client.stop()
+        except Exception as e:
+            logger.warning(
+                "Agent {} could not be disconnected: {}".format(agent.jid, e)
+            )
+
+    def report_progress(self, report, force=False):
+        now = time.time()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            logger.info(
+                "Starting agents: {} (window {})".format(report, int(self.window))
+            )
+
+    async def run(self, agents):
+        """
+        Starts a list of agents.
+
+        Args:
+            agents (list): the agents to start
+
+        Returns:
+            StartupReport: the outcome of the startup
+        """
+        report = StartupReport(len(agents))
+        pending = iter(agents)
+        running = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(running) < int(self.window):
+                agent = next(pending, None)
+                if agent is None:
+                    exhausted = True
+                    break
+                running.add(asyncio.ensure_future(self.start_agent(agent, report)))
+            if not running:
+                break
+            _, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            self.report_progress(report)
+        report.finished_at = time.time()
+        if report.failed:
+            logger.error(
+                "Agents that could not start: {}".format(", ".join(report.failed))
+            )
+        return report
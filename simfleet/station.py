@@ -1,14 +1,15 @@
 import datetime
 import json
-import time
 from asyncio import CancelledError
 
 from loguru import logger
 from spade.agent import Agent
-from spade.behaviour import TimeoutBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from .clock import TimeoutBehaviour, get_clock
+from .frames import get_entity_registry
+from .messaging import LightweightAgentMixin, get_message_bus
 from .helpers import random_position
 from .protocol import (
     REQUEST_PROTOCOL,
@@ -28,12 +29,14 @@ from .utils import (
     TRANSPORT_MOVING_TO_STATION,
     TRANSPORT_IN_STATION_PLACE,
     TRANSPORT_CHARGED,
+    next_version,
 )
 
 
-class StationAgent(Agent):
+class StationAgent(LightweightAgentMixin, Agent):
     def __init__(self, agentjid, password):
         super().__init__(jid=agentjid, password=password)
+        self.version = 0
         self.agent_id = None
         self.icon = None
         self.strategy = None
@@ -48,6 +51,7 @@ class StationAgent(Agent):
         self.power = None
         self.stopped = False
         self.ready = False
+        get_entity_registry().stations.set_visible(self.name)
 
         # waiting waiting_list
         self.waiting_list = list()
@@ -108,11 +112,7 @@ class StationAgent(Agent):
         self.ready = True
 
     async def send(self, msg):
-        if not msg.sender:
-            msg.sender = str(self.jid)
-            logger.debug(f"Adding agent's jid as sender to message: {msg}")
-        aioxmpp_msg = msg.prepare()
-        await self.client.send(aioxmpp_msg)
+        await get_message_bus().deliver(msg, self)
         msg.sent = True
         self.traces.append(msg, category=str(self))
 
@@ -168,6 +168,8 @@ class StationAgent(Agent):
             self.current_pos = coords
         else:
             self.current_pos = random_position()
+        self.touch()
+        get_entity_registry().stations.set_position(self.name, self.current_pos)
 
         logger.debug(
             "Station {} position is {}".format(self.agent_id, self.current_pos)
@@ -182,14 +184,23 @@ class StationAgent(Agent):
         """
         return self.current_pos
 
+    def touch(self):
+        """
+        Marks the station as changed for the delta updates of the web interface.
+        """
+        self.version = next_version()
+
     def set_status(self, state=FREE_STATION):
         self.status = state
+        self.touch()
+        get_entity_registry().stations.set_status(self.name, state)
 
     def get_status(self):
         return self.status
 
     def set_available_places(self, places):
         self.available_places = places
+        self.touch()
 
     def get_available_places(self):
         return self.available_places
@@ -251,7 +262,7 @@ class StationAgent(Agent):
             transport_id = self.waiting_list.pop(0)
             # time statistics update
             if len(self.waiting_list) == 0:
-                self.empty_queue_time = time.time()
+                self.empty_queue_time = get_clock().time()
                 self.total_busy_time += (
                     self.empty_queue_time - self.transports_in_queue_time
                 )
@@ -279,7 +290,7 @@ class StationAgent(Agent):
 
     async def charging_transport(self, need, transport_id):
         total_time = need / self.get_power()
-        now = datetime.datetime.now()
+        now = get_clock().now()
         start_at = now + datetime.timedelta(seconds=total_time)
         logger.info(
             "Station {} started charging transport {} for {} seconds. From {} to {}.".format(
@@ -503,7 +514,7 @@ class StationStrategyBehaviour(StrategyBehaviour):
                 else:  # self.agent.get_status() == BUSY_STATION
                     # time statistics update
                     if len(self.agent.waiting_list) == 0:
-                        self.agent.transports_in_queue_time = time.time()
+                        self.agent.transports_in_queue_time = get_clock().time()
                     # transport waits in a waiting_list until it is available to charge
                     self.agent.waiting_list.append(str(transport_id))
                     # list length statistics update
@@ -0,0 +1,214 @@
+"""
+Stats module
+
+The agents push their statistic events (pickups, drop-offs, charges, travelled distance...) to a process-wide
+:class:`StatsAggregator` that keeps running sums, so the averages of the simulation can be read in constant time
+instead of iterating over every agent.
+"""
+
+
+class StatsAggregator(object):
+    """
+    Incremental aggregator of the simulation statistics.
+    As :func:`simfleet.utils.avg`, the averages leave out the agents whose value is zero or unknown.
+    """
+
+    def __init__(self):
+        self._arrival_callbacks = []
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all the statistics.
+        """
+        self._started = set()
+        self._arrived = set()
+        # customers that are waiting for a transport
+        self.customers_waiting = 0
+        self._waiting_init_times = 0.0
+        # customers that have been picked up
+        self.customers_picked_up = 0
+        self._waiting_times = 0.0
+        # customers that have arrived to their destination
+        self.customers_in_destination = 0
+        self._total_times = 0.0
+
+        self._transport_totals = {
+            "waiting": {},
+            "charging": {},
+            "distance": {},
+        }
+        self._transport_sums = {"waiting": 0.0, "charging": 0.0, "distance": 0.0}
+        self._transport_counts = {"waiting": 0, "charging": 0, "distance": 0}
+
+    def customer_started(self, name, init_time):
+        """
+        A customer started to look for a transport.
+
+        Args:
+            name (str): the name of the customer
+            init_time (float): the time when it started
+        """
+        if name in self._started:
+            return
+        self._started.add(name)
+        self.customers_waiting += 1
+        self._waiting_init_times += init_time
+
+    def customer_picked_up(self, name, init_time, pickup_time):
+        """
+        A customer was picked up by a transport.
+
+        Args:
+            name (str): the name of the customer
+            init_time (float): the time when it started to look for a transport
+            pickup_time (float): the time when it was picked up
+        """
+        if name not in self._started:
+            return
+        self.customers_waiting -= 1
+        self._waiting_init_times -= init_time
+        if pickup_time != init_time:
+            self.customers_picked_up += 1
+            self._waiting_times += pickup_time - init_time
+
+    def customer_in_destination(self, name, init_time, end_time):
+        """
+        A customer arrived to its destination.
+
+        Args:
+            name (str): the name of the customer
+            init_time (float): the time when it started to look for a transport
+            end_time (float): the time when it arrived
+        """
+        if name not in self._started or name in self._arrived:
+            return
+        self._arrived.add(name)
+        if end_time != init_time:
+            self.customers_in_destination += 1
+            self._total_times += end_time - init_time
+        for callback in self._arrival_callbacks:
+            callback(name)
+
+    @property
+    def customers_arrived(self):
+        """
+        Returns:
+            int: the number of customers that have arrived to their destination
+        """
+        return len(self._arrived)
+
+    def forget_customers(self, names):
+        """
+        Removes customers from the count of arrived customers, e.g. when their agents are removed from the simulation.
+        Their times remain in the averages.
+
+        Args:
+            names (list): the names of the customers
+        """
+        for name in names:
+            self._arrived.discard(name)
+
+    def watch_arrivals(self, callback):
+        """
+        Registers a function that is called with the name of every customer that arrives to its destination.
+
+        Args:
+            callback (function): the function to call
+        """
+        self._arrival_callbacks.append(callback)
+
+    def _add_to_transport(self, stat, name, value):
+        if not value:
+            return
+        totals = self._transport_totals[stat]
+        old = totals.get(name, 0.0)
+        totals[name] = old + value
+        self._transport_sums[stat] += value
+        if not old:
+            self._transport_counts[stat] += 1
+
+    def transport_waited(self, name, seconds):
+        """
+        A transport waited in the queue of a station.
+
+        Args:
+            name (str): the name of the transport
+            seconds (float): the waiting time
+        """
+        self._add_to_transport("waiting", name, seconds)
+
+    def transport_charged(self, name, seconds):
+        """
+        A transport finished charging.
+
+        Args:
+            name (str): the name of the transport
+            seconds (float): the charging time
+        """
+        self._add_to_transport("charging", name, seconds)
+
+    def transport_travelled(self, name, meters):
+        """
+        A transport started a new trip.
+
+        Args:
+            name (str): the name of the transport
+            meters (float): the distance of the trip
+        """
+        self._add_to_transport("distance", name, meters)
+
+    def _transport_avg(self, stat):
+        count = self._transport_counts[stat]
+        return self._transport_sums[stat] / count if count else 0.0
+
+    def get_averages(self, now):
+        """
+        Returns the averages of the simulation.
+
+        Args:
+            now (float): the current time, used for the customers that are still waiting
+
+        Returns:
+            dict: the average customer waiting and total times and the average transport waiting time,
+                  charging time and distance
+        """
+        waiting_count = self.customers_picked_up + self.customers_waiting
+        waiting_sum = (
+            self._waiting_times
+            + self.customers_waiting * now
+            - self._waiting_init_times
+        )
+        return {
+            "waiting": waiting_sum / waiting_count if waiting_count else 0.0,
+            "totaltime": self._total_times / self.customers_in_destination
+            if self.customers_in_destination
+            else 0.0,
+            "t_waiting": self._transport_avg("waiting"),
+            "t_charging": self._transport_avg("charging"),
+            "distance": self._transport_avg("distance"),
+        }
+
+
+_stats = StatsAggregator()
+
+
+def set_stats_aggregator(stats):
+    """
+    Sets the process-wide statistics aggregator.
+
+    Args:
+        stats (StatsAggregator): the aggregator
+    """
+    global _stats
+    _stats = stats
+
+
+def get_stats_aggregator():
+    """
+    Returns the process-wide statistics aggregator.
+
+    Returns:
+        StatsAggregator: the aggregator
+    """
+    return _stats
@@ -55,6 +55,40 @@ class DelegateRequestBehaviour(FleetManagerStrategyBehaviour):
                 await self.send(msg)
 
 
+class DelegateRequestToNearestBehaviour(FleetManagerStrategyBehaviour):
+    """
+    A FleetManager strategy that delegates each request only to the ``k`` free transports closest to the customer,
+    according to the positions and statuses informed by the transports.
+    If no free transport is known the request is delegated to all transports.
+    """
+
+    k = 5
+    uses_spatial_index = True
+
+    async def run(self):
+        if not self.agent.registration:
+            await self.send_registration()
+
+        msg = await self.receive(timeout=5)
+        logger.debug("Manager received message: {}".format(msg))
+        if msg:
+            content = json.loads(msg.body)
+            transports = self.get_nearest_transports(content["origin"], self.k)
+            if not transports:
+                logger.warning(
+                    "Manager {} knows no free transport near {}. Delegating to all.".format(
+                        self.agent.name, content["origin"]
+                    )
+                )
+                transports = self.get_transport_agents().values()
+            for transport in transports:
+                msg.to = str(transport["jid"])
+                logger.debug(
+                    "Manager sent request to transport {}".format(transport["name"])
+                )
+                await self.send(msg)
+
+
 ################################################################
 #                                                              #
 #                     Transport Strategy                       #
@@ -74,17 +108,7 @@ class AcceptAlwaysStrategyBehaviour(TransportStrategyBehaviour):
                 await self.send_get_stations()
             else:
                 # choice of closest station
-                station_positions = []
-                for key in self.agent.stations.keys():
-                    dic = self.agent.stations.get(key)
-                    station_positions.append((dic["jid"], dic["position"]))
-                closest_station = min(
-                    station_positions,
-                    key=lambda x: distance_in_meters(x[1], self.agent.get_position()),
-                )
-                # closest_station = min( station_positions, key = lambda x: request_route_to_server(x[1], self.agent.get_position(), "http://osrm.gti-ia.upv.es/")[1])
-
-                # closest_station = min( list(self.agent.stations), key = lambda x: distance_in_meters( x['position'], self.agent.get_position() ) )
+                closest_station = self.get_nearest_stations()[0]
                 logger.info("Closest station {}".format(closest_station))
                 station = closest_station[0]
 
@@ -5,7 +5,7 @@ from spade.behaviour import State, FSMBehaviour
 
 from simfleet.customer import CustomerStrategyBehaviour
 from simfleet.fleetmanager import FleetManagerStrategyBehaviour
-from simfleet.helpers import PathRequestException, distance_in_meters
+from simfleet.helpers import PathRequestException
 from simfleet.protocol import (
     REQUEST_PERFORMATIVE,
     ACCEPT_PERFORMATIVE,
@@ -139,14 +139,7 @@ class TransportNeedsChargingState(TransportStrategyBehaviour, State):
                 self.set_next_state(TRANSPORT_NEEDS_CHARGING)
                 return
 
-        station_positions = []
-        for key in self.agent.stations.keys():
-            dic = self.agent.stations.get(key)
-            station_positions.append((dic["jid"], dic["position"]))
-        closest_station = min(
-            station_positions,
-            key=lambda x: distance_in_meters(x[1], self.agent.get_position()),
-        )
+        closest_station = self.get_nearest_stations()[0]
         logger.debug("Closest station {}".format(closest_station))
         station = closest_station[0]
         self.agent.current_station_dest = (
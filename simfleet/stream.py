@@ -0,0 +1,144 @@
+"""
+Stream module
+
+Pushes the entities of the simulation to the web interface as a stream of server-sent events instead of letting the
+browser poll them. On every frame each observer receives the entities that changed since the last frame it got.
+The frames are serialized once and shared by all the observers that are up to date, and an observer that is too slow
+to receive every frame is not queued more frames: when it is ready it receives a single frame with all the changes
+since the last one it got.
+"""
+
+import asyncio
+import json
+
+from aiohttp import web as aioweb
+from loguru import logger
+
+KEEPALIVE_SECONDS = 15
+
+
+class EntityStream(object):
+    """
+    Broadcasts the entities of the simulation to every connected observer at a fixed frame rate.
+    """
+
+    def __init__(self, get_entities, fps=10, tree_every=10):
+        """
+        Args:
+            get_entities (function): a function ``f(cursor, epoch, tree)`` that returns the entities changed since a
+                                     cursor, or a full snapshot if the cursor is None or no longer valid
+            fps (float): the frames sent per second
+            tree_every (int): the tree view is included once every these frames
+        """
+        if fps <= 0:
+            raise ValueError("The frame rate must be greater than zero.")
+        self.get_entities = get_entities
+        self.fps = fps
+        self.tree_every = max(1, int(tree_every))
+        self.frame = 0
+        self.observers = 0
+        self._frames = {}
+        self._tick = None
+        self._task = None
+
+    def get_frame(self, cursor, epoch):
+        """
+        Returns the frame for the observers that got the given cursor and epoch, serializing it only once per frame.
+
+        Args:
+            cursor (int): the cursor of the last frame received by the observer (None for a new observer)
+            epoch (int): the epoch of the last frame received by the observer
+
+        Returns:
+            dict, bytes: the entities of the frame and the frame encoded as a server-sent event
+        """
+        key = (cursor, epoch)
+        if key not in self._frames:
+            tree = self.frame % self.tree_every == 0
+            entities = self.get_entities(cursor, epoch, tree)
+            data = "event: entities\ndata: {}\n\n".format(json.dumps(entities))
+            self._frames[key] = entities, data.encode("utf-8")
+        return self._frames[key]
+
+    async def run(self):
+        """
+        Ticks the frames while there are observers connected.
+        """
+        while self.observers > 0:
+            await asyncio.sleep(1 / self.fps)
+            self.frame += 1
+            self._frames = {}
+            tick, self._tick = self._tick, None
+            if tick is not None and not tick.done():
+                tick.set_result(self.frame)
+        self._task = None
+
+    async def wait_frame(self):
+        """
+        Waits for the next frame.
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+        if self._tick is None:
+            self._tick = asyncio.get_event_loop().create_future()
+        await asyncio.shield(self._tick)
+
+    async def close(self):
+        """
+        Stops ticking frames and closes the connections of the observers.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._tick is not None and not self._tick.done():
+            self._tick.cancel()
+        self._tick = None
+
+    async def handle(self, request):
+        """
+        Web controller that streams the entities to an observer as server-sent events.
+
+        Args:
+            request (aiohttp.web.Request): the request
+
+        Returns:
+            aiohttp.web.StreamResponse: the stream
+        """
+        response = aioweb.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            }
+        )
+        await response.prepare(request)
+        self.observers += 1
+        loop = asyncio.get_event_loop()
+        cursor, epoch, stats = None, None, None
+        last_write = loop.time()
+        try:
+            while True:
+                entities, data = self.get_frame(cursor, epoch)
+                changed = (
+                    entities["full"]
+                    or entities["transports"]
+                    or entities["customers"]
+                    or entities["stations"]
+                    or "tree" in entities
+                    or entities["stats"] != stats
+                )
+                cursor, epoch = entities["cursor"], entities["epoch"]
+                if changed:
+                    stats = entities["stats"]
+                    # awaiting the write is the backpressure: no frames are queued
+                    await response.write(data)
+                    last_write = loop.time()
+                elif loop.time() - last_write > KEEPALIVE_SECONDS:
+                    await response.write(b": keepalive\n\n")
+                    last_write = loop.time()
+                await self.wait_frame()
+        except (asyncio.CancelledError, ConnectionError) as e:
+            logger.debug("Entity stream observer disconnected: {}".format(e))
+        finally:
+            self.observers -= 1
+        return response
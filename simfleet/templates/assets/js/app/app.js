@@ -762,48 +762,99 @@ new Vue({
         'v-polyline': Vue2Leaflet.Polyline,
         'v-popup': Vue2Leaflet.Popup,
         SidebarComponent: __WEBPACK_IMPORTED_MODULE_1__SidebarComponent_vue__["a" /* default */],
-        'tree-view': __WEBPACK_IMPORTED_MODULE_2__TreeView__["a" /* default */]
+        'tree-view': __WEBPACK_IMPORTED_MODULE_2__TreeView__["a" /* default */],
     },
     data() {
         return {
             zoom: 14,
             center: [39.47, -0.37],
             url: 'https://cartodb-basemaps-{s}.global.ssl.fastly.net/light_all/{z}/{x}/{y}.png',
-            transportIcon: L.icon({ iconUrl: 'assets/img/transport.png', iconSize: [38, 55] }),
-            customerIcon: L.icon({ iconUrl: 'assets/img/customer.png', iconSize: [38, 40] }),
-            stationIcon: L.icon({ iconUrl: 'assets/img/station.png', iconSize: [38, 40] })
-        };
+            transportIcon: L.icon({iconUrl: 'assets/img/transport.png', iconSize: [38, 55]}),
+            customerIcon: L.icon({iconUrl: 'assets/img/customer.png', iconSize: [38, 40]}),
+            stationIcon: L.icon({iconUrl: 'assets/img/station.png', iconSize: [38, 40]}),
+            cursor: null,
+            epoch: null,
+            polls: 0
+        }
     },
     mounted() {
         this.init();
-        this.loadEntities();
-        setInterval(function () {
-            this.loadEntities();
-        }.bind(this), 100);
+        if (window.EventSource) {
+            this.streamEntities();
+        } else {
+            this.pollEntities();
+        }
     },
     methods: {
         init: function () {
-            axios.get("/init").then(data => {
-                this.center = data.data.coords;
-                this.zoom = data.data.zoom;
-            });
+            axios.get("/init")
+                .then(data => {
+                    this.center = data.data.coords;
+                    this.zoom = data.data.zoom;
+                });
         },
         loadEntities: function () {
-            axios.get("/entities").then(data => {
-                this.$store.commit('addTransports', data.data.transports);
-                this.$store.commit('addCustomers', data.data.customers);
-                this.$store.commit("addStations", data.data.stations);
-                this.$store.state.waiting_time = data.data.stats.waiting;
-                this.$store.state.total_time = data.data.stats.totaltime;
-                this.$store.commit('update_simulation_status', data.data.stats);
-                this.$store.commit("update_tree", data.data.tree);
-            }).catch(error => {});
+            let params = {};
+            if (this.cursor !== null) {
+                params = {cursor: this.cursor, epoch: this.epoch};
+                // the tree view is refreshed once every ten polls
+                if (this.polls % 10 === 0) params.tree = 1;
+            }
+            this.polls++;
+            axios.get("/entities", {params: params})
+                .then(data => {
+                    this.updateEntities(data.data);
+                }).catch(error => {
+                    this.cursor = null;
+            });
+        },
+        pollEntities: function () {
+            this.loadEntities();
+            setInterval(function () {
+                this.loadEntities();
+            }.bind(this), 100);
+        },
+        streamEntities: function () {
+            let source = new EventSource("/stream");
+            let received = false;
+            source.addEventListener("entities", event => {
+                received = true;
+                this.updateEntities(JSON.parse(event.data));
+            });
+            source.onerror = () => {
+                // the stream is not available (e.g. blocked by a proxy): poll the entities instead
+                if (!received) {
+                    source.close();
+                    this.pollEntities();
+                }
+            };
+        },
+        updateEntities: function (entities) {
+            if (entities.full === false) {
+                this.$store.commit('updateTransports', entities.transports);
+                this.$store.commit('updateCustomers', entities.customers);
+                this.$store.commit("updateStations", entities.stations);
+            } else {
+                this.$store.commit('addTransports', entities.transports);
+                this.$store.commit('addCustomers', entities.customers);
+                this.$store.commit("addStations", entities.stations);
+            }
+            if (entities.cursor !== undefined) {
+                this.cursor = entities.cursor;
+                this.epoch = entities.epoch;
+            }
+            this.$store.state.waiting_time = entities.stats.waiting;
+            this.$store.state.total_time = entities.stats.totaltime;
+            this.$store.commit('update_simulation_status', entities.stats);
+            if (entities.tree) {
+                this.$store.commit("update_tree", entities.tree);
+            }
         },
         set_speed: function (event, item) {
-            event.target._icon.style[L.DomUtil.TRANSITION] = 'all ' + item.speed + 'ms linear';
+            event.target._icon.style[L.DomUtil.TRANSITION] = ('all ' + item.speed + 'ms linear');
         },
         showSidebar: function () {
-            this.$refs.sidebar.hideSidebar = !this.$refs.sidebar.hideSidebar;
+            this.$refs.sidebar.hideSidebar = !this.$refs.sidebar.hideSidebar
         }
     },
     computed: {
@@ -838,6 +889,7 @@ const store = new Vuex.Store({
         customers: [],
         stations: [],
         paths: [],
+        transport_paths: {},
         waiting_time: 0,
         total_time: 0,
         simulation_status: false,
@@ -851,13 +903,45 @@ const store = new Vuex.Store({
                     update_item_in_collection(state.transports, payload[i], transport_popup);
 
                     if (payload[i].path) {
-                        new_paths.push({ latlngs: payload[i].path, color: get_color(payload[i].status) });
+                        new_paths.push({latlngs: payload[i].path, color: get_color(payload[i].status)})
                     }
                 }
                 state.paths = new_paths;
+                state.transport_paths = {};
+                for (let i = 0; i < payload.length; i++) {
+                    state.transport_paths[payload[i].id] = payload[i].path;
+                }
             } else {
                 state.transports = [];
                 state.paths = [];
+                state.transport_paths = {};
+            }
+        },
+        updateTransports: (state, payload) => {
+            if (payload.length === 0) return;
+            for (let i = 0; i < payload.length; i++) {
+                update_item_in_collection(state.transports, payload[i], transport_popup);
+                if ("path" in payload[i]) {
+                    state.transport_paths[payload[i].id] = payload[i].path;
+                }
+            }
+            let new_paths = [];
+            for (let i = 0; i < state.transports.length; i++) {
+                let path = state.transport_paths[state.transports[i].id];
+                if (path) {
+                    new_paths.push({latlngs: path, color: get_color(state.transports[i].status)})
+                }
+            }
+            state.paths = new_paths;
+        },
+        updateCustomers: (state, payload) => {
+            for (let i = 0; i < payload.length; i++) {
+                update_item_in_collection(state.customers, payload[i], customer_popup);
+            }
+        },
+        updateStations: (state, payload) => {
+            for (let i = 0; i < payload.length; i++) {
+                update_station_in_collection(state.stations, payload[i], station_popup);
             }
         },
         addCustomers: (state, payload) => {
@@ -870,7 +954,7 @@ const store = new Vuex.Store({
             }
         },
         addStations: (state, payload) => {
-            if (payload.length > 0) {
+            if (payload.length >0) {
                 for (let i = 0; i < payload.length; i++) {
                     update_station_in_collection(state.stations, payload[i], station_popup);
                 }
@@ -879,7 +963,8 @@ const store = new Vuex.Store({
             }
         },
         update_simulation_status: (state, stats) => {
-            if (!stats.is_running) state.simulation_status = false;else {
+            if (!stats.is_running) state.simulation_status = false;
+            else {
                 state.simulation_status = !stats.finished;
             }
         },
@@ -888,35 +973,34 @@ const store = new Vuex.Store({
         }
     },
     getters: {
-        get_transports: state => {
+        get_transports: (state) => {
             return state.transports;
         },
-        get_customers: state => {
+        get_customers: (state) => {
             return state.customers;
         },
-        get_stations: state => {
+        get_stations: (state) => {
             return state.stations;
         },
-        get_paths: state => {
+        get_paths: (state) => {
             return state.paths;
         },
-        get_waiting_time: state => {
+        get_waiting_time: (state) => {
             return state.waiting_time;
         },
-        get_total_time: state => {
+        get_total_time: (state) => {
             return state.total_time;
         },
-        status: state => {
+        status: (state) => {
             return state.simulation_status && (state.customers.length || state.transports.length);
         },
-        tree: state => {
+        tree: (state) => {
             return state.treedata;
         }
     }
 });
 /* harmony export (immutable) */ __webpack_exports__["a"] = store;
 
-
 let update_item_in_collection = function (collection, item, get_popup) {
     let p = getitem(collection, item);
     if (p === false) {
@@ -924,23 +1008,28 @@ let update_item_in_collection = function (collection, item, get_popup) {
         item.popup = get_popup(item);
         item.visible = true;
         item.icon_url = item.icon;
-        if (item.icon) {
-            item.icon = L.icon({ iconUrl: item.icon, iconSize: [38, 55] });
-        } else {
-            item.icon = L.icon({ iconUrl: "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7",
-                iconSize: [38, 55] });
+        if(item.icon) {
+            item.icon = L.icon({iconUrl: item.icon, iconSize: [38, 55]});
         }
-        collection.push(item);
-    } else {
+        else {
+            item.icon = L.icon({iconUrl: "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7",
+                iconSize: [38, 55]});
+        }
+        collection.push(item)
+    }
+    else {
         collection[p].latlng = L.latLng(item.position[0], item.position[1]);
         collection[p].popup = get_popup(item);
         collection[p].speed = item.speed;
         collection[p].status = item.status;
         collection[p].icon_url = item.icon;
-        if (item.icon) {
-            collection[p].icon = L.icon({ iconUrl: item.icon, iconSize: [38, 55] });
+        if(item.icon) {
+            collection[p].icon = L.icon({iconUrl: item.icon, iconSize: [38, 55]});
         }
-        collection[p].visible = item.status !== "CUSTOMER_IN_TRANSPORT" && item.status !== "CUSTOMER_IN_DEST" && item.status !== "CUSTOMER_LOCATION" && item.status !== "TRANSPORT_LOADING";
+        collection[p].visible = item.status !== "CUSTOMER_IN_TRANSPORT" &&
+                                item.status !== "CUSTOMER_IN_DEST" &&
+                                item.status !== "CUSTOMER_LOCATION" &&
+                                item.status !== "TRANSPORT_LOADING";
     }
 };
 
@@ -951,18 +1040,19 @@ let update_station_in_collection = function (collection, item, get_popup) {
         item.popup = get_popup(item);
         item.visible = true;
         item.icon_url = item.icon;
-        if (item.icon) {
-            item.icon = L.icon({ iconUrl: item.icon, iconSize: [38, 55] });
+        if(item.icon) {
+            item.icon = L.icon({iconUrl: item.icon, iconSize: [38, 55]});
         }
-        collection.push(item);
-    } else {
+        collection.push(item)
+    }
+    else {
         collection[p].popup = get_popup(item);
         collection[p].power = item.power;
         collection[p].places = item.places;
         collection[p].status = item.status;
         item.icon_url = item.icon;
-        if (item.icon) {
-            item.icon = L.icon({ iconUrl: item.icon, iconSize: [38, 55] });
+        if(item.icon) {
+            item.icon = L.icon({iconUrl: item.icon, iconSize: [38, 55]});
         }
     }
 };
@@ -1008,19 +1098,42 @@ let statuses = {
     24: "CUSTOMER_ASSIGNED",
     //
     30: "FREE_STATION",
-    31: "BUSY_STATION"
+    31: "BUSY_STATION",
 };
 
+
 function customer_popup(customer) {
-    return "<table class='table'><tbody><tr><th>NAME</th><td>" + customer.id + "</td></tr>" + "<tr><th>STATUS</th><td>" + customer.status + "</td></tr>" + "<tr><th>POSITION</th><td>" + customer.position + "</td></tr>" + "<tr><th>DEST</th><td>" + customer.dest + "</td></tr>" + "<tr><th>TRANSPORT</th><td>" + customer.transport + "</td></tr>" + "<tr><th>WAITING</th><td>" + customer.waiting + "</td></tr>" + "</table>";
+    return "<table class='table'><tbody><tr><th>NAME</th><td>" + customer.id + "</td></tr>" +
+        "<tr><th>STATUS</th><td>" + customer.status + "</td></tr>" +
+        "<tr><th>POSITION</th><td>" + customer.position + "</td></tr>" +
+        "<tr><th>DEST</th><td>" + customer.dest + "</td></tr>" +
+        "<tr><th>TRANSPORT</th><td>" + customer.transport + "</td></tr>" +
+        "<tr><th>WAITING</th><td>" + customer.waiting + "</td></tr>" +
+        "</table>"
 }
 
 function transport_popup(transport) {
-    return "<table class='table'><tbody><tr><th>NAME</th><td>" + transport.id + "</td></tr>" + "<tr><th>STATUS</th><td>" + transport.status + "</td></tr>" + "<tr><th>FLEETNAME</th><td>" + transport.fleet + "</td></tr>" + "<tr><th>TYPE</th><td>" + transport.service + "</td></tr>" + "<tr><th>CUSTOMER</th><td>" + transport.customer + "</td></tr>" + "<tr><th>POSITION</th><td>" + transport.position + "</td></tr>" + "<tr><th>DEST</th><td>" + transport.dest + "</td></tr>" + "<tr><th>ASSIGNMENTS</th><td>" + transport.assignments + "</td></tr>" + "<tr><th>SPEED</th><td>" + transport.speed + "</td></tr>" + "<tr><th>DISTANCE</th><td>" + transport.distance + "</td></tr>" + "<tr><th>AUTONOMY</th><td>" + transport.autonomy + " / " + transport.max_autonomy + "</td></tr>" + "</table>";
+    return "<table class='table'><tbody><tr><th>NAME</th><td>" + transport.id + "</td></tr>" +
+        "<tr><th>STATUS</th><td>" + transport.status + "</td></tr>" +
+        "<tr><th>FLEETNAME</th><td>" + transport.fleet + "</td></tr>" +
+        "<tr><th>TYPE</th><td>" + transport.service + "</td></tr>" +
+        "<tr><th>CUSTOMER</th><td>" + transport.customer + "</td></tr>" +
+        "<tr><th>POSITION</th><td>" + transport.position + "</td></tr>" +
+        "<tr><th>DEST</th><td>" + transport.dest + "</td></tr>" +
+        "<tr><th>ASSIGNMENTS</th><td>" + transport.assignments + "</td></tr>" +
+        "<tr><th>SPEED</th><td>" + transport.speed + "</td></tr>" +
+        "<tr><th>DISTANCE</th><td>" + transport.distance + "</td></tr>" +
+        "<tr><th>AUTONOMY</th><td>" + transport.autonomy + " / " + transport.max_autonomy + "</td></tr>" +
+        "</table>"
 }
 
 function station_popup(station) {
-    return "<table class='table'><tbody><tr><th>NAME</th><td>" + station.id + "</td></tr>" + "<tr><th>STATUS</th><td>" + station.status + "</td></tr>" + "<tr><th>POSITION</th><td>" + station.position + "</td></tr>" + "<tr><th>POWERCHARGE</th><td>" + station.power + 'kW' + "</td></tr>" + "<tr><th>PLACES</th><td>" + station.places + "</td></tr>" + "</table>";
+    return "<table class='table'><tbody><tr><th>NAME</th><td>" + station.id + "</td></tr>" +
+        "<tr><th>STATUS</th><td>" + station.status + "</td></tr>" +
+        "<tr><th>POSITION</th><td>" + station.position + "</td></tr>" +
+        "<tr><th>POWERCHARGE</th><td>" + station.power + 'kW' + "</td></tr>" +
+        "<tr><th>PLACES</th><td>" + station.places + "</td></tr>" +
+        "</table>"
 }
 
 /***/ }),
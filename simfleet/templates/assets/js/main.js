@@ -24,15 +24,19 @@ new Vue({
             url: 'https://cartodb-basemaps-{s}.global.ssl.fastly.net/light_all/{z}/{x}/{y}.png',
             transportIcon: L.icon({iconUrl: 'assets/img/transport.png', iconSize: [38, 55]}),
             customerIcon: L.icon({iconUrl: 'assets/img/customer.png', iconSize: [38, 40]}),
-            stationIcon: L.icon({iconUrl: 'assets/img/station.png', iconSize: [38, 40]})
+            stationIcon: L.icon({iconUrl: 'assets/img/station.png', iconSize: [38, 40]}),
+            cursor: null,
+            epoch: null,
+            polls: 0
         }
     },
     mounted() {
         this.init();
-        this.loadEntities();
-        setInterval(function () {
-            this.loadEntities();
-        }.bind(this), 100);
+        if (window.EventSource) {
+            this.streamEntities();
+        } else {
+            this.pollEntities();
+        }
     },
     methods: {
         init: function () {
@@ -43,18 +47,62 @@ new Vue({
                 });
         },
         loadEntities: function () {
-            axios.get("/entities")
+            let params = {};
+            if (this.cursor !== null) {
+                params = {cursor: this.cursor, epoch: this.epoch};
+                // the tree view is refreshed once every ten polls
+                if (this.polls % 10 === 0) params.tree = 1;
+            }
+            this.polls++;
+            axios.get("/entities", {params: params})
                 .then(data => {
-                    this.$store.commit('addTransports', data.data.transports);
-                    this.$store.commit('addCustomers', data.data.customers);
-                    this.$store.commit("addStations", data.data.stations);
-                    this.$store.state.waiting_time = data.data.stats.waiting;
-                    this.$store.state.total_time = data.data.stats.totaltime;
-                    this.$store.commit('update_simulation_status', data.data.stats);
-                    this.$store.commit("update_tree", data.data.tree);
+                    this.updateEntities(data.data);
                 }).catch(error => {
+                    this.cursor = null;
             });
         },
+        pollEntities: function () {
+            this.loadEntities();
+            setInterval(function () {
+                this.loadEntities();
+            }.bind(this), 100);
+        },
+        streamEntities: function () {
+            let source = new EventSource("/stream");
+            let received = false;
+            source.addEventListener("entities", event => {
+                received = true;
+                this.updateEntities(JSON.parse(event.data));
+            });
+            source.onerror = () => {
+                // the stream is not available (e.g. blocked by a proxy): poll the entities instead
+                if (!received) {
+                    source.close();
+                    this.pollEntities();
+                }
+            };
+        },
+        updateEntities: function (entities) {
+            if (entities.full === false) {
+                this.$store.commit('updateTransports', entities.transports);
+                this.$store.commit('updateCustomers', entities.customers);
+                this.$store.commit("updateStations", entities.stations);
+            } else {
+                this.$store.commit('addTransports', entities.transports);
+                this.$store.commit('addCustomers', entities.customers);
+                this.$store.commit("addStations", entities.stations);
+            }
+            if (entities.cursor !== undefined) {
+                this.cursor = entities.cursor;
+                this.epoch = entities.epoch;
+            }
+            this.$store.state.waiting_time = entities.stats.waiting;
+            this.$store.state.total_time = entities.stats.totaltime;
+            this.$store.commit('update_simulation_status', entities.stats);
+            if (entities.tree) {
+                this.$store.commit("update_tree", entities.tree);
+            }
+        },
         set_speed: function (event, item) {
             event.target._icon.style[L.DomUtil.TRANSITION] = ('all ' + item.speed + 'ms linear');
         },
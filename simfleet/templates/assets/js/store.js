@@ -6,6 +6,7 @@ export const store = new Vuex.Store({
         customers: [],
         stations: [],
         paths: [],
+        transport_paths: {},
         waiting_time: 0,
         total_time: 0,
         simulation_status: false,
@@ -23,9 +24,41 @@ export const store = new Vuex.Store({
                     }
                 }
                 state.paths = new_paths;
+                state.transport_paths = {};
+                for (let i = 0; i < payload.length; i++) {
+                    state.transport_paths[payload[i].id] = payload[i].path;
+                }
             } else {
                 state.transports = [];
                 state.paths = [];
+                state.transport_paths = {};
+            }
+        },
+        updateTransports: (state, payload) => {
+            if (payload.length === 0) return;
+            for (let i = 0; i < payload.length; i++) {
+                update_item_in_collection(state.transports, payload[i], transport_popup);
+                if ("path" in payload[i]) {
+                    state.transport_paths[payload[i].id] = payload[i].path;
+                }
+            }
+            let new_paths = [];
+            for (let i = 0; i < state.transports.length; i++) {
+                let path = state.transport_paths[state.transports[i].id];
+                if (path) {
+                    new_paths.push({latlngs: path, color: get_color(state.transports[i].status)})
+                }
+            }
+            state.paths = new_paths;
+        },
+        updateCustomers: (state, payload) => {
+            for (let i = 0; i < payload.length; i++) {
+                update_item_in_collection(state.customers, payload[i], customer_popup);
+            }
+        },
+        updateStations: (state, payload) => {
+            for (let i = 0; i < payload.length; i++) {
+                update_station_in_collection(state.stations, payload[i], station_popup);
             }
         },
         addCustomers: (state, payload) => {
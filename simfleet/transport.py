@@ -6,10 +6,13 @@ from collections import defaultdict
 
 from loguru import logger
 from spade.agent import Agent
-from spade.behaviour import PeriodicBehaviour, CyclicBehaviour
+from spade.behaviour import CyclicBehaviour
 from spade.message import Message
 from spade.template import Template
 
+from .clock import PeriodicBehaviour, get_clock
+from .frames import get_entity_registry
+from .messaging import LightweightAgentMixin, get_message_bus
 from .helpers import (
     random_position,
     distance_in_meters,
@@ -28,7 +31,10 @@ from .protocol import (
     ACCEPT_PERFORMATIVE,
     REFUSE_PERFORMATIVE,
     QUERY_PROTOCOL,
+    POSITION_PROTOCOL,
 )
+from .spatial import get_station_index
+from .stats import get_stats_aggregator
 from .utils import (
     TRANSPORT_WAITING,
     TRANSPORT_MOVING_TO_CUSTOMER,
@@ -37,21 +43,26 @@ from .utils import (
     TRANSPORT_IN_STATION_PLACE,
     TRANSPORT_CHARGING,
     CUSTOMER_IN_DEST,
-    CUSTOMER_LOCATION,
     TRANSPORT_MOVING_TO_STATION,
-    chunk_path,
+    PathCursor,
+    next_version,
     request_path,
+    request_routes_to_server,
+    request_table_to_server,
     StrategyBehaviour,
     TRANSPORT_NEEDS_CHARGING,
+    FREE_STATION,
 )
 
 MIN_AUTONOMY = 2
 ONESECOND_IN_MS = 1000
 
 
-class TransportAgent(Agent):
+class TransportAgent(LightweightAgentMixin, Agent):
     def __init__(self, agentjid, password):
         super().__init__(agentjid, password)
+        self.version = 0
+        self.path_version = 0
 
         self.fleetmanager_id = None
         self.route_host = None
@@ -65,7 +76,8 @@ class TransportAgent(Agent):
         self.set("current_pos", None)
         self.dest = None
         self.set("path", None)
-        self.chunked_path = None
+        self.path_cursor = None
+        self.distance_method = "haversine"
         self.set("speed_in_kmh", 3000)
         self.animation_speed = ONESECOND_IN_MS
         self.distances = []
@@ -79,6 +91,7 @@ class TransportAgent(Agent):
         self.stopped = False
         self.ready = False
         self.registration = False
+        self.inform_positions = False
         self.is_launched = False
 
         self.directory_id = None
@@ -123,6 +136,54 @@ class TransportAgent(Agent):
     def is_ready(self):
         return not self.is_launched or (self.is_launched and self.ready)
 
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        """
+        Sets the status of the transport. Once the transport is registered in the fleet, every change is reported to
+        the fleet manager if its strategy uses the spatial index of the fleet.
+        """
+        changed = getattr(self, "_status", None) != status
+        self._status = status
+        self.touch()
+        get_entity_registry().transports.set_status(self.name, status)
+        if (
+            changed
+            and getattr(self, "inform_positions", False)
+            and getattr(self, "registration", False)
+            and self.is_alive()
+        ):
+            self.submit(self.inform_fleetmanager())
+
+    @property
+    def is_launched(self):
+        return self._is_launched
+
+    @is_launched.setter
+    def is_launched(self, launched):
+        self._is_launched = launched
+        get_entity_registry().transports.set_visible(self.name, launched)
+
+    @property
+    def stations(self):
+        return self._stations
+
+    @stations.setter
+    def stations(self, stations):
+        """
+        Sets the stations informed by the directory and builds their spatial index, which is reused by every
+        query until the next answer of the directory.
+        """
+        self._stations = stations
+        self.station_index = (
+            get_station_index(stations, getattr(self, "station_index", None))
+            if stations
+            else None
+        )
+
     async def setup(self):
         try:
             template = Template()
@@ -144,9 +205,20 @@ class TransportAgent(Agent):
                 )
             )
 
+    def touch(self):
+        """
+        Marks the transport as changed for the delta updates of the web interface.
+        """
+        self.version = next_version()
+
     def set(self, key, value):
         old = self.get(key)
         super().set(key, value)
+        self.touch()
+        if key == "path":
+            self.path_version = self.version
+        elif key == "current_pos":
+            get_entity_registry().transports.set_position(self.name, value)
         if key in self.__observers:
             for callback in self.__observers[key]:
                 callback(old, value)
@@ -165,6 +237,7 @@ class TransportAgent(Agent):
         if content is not None:
             self.icon = content["icon"] if self.icon is None else self.icon
             self.fleet_type = content["fleet_type"]
+            self.inform_positions = content.get("spatial_index", False)
         self.registration = status
 
     def set_directory(self, directory_id):
@@ -239,12 +312,17 @@ class TransportAgent(Agent):
         """
         self.route_host = route_host
 
+    def set_distance_method(self, distance_method):
+        """
+        Sets the formula used to measure the paths of the transport
+        Args:
+            distance_method (str): ``geodesic``, ``haversine`` or ``equirectangular``
+
+        """
+        self.distance_method = distance_method
+
     async def send(self, msg):
-        if not msg.sender:
-            msg.sender = str(self.jid)
-            logger.debug(f"Adding agent's jid as sender to message: {msg}")
-        aioxmpp_msg = msg.prepare()
-        await self.client.send(aioxmpp_msg)
+        await get_message_bus().deliver(msg, self)
         msg.sent = True
         self.traces.append(msg, category=str(self))
 
@@ -261,7 +339,7 @@ class TransportAgent(Agent):
         or drops it and goes to WAITING status again.
         """
         self.set("path", None)
-        self.chunked_path = None
+        self.path_cursor = None
         if (
             not self.is_customer_in_transport()
         ):  # self.status == TRANSPORT_MOVING_TO_CUSTOMER:
@@ -314,7 +392,7 @@ class TransportAgent(Agent):
         await self.send(reply)
 
         # time waiting in station queue update
-        self.waiting_in_queue_time = time.time()
+        self.waiting_in_queue_time = get_clock().time()
 
         # WAIT FOR EXPLICIT CONFIRMATION THAT IT CAN CHARGE
         # while True:
@@ -328,7 +406,7 @@ class TransportAgent(Agent):
 
         # trigger charging
         self.set("path", None)
-        self.chunked_path = None
+        self.path_cursor = None
 
         data = {
             "status": TRANSPORT_IN_STATION_PLACE,
@@ -352,10 +430,11 @@ class TransportAgent(Agent):
         )
 
         # time waiting in station queue update
-        self.charge_time = time.time()
+        self.charge_time = get_clock().time()
         elapsed_time = self.charge_time - self.waiting_in_queue_time
         if elapsed_time > 0.1:
             self.total_waiting_time += elapsed_time
+            get_stats_aggregator().transport_waited(self.name, elapsed_time)
 
     def needs_charging(self):
         return (self.status == TRANSPORT_NEEDS_CHARGING) or (
@@ -364,13 +443,17 @@ class TransportAgent(Agent):
 
     def transport_charged(self):
         self.current_autonomy_km = self.max_autonomy_km
-        self.total_charging_time += time.time() - self.charge_time
+        charging_time = get_clock().time() - self.charge_time
+        self.total_charging_time += charging_time
+        get_stats_aggregator().transport_charged(self.name, charging_time)
 
     async def drop_customer(self):
         """
         Drops the customer that the transport is carring in the current location.
         """
-        await self.inform_customer(CUSTOMER_IN_DEST)
+        await self.inform_customer(
+            CUSTOMER_IN_DEST, {"location": self.get("current_pos")}
+        )
         self.status = TRANSPORT_WAITING
         logger.debug(
             "Transport {} has dropped the customer {} in destination.".format(
@@ -406,29 +489,26 @@ class TransportAgent(Agent):
         """
         if self.get("current_pos") == dest:
             raise AlreadyInDestination
-        counter = 5
-        path = None
-        distance, duration = 0, 0
-        while counter > 0 and path is None:
-            logger.debug(
-                "Requesting path from {} to {}".format(self.get("current_pos"), dest)
-            )
-            path, distance, duration = await self.request_path(
-                self.get("current_pos"), dest
-            )
-            counter -= 1
+        # the retries (with backoff) are made by the routing policy
+        logger.debug(
+            "Requesting path from {} to {}".format(self.get("current_pos"), dest)
+        )
+        path, distance, duration = await self.request_path(
+            self.get("current_pos"), dest
+        )
         if path is None:
             raise PathRequestException("Error requesting route.")
 
         self.set("path", path)
         try:
-            self.chunked_path = chunk_path(path, self.get("speed_in_kmh"))
+            self.path_cursor = PathCursor(path, self.distance_method)
         except Exception as e:
-            logger.error("Exception chunking path {}: {}".format(path, e))
+            logger.error("Exception measuring path {}: {}".format(path, e))
             raise PathRequestException
         self.dest = dest
         self.distances.append(distance)
         self.durations.append(duration)
+        get_stats_aggregator().transport_travelled(self.name, distance)
         behav = self.MovingBehaviour(period=1)
         self.add_behaviour(behav)
 
@@ -436,14 +516,26 @@ class TransportAgent(Agent):
         """
         Advances one step in the simulation
         """
-        if self.chunked_path:
-            _next = self.chunked_path.pop(0)
-            distance = distance_in_meters(self.get_position(), _next)
-            self.animation_speed = (
-                distance / kmh_to_ms(self.get("speed_in_kmh")) * ONESECOND_IN_MS
-            )
+        if self.path_cursor:
+            meters_per_second = kmh_to_ms(self.get("speed_in_kmh"))
+            _next, distance = self.path_cursor.advance(meters_per_second)
+            self.animation_speed = distance / meters_per_second * ONESECOND_IN_MS
             await self.set_position(_next)
 
+    async def inform_fleetmanager(self):
+        """
+        Sends the current position and status of the transport to its fleet manager.
+        It is a lightweight update that lets the manager keep a spatial index of its transports.
+        """
+        msg = Message()
+        msg.to = str(self.fleetmanager_id)
+        msg.set_metadata("protocol", POSITION_PROTOCOL)
+        msg.set_metadata("performative", INFORM_PERFORMATIVE)
+        msg.body = json.dumps(
+            {"name": self.name, "position": self.get_position(), "status": self.status}
+        )
+        await self.send(msg)
+
     async def inform_station(self, data=None):
         """
         Sends a message to the current assigned customer to inform her about a new status.
@@ -546,10 +638,7 @@ class TransportAgent(Agent):
         logger.debug(
             "Transport {} position is {}".format(self.agent_id, self.get("current_pos"))
         )
-        if self.status == TRANSPORT_MOVING_TO_DESTINATION:
-            await self.inform_customer(
-                CUSTOMER_LOCATION, {"location": self.get("current_pos")}
-            )
+        # the customer on board reads its position from the transport (see CustomerAgent.current_pos)
         if self.is_in_destination():
             logger.info(
                 "Transport {} has arrived to destination. Status: {}".format(
@@ -607,13 +696,16 @@ class TransportAgent(Agent):
             sec_distance = 0
         return (fir_distance + sec_distance) // 1000
 
-    def to_json(self):
+    def to_json(self, since=None):
         """
         Serializes the main information of a transport agent to a JSON format.
         It includes the id of the agent, its current position, the destination coordinates of the agent,
         the current status, the speed of the transport (in km/h), the path it is following (if any), the customer that it
         has assigned (if any), the number of assignments if has done and the distance that the transport has traveled.
 
+        Args:
+            since (int, optional): a change sequence number. If set, the path is only included if it changed after it.
+
         Returns:
             dict: a JSON doc with the main information of the transport.
 
@@ -631,7 +723,7 @@ class TransportAgent(Agent):
                     "distance": 3481.34
                 }
         """
-        return {
+        result = {
             "id": self.agent_id,
             "position": [
                 float("{0:.6f}".format(coord)) for coord in self.get("current_pos")
@@ -655,6 +747,9 @@ class TransportAgent(Agent):
             "fleet": self.fleetmanager_id.split("@")[0],
             "icon": self.icon,
         }
+        if since is not None and self.path_version <= since:
+            del result["path"]
+        return result
 
     class MovingBehaviour(PeriodicBehaviour):
         """
@@ -689,6 +784,8 @@ class RegistrationBehaviour(CyclicBehaviour):
             "name": self.agent.name,
             "jid": str(self.agent.jid),
             "fleet_type": self.agent.fleet_type,
+            "position": self.agent.get_position(),
+            "status": self.agent.status,
         }
         msg = Message()
         msg.to = str(self.agent.fleetmanager_id)
@@ -737,6 +834,9 @@ class TransportStrategyBehaviour(StrategyBehaviour):
         * ``pick_up_customer``
         * ``send_proposal``
         * ``cancel_proposal``
+        * ``request_table``
+        * ``request_routes``
+        * ``get_nearest_stations``
     """
 
     async def on_start(self):
@@ -946,5 +1046,52 @@ class TransportStrategyBehaviour(StrategyBehaviour):
         self.set("in_station_place", None)  # new
         await self.agent.begin_charging()
 
+    def get_nearest_stations(self, k=1, free=False):
+        """
+        Gets the known stations closest (as the crow flies) to the transport using the shared station index.
+
+        Args:
+            k (int): the maximum number of stations to return
+            free (bool): whether to return only the stations that had free places when they were informed
+
+        Returns:
+            list: a list of (station jid, position) tuples sorted by distance
+        """
+        if not self.agent.station_index:
+            return []
+        condition = (lambda key, status: status == FREE_STATION) if free else None
+        nearest = self.agent.station_index.nearest(
+            self.agent.get_position(), k, condition
+        )
+        return [(jid, self.agent.stations[jid]["position"]) for jid, _ in nearest]
+
+    async def request_table(self, sources, destinations):
+        """
+        Requests the durations and distances between every source and every destination using the route server
+        in a single batch (OSRM table service).
+
+        Args:
+            sources (list): a list of origin coordinates
+            destinations (list): a list of target coordinates
+
+        Returns:
+            list, list: the durations matrix and the distances matrix indexed by [source][destination]
+        """
+        return await request_table_to_server(
+            sources, destinations, self.agent.route_host
+        )
+
+    async def request_routes(self, pairs):
+        """
+        Requests a batch of paths concurrently using the route server.
+
+        Args:
+            pairs (list): a list of (origin, destination) coordinate pairs
+
+        Returns:
+            list: a list with a (path, distance, duration) tuple for each pair
+        """
+        return await request_routes_to_server(pairs, self.agent.route_host)
+
     async def run(self):
         raise NotImplementedError
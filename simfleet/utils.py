@@ -8,13 +8,22 @@ import uuid
 from abc import ABCMeta
 from importlib import import_module
 
-import aiohttp
+import numpy as np
 from loguru import logger
 from spade.behaviour import CyclicBehaviour, OneShotBehaviour
 from spade.message import Message
 from spade.template import Template
 
-from .helpers import distance_in_meters, kmh_to_ms
+from .clock import get_clock
+from .helpers import PathRequestException, distances_in_meters, kmh_to_ms
+from .routing import (
+    DEFAULT_CACHE_PRECISION,
+    CircuitOpenError,
+    get_route_cache,
+    get_routing_backend,
+    get_routing_policy,
+    route_key,
+)
 
 TRANSPORT_WAITING = "TRANSPORT_WAITING"
 TRANSPORT_MOVING_TO_CUSTOMER = "TRANSPORT_MOVING_TO_CUSTOMER"
@@ -38,6 +47,28 @@ CUSTOMER_IN_DEST = "CUSTOMER_IN_DEST"
 CUSTOMER_LOCATION = "CUSTOMER_LOCATION"
 CUSTOMER_ASSIGNED = "CUSTOMER_ASSIGNED"
 
+STATUSES = {
+    10: "TRANSPORT_WAITING",
+    11: "TRANSPORT_MOVING_TO_CUSTOMER",
+    12: "TRANSPORT_IN_CUSTOMER_PLACE",
+    13: "TRANSPORT_MOVING_TO_DESTINATION",
+    14: "TRANSPORT_WAITING_FOR_APPROVAL",
+    15: "TRANSPORT_MOVING_TO_STATION",
+    16: "TRANSPORT_IN_STATION_PLACE",
+    17: "TRANSPORT_WAITING_FOR_STATION_APPROVAL",
+    18: "TRANSPORT_LOADING",
+    19: "TRANSPORT_LOADED",
+    20: "CUSTOMER_WAITING",
+    21: "CUSTOMER_IN_TRANSPORT",
+    22: "CUSTOMER_IN_DESTINATION",
+    23: "CUSTOMER_LOCATION",
+    24: "CUSTOMER_ASSIGNED",
+    30: "FREE_STATION",
+    31: "BUSY_STATION",
+}
+STATUS_CODES = {status: code for code, status in STATUSES.items()}
+STATUS_CODES[CUSTOMER_IN_DEST] = 22
+
 
 def status_to_str(status_code):
     """
@@ -49,30 +80,26 @@ def status_to_str(status_code):
     Returns:
         str: the string that represents the status
     """
-    statuses = {
-        10: "TRANSPORT_WAITING",
-        11: "TRANSPORT_MOVING_TO_CUSTOMER",
-        12: "TRANSPORT_IN_CUSTOMER_PLACE",
-        13: "TRANSPORT_MOVING_TO_DESTINATION",
-        14: "TRANSPORT_WAITING_FOR_APPROVAL",
-        15: "TRANSPORT_MOVING_TO_STATION",
-        16: "TRANSPORT_IN_STATION_PLACE",
-        17: "TRANSPORT_WAITING_FOR_STATION_APPROVAL",
-        18: "TRANSPORT_LOADING",
-        19: "TRANSPORT_LOADED",
-        20: "CUSTOMER_WAITING",
-        21: "CUSTOMER_IN_TRANSPORT",
-        22: "CUSTOMER_IN_DESTINATION",
-        23: "CUSTOMER_LOCATION",
-        24: "CUSTOMER_ASSIGNED",
-        30: "FREE_STATION",
-        31: "BUSY_STATION",
-    }
-    if status_code in statuses:
-        return statuses[status_code]
+    if status_code in STATUSES:
+        return STATUSES[status_code]
     return status_code
 
 
+def status_to_code(status):
+    """
+    Translates a status to its int code, the inverse of :func:`status_to_str`.
+
+    Args:
+        status (str): the status
+
+    Returns:
+        int: the code of the status (0 if it has no code)
+    """
+    if isinstance(status, int):
+        return status
+    return STATUS_CODES.get(status, 0)
+
+
 class StrategyBehaviour(CyclicBehaviour, metaclass=ABCMeta):
     """
     The behaviour that all parent strategies must inherit from. It complies with the Strategy Pattern.
@@ -100,6 +127,9 @@ class RequestRouteBehaviour(OneShotBehaviour):
         self._msg = msg
         self.route_host = route_host
         self.result = {"path": None, "distance": None, "duration": None}
+        # resolved with the exit code as soon as the behaviour finishes.
+        # The behaviour is always created from a coroutine running in the agent's loop.
+        self.completed = asyncio.get_event_loop().create_future()
         super().__init__()
 
     async def run(self):
@@ -134,11 +164,18 @@ class RequestRouteBehaviour(OneShotBehaviour):
                     response_time, e
                 )
             )
+            self.kill({"type": "error"})
+
+    async def on_end(self):
+        if not self.completed.done():
+            self.completed.set_result(self.exit_code)
 
 
 async def request_path(agent, origin, destination, route_host):
     """
-    Sends a message to the RouteAgent to request a path
+    Sends a message to the RouteAgent to request a path, unless it is in the route cache.
+    Concurrent requests for the same route (with the coordinates quantized as in the route cache) are coalesced: only
+    the first one is sent and the rest receive a copy of its result.
 
     Args:
         agent: the agent who is requesting the path
@@ -162,6 +199,63 @@ async def request_path(agent, origin, destination, route_host):
     if origin[0] == destination[0] and origin[1] == destination[1]:
         return [[origin[1], origin[0]]], 0, 0
 
+    # cached (e.g. prefetched) routes are returned without requesting them
+    cache = get_route_cache()
+    if cache is not None:
+        route = cache.get(origin, destination)
+        if route is not None:
+            return route
+
+    # the simulation clock does not move forward while the route is being requested
+    with get_clock().busy():
+        return await _coalesced_request_path(agent, origin, destination, route_host)
+
+
+async def _coalesced_request_path(agent, origin, destination, route_host):
+    # concurrent requests of the same (quantized) route share a single request
+    cache = get_route_cache()
+    precision = cache.precision if cache is not None else DEFAULT_CACHE_PRECISION
+    key = (route_host, route_key(origin, destination, precision))
+    inflight = _inflight_paths.get(key)
+    while inflight is not None:
+        try:
+            path, distance, duration = await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+            # the request that was shared was cancelled, not this one: request the route again
+            inflight = _inflight_paths.get(key)
+            continue
+        if path is None:
+            return None, None, None
+        path = [list(point) for point in path]
+        if path[-1] != destination:
+            path.append(destination)
+        return path, distance, duration
+
+    future = asyncio.get_event_loop().create_future()
+    _inflight_paths[key] = future
+    try:
+        result = await _request_path(agent, origin, destination, route_host)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # the waiting requests, if any, get the error too
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _inflight_paths[key]
+
+
+_inflight_paths = {}
+
+
+async def _request_path(agent, origin, destination, route_host):
     msg = Message()
     msg.thread = str(uuid.uuid4()).replace("-", "")
     template = Template()
@@ -169,21 +263,12 @@ async def request_path(agent, origin, destination, route_host):
     behav = RequestRouteBehaviour(msg, origin, destination, route_host)
     agent.add_behaviour(behav, template)
 
-    while not behav.is_killed():
-        await asyncio.sleep(0.01)
+    exit_code = await behav.completed
 
-    if (
-        behav.exit_code is {}
-        or "type" in behav.exit_code
-        and behav.exit_code["type"] == "error"
-    ):
+    if not isinstance(exit_code, dict) or exit_code.get("type") != "success":
         return None, None, None
     else:
-        return (
-            behav.exit_code["path"],
-            behav.exit_code["distance"],
-            behav.exit_code["duration"],
-        )
+        return exit_code["path"], exit_code["distance"], exit_code["duration"]
 
 
 def unused_port(hostname):
@@ -195,42 +280,111 @@ def unused_port(hostname):
     return port
 
 
-def chunk_path(path, speed_in_kmh):
+def chunk_path(path, speed_in_kmh, method="haversine"):
     """
     Splits the path into smaller chunks taking into account the speed.
+    All the segments are measured and interpolated at once with NumPy.
 
     Args:
         path (list): the original path. A list of points (lon, lat)
         speed_in_kmh (float): the speed in km per hour at which the path is being traveled.
+        method (str): the formula used to measure the segments (``geodesic``, ``haversine`` or ``equirectangular``)
 
     Returns:
         list: a new path equivalent (to the first one), that has at least the same number of points.
     """
     meters_per_second = kmh_to_ms(speed_in_kmh)
-    length = len(path)
-    chunked_lat_lngs = []
+    points = np.asarray(path, dtype=np.float64)
+    starts, ends = points[:-1], points[1:]
+    moving = np.any(starts != ends, axis=1)
+    starts, ends = starts[moving], ends[moving]
+    distances = distances_in_meters(starts, ends, method)
+
+    # a segment longer than the speed is split in steps of one second (the start point is not kept),
+    # a shorter one is kept as it is
+    long_segments = distances > meters_per_second
+    steps = np.ones(len(distances), dtype=np.int64)
+    steps[long_segments] = np.ceil(distances[long_segments] / meters_per_second) - 1
+
+    segment = np.repeat(np.arange(len(steps)), steps)
+    step = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps) + 1
+    fractions = np.zeros(len(segment))
+    is_long = long_segments[segment]
+    fractions[is_long] = (
+        step[is_long] * meters_per_second / distances[segment[is_long]]
+    )
+    chunks = starts[segment] + fractions[:, None] * (ends - starts)[segment]
 
-    for i in range(1, length):
-        _cur = path[i - 1]
-        _next = path[i]
-        if _cur == _next:
-            continue
-        distance = distance_in_meters(_cur, _next)
-        factor = meters_per_second / distance if distance else 0
-        diff_lat = factor * (_next[0] - _cur[0])
-        diff_lng = factor * (_next[1] - _cur[1])
+    chunked_lat_lngs = chunks.tolist()
+    chunked_lat_lngs.append(path[-1])
 
-        if distance > meters_per_second:
-            while distance > meters_per_second:
-                _cur = [_cur[0] + diff_lat, _cur[1] + diff_lng]
-                distance = distance_in_meters(_cur, _next)
-                chunked_lat_lngs.append(_cur)
-        else:
-            chunked_lat_lngs.append(_cur)
+    return chunked_lat_lngs
 
-    chunked_lat_lngs.append(path[length - 1])
 
-    return chunked_lat_lngs
+class PathCursor(object):
+    """
+    Walks along a path on demand. Instead of precomputing every intermediate point (see :func:`chunk_path`),
+    it keeps the cumulative distance of the path vertices and interpolates the next position when it is needed.
+    """
+
+    def __init__(self, path, method="haversine"):
+        """
+        Args:
+            path (list): the path. A list of points (lat, lon)
+            method (str): the formula used to measure the segments (``geodesic``, ``haversine`` or ``equirectangular``)
+        """
+        self.path = path
+        points = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+        lengths = distances_in_meters(points[:-1], points[1:], method)
+        self.cumulative = np.concatenate(([0.0], np.cumsum(lengths))).tolist()
+        self.length = self.cumulative[-1]
+        self.travelled = 0.0
+        self.segment = 0
+        self.finished = len(path) == 0
+
+    def __bool__(self):
+        return not self.finished
+
+    def position_at(self, travelled):
+        """
+        Returns the position after travelling some distance along the path.
+        Positions must be requested in increasing order of distance.
+
+        Args:
+            travelled (float): the distance from the beginning of the path in meters
+
+        Returns:
+            list: the position (lat, lon)
+        """
+        if travelled >= self.length:
+            return self.path[-1]
+        cumulative = self.cumulative
+        while cumulative[self.segment + 1] <= travelled:
+            self.segment += 1
+        start, end = self.path[self.segment], self.path[self.segment + 1]
+        fraction = (travelled - cumulative[self.segment]) / (
+            cumulative[self.segment + 1] - cumulative[self.segment]
+        )
+        return [
+            start[0] + fraction * (end[0] - start[0]),
+            start[1] + fraction * (end[1] - start[1]),
+        ]
+
+    def advance(self, meters):
+        """
+        Moves forward along the path.
+
+        Args:
+            meters (float): the distance to move forward in meters
+
+        Returns:
+            list, float: the new position (lat, lon) and the distance actually moved (it is shorter at the end of the path)
+        """
+        distance = min(meters, self.length - self.travelled)
+        self.travelled += distance
+        if self.travelled >= self.length:
+            self.finished = True
+        return self.position_at(self.travelled), distance
 
 
 def load_class(class_path):
@@ -270,7 +424,11 @@ async def request_route_to_server(
     origin, destination, route_host="http://router.project-osrm.org/"
 ):
     """
-    Queries the OSRM for a path.
+    Queries the routing backend for a path. If no backend has been set, the OSRM server at ``route_host`` is used.
+    If a route cache is set it is looked up first and filled with the response.
+    The request is made through the process-wide :class:`simfleet.routing.RoutingPolicy` (timeout, retries with
+    backoff and circuit breaker). If it fails, the fallback path of the policy is returned, if any, unless the server
+    answered that there is no route between the points.
 
     Args:
         origin (list): origin coordinate (longitude, latitude)
@@ -279,26 +437,106 @@ async def request_route_to_server(
 
     Returns:
         list, float, float = the path, the distance of the path and the estimated duration
+                             (None, None, None if there is no route)
     """
+    cache = get_route_cache()
+    if cache is not None:
+        route = cache.get(origin, destination)
+        if route is not None:
+            return route
+    policy = get_routing_policy()
     try:
-
-        url = (
-            route_host
-            + "route/v1/car/{src1},{src2};{dest1},{dest2}?geometries=geojson&overview=full"
+        path, distance, duration = await policy.route(
+            get_routing_backend(route_host), route_host, origin, destination
+        )
+    except CircuitOpenError:
+        return policy.fallback_route(origin, destination)
+    except PathRequestException as e:
+        logger.debug("{}".format(e))
+        return None, None, None
+    except Exception as e:
+        logger.warning(
+            "Could not get route from {} to {}: {!r}".format(origin, destination, e)
         )
-        src1, src2, dest1, dest2 = origin[1], origin[0], destination[1], destination[0]
-        url = url.format(src1=src1, src2=src2, dest1=dest1, dest2=dest2)
+        return policy.fallback_route(origin, destination)
+    if path[-1] != destination:
+        path.append(destination)
+    if cache is not None:
+        cache.put(origin, destination, path, distance, duration)
+    return path, distance, duration
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                result = await response.json()
 
-        path = result["routes"][0]["geometry"]["coordinates"]
-        path = [[point[1], point[0]] for point in path]
-        duration = result["routes"][0]["duration"]
-        distance = result["routes"][0]["distance"]
-        if path[-1] != destination:
-            path.append(destination)
-        return path, distance, duration
+async def request_routes_to_server(
+    pairs, route_host="http://router.project-osrm.org/"
+):
+    """
+    Queries the routing backend for a batch of paths concurrently. All the requests share the pooled routing client
+    and the route cache.
+
+    Args:
+        pairs (list): a list of (origin, destination) coordinate pairs
+        route_host (string): route to host server of OSRM service
+
+    Returns:
+        list: a list with a (path, distance, duration) tuple for each pair, in the same order
+    """
+    return await asyncio.gather(
+        *[
+            request_route_to_server(origin, destination, route_host)
+            for origin, destination in pairs
+        ]
+    )
+
+
+async def request_table_to_server(
+    sources, destinations, route_host="http://router.project-osrm.org/"
+):
+    """
+    Queries the routing backend for the durations and distances between every source and every destination
+    in a single batch (with OSRM the table service is used).
+
+    Args:
+        sources (list): a list of origin coordinates (latitude, longitude)
+        destinations (list): a list of target coordinates (latitude, longitude)
+        route_host (string): route to host server of OSRM service
+
+    Returns:
+        list, list: the durations matrix (seconds) and the distances matrix (meters), indexed by [source][destination].
+                    Unreachable pairs are None. Both matrices are None if the request failed.
+
+    Examples:
+        >>> durations, distances = await request_table_to_server([[39.47, -0.37]], [[39.48, -0.38], [39.46, -0.36]])
+        >>> print(distances)
+        [[1580.3, 1493.1]]
+    """
+    try:
+        return await get_routing_backend(route_host).table(sources, destinations)
     except Exception as e:
-        return None, None, None
+        logger.error("Exception requesting route table: {}".format(e))
+        return None, None
+
+
+_version = 0
+
+
+def next_version():
+    """
+    Returns a new change sequence number. Agents take one every time their visible state changes, so the web
+    interface can ask only for the entities that changed since the last sequence number it saw.
+
+    Returns:
+        int: the new sequence number
+    """
+    global _version
+    _version += 1
+    return _version
+
+
+def current_version():
+    """
+    Returns the last change sequence number given.
+
+    Returns:
+        int: the last sequence number
+    """
+    return _version
@@ -0,0 +1,175 @@
+"""
+Warm-up module
+
+Prefetches the routes a simulation is going to request first, between the loading of the scenario and its run, so the
+first minutes of the simulation are not dominated by the latency of the routing server. The routes of every customer
+(from its origin to its destination) and the routes from the transports closest to each customer to its origin are
+requested concurrently, with a bounded number of requests in flight, and stored in the route cache, which is looked up
+by :func:`simfleet.utils.request_path` before requesting a route. The simulation waits for the warm-up for a bounded
+time and then starts while the remaining routes are still being prefetched.
+"""
+
+import asyncio
+import time
+
+from loguru import logger
+
+from .routing import DEFAULT_CACHE_PRECISION, get_route_cache, route_key
+from .spatial import GridIndex
+from .utils import request_route_to_server
+
+
+class WarmupReport(object):
+    """
+    The outcome of prefetching a set of routes.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.fetched = 0
+        self.uncached = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    def __str__(self):
+        return "{}/{} routes prefetched, {} not cached, {} failed in {:.1f} seconds".format(
+            self.fetched, self.total, self.uncached, self.failed, self.elapsed
+        )
+
+
+class RouteWarmup(object):
+    """
+    Prefetches the first routes of a simulation into the route cache.
+    """
+
+    def __init__(
+        self, concurrency=50, neighbours=3, timeout=60, progress_interval=2.0
+    ):
+        """
+        Args:
+            concurrency (int): the maximum number of routes requested at the same time
+            neighbours (int): the number of transports closest to each customer whose route to the customer is
+                              prefetched
+            timeout (float): the seconds the simulation waits for the warm-up before it starts (None waits until
+                             the warm-up finishes)
+            progress_interval (float): the seconds between progress reports
+        """
+        self.concurrency = max(1, int(concurrency))
+        self.neighbours = neighbours
+        self.timeout = timeout
+        self.progress_interval = progress_interval
+        self._last_progress = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            concurrency=config.route_warmup_concurrency,
+            neighbours=config.route_warmup_neighbours,
+            timeout=config.route_warmup_timeout,
+        )
+
+    def pairs(self, transports, customers):
+        """
+        Builds the list of routes to prefetch, without duplicates.
+
+        Args:
+            transports (list): the positions (latitude, longitude) of the transports
+            customers (list): the origins and destinations (latitude, longitude) of the customers
+
+        Returns:
+            list: a list of (origin, destination) coordinate pairs
+        """
+        cache = get_route_cache()
+        precision = cache.precision if cache is not None else DEFAULT_CACHE_PRECISION
+        index = GridIndex()
+        for i, position in enumerate(transports):
+            if position is not None:
+                index.update(i, position)
+        pairs = {}
+        for origin, destination in customers:
+            if origin is None:
+                continue
+            if destination is not None:
+                pairs.setdefault(
+                    route_key(origin, destination, precision), (origin, destination)
+                )
+            for i, _ in index.nearest(origin, k=self.neighbours):
+                position = transports[i]
+                pairs.setdefault(
+                    route_key(position, origin, precision), (position, origin)
+                )
+        return list(pairs.values())
+
+    def report_progress(self, report, force=False):
+        now = time.time()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            logger.info("Warming up routes: {}".format(report))
+
+    async def wait(self, future):
+        """
+        Waits for a warm-up running in the background for at most ``timeout`` seconds. The warm-up goes on if it
+        did not finish in time.
+
+        Args:
+            future (asyncio.Future): the running warm-up
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "The route warm-up did not finish in {} seconds. "
+                "The simulation starts while it goes on.".format(self.timeout)
+            )
+
+    async def run(self, pairs, route_host):
+        """
+        Prefetches a list of routes into the route cache.
+
+        Args:
+            pairs (list): a list of (origin, destination) coordinate pairs
+            route_host (str): url of the routing server
+
+        Returns:
+            WarmupReport: the outcome of the warm-up
+        """
+        report = WarmupReport(len(pairs))
+        cache = get_route_cache()
+        if cache is None:
+            logger.warning("The route cache is disabled. Routes are not prefetched.")
+            report.finished_at = time.time()
+            return report
+        if len(pairs) > cache.size:
+            logger.warning(
+                "The route cache holds {} routes in memory but {} are prefetched. "
+                "Increase route_cache_size to keep all of them.".format(
+                    cache.size, len(pairs)
+                )
+            )
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def prefetch(origin, destination):
+            async with semaphore:
+                path, _, _ = await request_route_to_server(
+                    origin, destination, route_host
+                )
+            if path is None:
+                report.failed += 1
+            elif (origin, destination) in cache:
+                report.fetched += 1
+            else:
+                # a fallback path of the routing policy, which is not cached
+                report.uncached += 1
+            self.report_progress(report)
+
+        await asyncio.gather(
+            *[prefetch(origin, destination) for origin, destination in pairs]
+        )
+        report.finished_at = time.time()
+        return report
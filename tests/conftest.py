@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Shared fixtures of the `simfleet` tests."""
+
+import asyncio
+
+import pytest
+
+from simfleet import utils
+from simfleet.clock import set_clock
+from simfleet.frames import EntityRegistry, set_entity_registry
+from simfleet.messaging import MessageBus, set_message_bus
+from simfleet.routing import (
+    OSRMBackend,
+    RoutingBackend,
+    RoutingPolicy,
+    set_route_cache,
+    set_routing_backend,
+    set_routing_client,
+    set_routing_policy,
+)
+from simfleet.stats import StatsAggregator, set_stats_aggregator
+
+
+def installer(setter, default):
+    """
+    Builds a fixture that installs a process-wide object for a test and
+    puts a default one back when the test finishes.
+
+    Args:
+        setter (function): the function that installs the object
+        default (function): returns the object installed after the test
+
+    Returns:
+        function: the fixture, which yields a function ``install(obj)``
+    """
+
+    @pytest.fixture
+    def install():
+        def install(obj):
+            setter(obj)
+            return obj
+
+        yield install
+        setter(default())
+
+    return install
+
+
+def nothing():
+    return None
+
+
+use_route_cache = installer(set_route_cache, nothing)
+use_routing_backend = installer(set_routing_backend, nothing)
+use_routing_client = installer(set_routing_client, nothing)
+use_routing_policy = installer(set_routing_policy, RoutingPolicy)
+use_clock = installer(set_clock, nothing)
+use_stats_aggregator = installer(set_stats_aggregator, StatsAggregator)
+use_entity_registry = installer(set_entity_registry, EntityRegistry)
+use_message_bus = installer(set_message_bus, MessageBus)
+
+
+class FakeBackend(RoutingBackend):
+    """
+    A routing backend that answers a straight path between the two points,
+    or fails if ``error`` is set.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    async def route(self, origin, destination):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return [list(origin), list(destination)], 100.0, 10.0
+
+    async def table(self, sources, destinations):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def straight_backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def failing_backend():
+    return FakeBackend(ConnectionError("routing server down"))
+
+
+@pytest.fixture
+def answering_osrm():
+    """
+    Returns a factory of OSRM backends whose servers answer every request
+    with the same JSON. The requested urls are kept in ``requested``.
+    """
+
+    def build(answer, **kwargs):
+        backend = OSRMBackend("host/", **kwargs)
+        backend.requested = []
+
+        async def get_json(url):
+            backend.requested.append(url)
+            return answer
+
+        backend.pool.get_json = get_json
+        return backend
+
+    return build
+
+
+@pytest.fixture
+def path_requests(monkeypatch):
+    """
+    Replaces the route requests of the agents with a straight path that
+    takes 10 ms to arrive, and returns the list of requested routes.
+    """
+    requests = []
+
+    async def request_path(agent, origin, destination, route_host):
+        requests.append((origin, destination))
+        await asyncio.sleep(0.01)
+        return [list(origin), list(destination)], 100.0, 10.0
+
+    monkeypatch.setattr(utils, "_request_path", request_path)
+    return requests
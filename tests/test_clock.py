@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.clock` module."""
+
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from simfleet.clock import DiscreteEventClock, RealTimeClock
+from simfleet.config import SimfleetConfig
+from simfleet.simulator import MaxTimeBehaviour, SimulatorAgent
+from simfleet.stats import StatsAggregator
+
+
+def test_discrete_event_clock_jumps_to_next_event():
+    clock = DiscreteEventClock(settle=0, start=0)
+    woken = []
+
+    async def sleeper(name, seconds):
+        await clock.sleep(seconds)
+        woken.append((name, clock.time()))
+
+    async def scenario():
+        driver = asyncio.ensure_future(clock.run())
+        await asyncio.gather(sleeper("hour", 3600), sleeper("day", 86400))
+        clock.stop()
+        await driver
+
+    started = time.time()
+    asyncio.run(scenario())
+    assert time.time() - started < 5
+    assert woken == [("hour", 3600), ("day", 86400)]
+
+
+def test_discrete_event_clock_waits_for_outstanding_work():
+    clock = DiscreteEventClock(settle=0, start=0)
+    woken = []
+
+    async def sleeper():
+        await clock.sleep(60)
+        woken.append(clock.time())
+
+    async def slow_request():
+        with clock.busy():
+            await asyncio.sleep(0.05)
+            # the clock has not moved while the request was in flight
+            woken.append(("request", clock.time()))
+
+    async def scenario():
+        driver = asyncio.ensure_future(clock.run())
+        request = asyncio.ensure_future(slow_request())
+        await asyncio.sleep(0)
+        await asyncio.gather(sleeper(), request)
+        clock.stop()
+        await driver
+
+    asyncio.run(scenario())
+    assert woken == [("request", 0), 60]
+
+
+def test_real_time_clock_is_scaled():
+    clock = RealTimeClock(time_scale=100)
+    started, clock_started = time.time(), clock.time()
+    asyncio.run(clock.sleep(20))
+    assert time.time() - started < 1
+    assert clock.time() - clock_started >= 19.5
+
+
+def test_max_time_finishes_a_discrete_event_simulation(use_clock):
+    # the behaviour wakes up exactly at the max time
+    clock = use_clock(
+        DiscreteEventClock(settle=0.001, start=1700000000.1234567)
+    )
+    simulator = SimulatorAgent.__new__(SimulatorAgent)
+    simulator.config = SimfleetConfig(max_time=60)
+    simulator.clock = clock
+    simulator.stats = StatsAggregator()
+    simulator.simulation_finished = threading.Event()
+    simulator.simulation_time = None
+    simulator._values = {"customer_agents": {}}
+
+    async def run():
+        simulator.simulation_running = True
+        simulator.simulation_init_time = clock.time()
+        driver = asyncio.ensure_future(clock.run())
+        max_time = simulator.simulation_init_time + 60
+        behaviour = MaxTimeBehaviour(start_at=datetime.fromtimestamp(max_time))
+        behaviour.agent = simulator
+        await behaviour._run()
+        clock.stop()
+        await driver
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert simulator.wait_until_finished(timeout=1)
+    assert simulator.get_simulation_time() == 60
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.frames` module."""
+
+import pytest
+
+from simfleet.customer import CustomerAgent
+from simfleet.frames import EntityRegistry, unpack
+from simfleet.utils import (
+    CUSTOMER_IN_DEST,
+    CUSTOMER_IN_TRANSPORT,
+    TRANSPORT_MOVING_TO_CUSTOMER,
+)
+
+
+def test_pack_visible_entities():
+    registry = EntityRegistry()
+    registry.transports.set_position("transport1", [39.47, -0.37])
+    registry.transports.set_status("transport1", TRANSPORT_MOVING_TO_CUSTOMER)
+    registry.transports.set_visible("transport2", False)
+    registry.transports.set_visible("transport1")
+    for i in range(100):
+        name = "customer{}".format(i)
+        registry.customers.set_position(name, [39.0 + i / 100, -0.3])
+        registry.customers.set_visible(name)
+    registry.customers.set_status("customer99", CUSTOMER_IN_DEST)
+
+    frame = unpack(registry.pack(epoch=2, cursor=40))
+
+    assert (frame["epoch"], frame["cursor"]) == (2, 40)
+    transports = frame["transports"]
+    assert list(transports["ids"]) == [registry.transports.slot("transport1")]
+    assert transports["latitudes"][0] == pytest.approx(39.47, abs=1e-5)
+    assert transports["longitudes"][0] == pytest.approx(-0.37, abs=1e-5)
+    assert list(transports["statuses"]) == [11]
+    assert len(frame["customers"]["ids"]) == 100
+    assert frame["customers"]["statuses"][99] == 22
+    assert len(frame["stations"]["ids"]) == 0
+    assert registry.names()["customers"][99] == "customer99"
+
+
+def test_customer_in_transport_follows_the_transport(use_entity_registry):
+    registry = use_entity_registry(EntityRegistry())
+    customer = CustomerAgent("customer1@127.0.0.1", "secret")
+    customer.set_position([39.47, -0.37])
+    customer.transport_assigned = "transport1@127.0.0.1"
+    registry.transports.set_position("transport1", [39.48, -0.38])
+    assert customer.current_pos == [39.47, -0.37]
+
+    customer.status = CUSTOMER_IN_TRANSPORT
+    assert customer.current_pos == [39.48, -0.38]
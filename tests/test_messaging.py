@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.messaging` module."""
+
+import asyncio
+
+import pytest
+from spade.agent import Agent
+from spade.message import Message
+
+from simfleet.messaging import (
+    LightweightAgentMixin,
+    MessageBus,
+    MessageDeliveryError,
+)
+
+
+class XMPPClient(object):
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, msg):
+        self.sent.append(msg)
+
+
+def create_agents():
+    sender = Agent("bus_sender@127.0.0.1", "secret")
+    sender.client = XMPPClient()
+    recipient = Agent("bus_recipient@127.0.0.1", "secret")
+    recipient.received = []
+    recipient.dispatch = recipient.received.append
+    return sender, recipient
+
+
+def test_local_messages_are_delivered_as_copies():
+    sender, recipient = create_agents()
+    bus = MessageBus(local=True)
+    msg = Message(to="bus_recipient@127.0.0.1", body="hello")
+    msg.set_metadata("protocol", "TEST")
+
+    asyncio.run(bus.deliver(msg, sender))
+
+    assert sender.client.sent == []
+    assert len(recipient.received) == 1
+    received = recipient.received[0]
+    assert received is not msg
+    assert received.body == "hello"
+    assert str(received.sender) == "bus_sender@127.0.0.1"
+    assert received.get_metadata("protocol") == "TEST"
+
+
+def test_remote_messages_are_sent_through_xmpp():
+    sender, recipient = create_agents()
+    msg = Message(to="bus_recipient@127.0.0.1", body="hello")
+
+    asyncio.run(MessageBus().deliver(msg, sender))
+    asyncio.run(
+        MessageBus(local=True).deliver(Message(to="other@127.0.0.1"), sender)
+    )
+
+    assert recipient.received == []
+    assert len(sender.client.sent) == 2
+
+
+class LightweightAgent(LightweightAgentMixin, Agent):
+    async def setup(self):
+        self.was_set_up = True
+
+
+def test_lightweight_agents_start_without_xmpp(use_message_bus):
+    bus = use_message_bus(MessageBus(lightweight=True))
+    agent = LightweightAgent("lightweight@127.0.0.1", "secret")
+    asyncio.run(agent._async_start())
+    assert agent.was_set_up and agent.is_alive()
+    assert agent.client is None
+
+    with pytest.raises(MessageDeliveryError):
+        asyncio.run(bus.deliver(Message(to="other@127.0.0.1"), agent))
+    assert bus.dropped == 1
+
+    asyncio.run(agent._async_stop())
+    assert not agent.is_alive()
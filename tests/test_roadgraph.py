@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.roadgraph` module."""
+
+import json
+
+import numpy as np
+
+from simfleet.helpers import haversine_in_meters
+from simfleet.roadgraph import RoadGraph
+
+
+def line(coords, **properties):
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "LineString", "coordinates": coords},
+    }
+
+
+def test_shortest_path_respects_oneway(tmp_path):
+    # coordinates are in GeoJSON (lng, lat) order
+    a, b, c = [0.0, 0.0], [0.001, 0.0], [0.001, 0.001]
+    roads = {
+        "type": "FeatureCollection",
+        "features": [
+            line([a, b, c], oneway="yes"),
+            line([c, a]),  # shorter two-way diagonal
+        ],
+    }
+    filename = str(tmp_path / "roads.geojson")
+    with open(filename, "w") as f:
+        json.dump(roads, f)
+    graph = RoadGraph.load(filename)
+
+    source = graph.nearest_node([0, 0])
+    target = graph.nearest_node([0.001, 0.001])
+    nodes, distance, duration = graph.shortest_path(source, target)
+    assert nodes == [source, target]
+    assert distance > 0 and duration > 0
+
+    middle = graph.nearest_node([0.0, 0.001])
+    nodes, _, _ = graph.shortest_path(middle, source)
+    assert nodes == [middle, target, source]
+
+    npz = str(tmp_path / "roads.npz")
+    graph.save(npz)
+    assert RoadGraph.load(npz).shortest_path(middle, source)[0] == nodes
+
+
+def test_nearest_node_matches_full_scan():
+    rng = np.random.RandomState(0)
+    lats = 39.45 + rng.rand(500) * 0.05
+    lngs = -0.40 + rng.rand(500) * 0.05
+    graph = RoadGraph(lats, lngs, np.zeros(501), [], [], [])
+    points = [[39.46, -0.38], [39.449, -0.401], [39.6, -0.2], [0, 0]]
+    for point in points:
+        distances = haversine_in_meters(point[0], point[1], lats, lngs)
+        assert graph.nearest_node(point) == int(np.argmin(distances))
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.routing` module."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from simfleet.routing import (
+    CircuitBreaker,
+    CircuitOpenError,
+    HostPool,
+    NoRouteError,
+    RouteCache,
+    RoutingClient,
+    RoutingPolicy,
+    decode_polyline,
+    route_key,
+)
+
+
+def test_route_key_is_quantized():
+    assert route_key([39.4700001, -0.3700001], [39.48, -0.38]) == route_key(
+        [39.47, -0.37], [39.48, -0.38]
+    )
+
+
+def test_route_cache_lru_eviction():
+    cache = RouteCache(size=2)
+    cache.put([0, 0], [1, 1], [[0, 0], [1, 1]], 10.0, 2.0)
+    cache.put([0, 0], [2, 2], [[0, 0], [2, 2]], 20.0, 4.0)
+    assert cache.get([0, 0], [1, 1]) is not None
+    cache.put([0, 0], [3, 3], [[0, 0], [3, 3]], 30.0, 6.0)
+    assert cache.get([0, 0], [2, 2]) is None
+    assert cache.get([0, 0], [1, 1]) == ([[0, 0], [1, 1]], 10.0, 2.0)
+
+
+def test_route_cache_disk_tier_survives_reopen(tmp_path):
+    filename = str(tmp_path / "routes.db")
+    cache = RouteCache(size=10, filename=filename)
+    cache.put([0, 0], [1, 1], [[0, 0], [0.5, 0.5], [1, 1]], 10.0, 2.0)
+    cache.close()
+
+    cache = RouteCache(size=10, filename=filename)
+    path = [[0, 0], [0.5, 0.5], [1, 1]]
+    assert cache.get([0, 0], [1, 1]) == (path, 10.0, 2.0)
+    cache.close()
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    breaker.cooldown = 0
+    assert breaker.allow()  # the half-open probe
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_routing_policy_stops_retrying_when_the_circuit_opens(failing_backend):
+    backend = failing_backend
+    policy = RoutingPolicy(retries=5, backoff=0, breaker_threshold=3)
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.route(backend, "host", [0, 0], [1, 1]))
+    assert backend.calls == 3
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.route(backend, "host", [0, 0], [1, 1]))
+    assert backend.calls == 3
+
+
+def test_routing_policy_does_not_retry_missing_routes(answering_osrm):
+    backend = answering_osrm({"code": "NoRoute", "message": "Impossible"})
+    policy = RoutingPolicy(retries=5, backoff=0, breaker_threshold=1)
+
+    with pytest.raises(NoRouteError):
+        asyncio.run(policy.route(backend, "host", [0, 0], [1, 1]))
+    assert len(backend.requested) == 1
+    assert policy.get_breaker(backend).state == CircuitBreaker.CLOSED
+
+
+def test_routing_policy_fallback_routes(use_route_cache):
+    origin, destination = [39.47, -0.37], [39.48, -0.38]
+    no_fallback = RoutingPolicy().fallback_route(origin, destination)
+    assert no_fallback == (None, None, None)
+
+    path, distance, duration = RoutingPolicy(
+        fallback="straight_line", fallback_speed=36
+    ).fallback_route(origin, destination)
+    assert path == [origin, destination]
+    assert distance == pytest.approx(1400, rel=0.05)
+    assert duration == pytest.approx(distance / 10)
+
+    cache = use_route_cache(RouteCache(size=10))
+    neighbour = [[39.4701, -0.3701], [39.4801, -0.3801]]
+    cache.put(neighbour[0], neighbour[-1], neighbour, 2000.0, 200.0)
+    path, distance, _ = RoutingPolicy(fallback="neighbour").fallback_route(
+        origin, destination
+    )
+    assert path[0] == origin and path[-1] == destination and len(path) == 4
+    assert distance > 2000.0
+
+
+def test_host_pool_weighted_round_robin():
+    pool = HostPool([{"url": "a/", "weight": 2}, "b/"])
+    picks = [pool.select().url for _ in range(6)]
+    assert picks.count("a/") == 4 and picks.count("b/") == 2
+    assert picks[:3] == ["a/", "b/", "a/"]
+
+
+def test_host_pool_least_outstanding_and_caps():
+    pool = HostPool(
+        ["a/", "b/"], balancing="least_outstanding", max_concurrency=1
+    )
+    a, b = pool.hosts
+    a.outstanding = 1
+    assert pool.select() is b
+    b.outstanding = 1
+    # every host is at its cap: the request waits for the least loaded one
+    assert pool.select() is a
+
+
+def test_host_pool_skips_unhealthy_hosts():
+    pool = HostPool(["a/", "b/"], max_failures=2, health_interval=60)
+    a, b = pool.hosts
+    pool.record_failure(a)
+    assert a.healthy
+    pool.record_failure(a)
+    assert not a.healthy
+    assert {pool.select().url for _ in range(4)} == {"b/"}
+    pool.record_success(a)
+    assert {pool.select().url for _ in range(4)} == {"a/", "b/"}
+
+
+class HangingClient(RoutingClient):
+    async def get_json(self, url):
+        await asyncio.sleep(10)
+
+    async def ping(self, url, timeout=None):
+        await asyncio.sleep(timeout)
+        return False
+
+
+def test_host_pool_marks_hanging_hosts_unhealthy(use_routing_client):
+    pool = HostPool(
+        ["a/", "b/"], max_failures=2, health_interval=0, timeout=0.01
+    )
+    a, b = pool.hosts
+    use_routing_client(HangingClient())
+
+    async def request():
+        for _ in range(4):
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.get_json("route")
+        assert not a.healthy and not b.healthy
+        assert a.outstanding == b.outstanding == 0
+        pool.select()
+        assert len(pool._tasks) == 2
+        await asyncio.gather(*pool._tasks)
+        assert not pool._tasks and not pool._checks
+
+    asyncio.run(request())
+
+
+def test_decode_polyline():
+    path = decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@", precision=5)
+    assert path.shape == (3, 2)
+    np.testing.assert_allclose(
+        path, [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    )
+    assert decode_polyline("").shape == (0, 2)
+
+
+def test_osrm_backend_decodes_polyline6_routes(answering_osrm):
+    route = {
+        "geometry": "_ibE_seK_ibE_seK",
+        "distance": 157.2,
+        "duration": 20.1,
+    }
+    backend = answering_osrm(
+        {"code": "Ok", "routes": [route]}, overview="simplified"
+    )
+    path, distance, duration = asyncio.run(backend.route([0, 0], [0.2, 0.2]))
+    query = "geometries=polyline6&overview=simplified"
+    assert query in backend.requested[0]
+    assert isinstance(path, list)
+    np.testing.assert_allclose(path, [[0.1, 0.2], [0.2, 0.4]])
+    assert (distance, duration) == (157.2, 20.1)
+
+
+def test_route_cache_namespaces_share_a_file(tmp_path):
+    filename = str(tmp_path / "routes.db")
+    osrm = RouteCache(size=10, filename=filename, namespace="osrm:host/")
+    osrm.put([0, 0], [1, 1], [[0, 0], [1, 1]], 10.0, 2.0)
+    osrm.close()
+
+    local = RouteCache(size=10, filename=filename, namespace="local:graph.npz")
+    assert local.get([0, 0], [1, 1]) is None
+    local.close()
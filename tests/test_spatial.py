@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.spatial` module."""
+
+import random
+
+from simfleet.helpers import haversine_in_meters
+from simfleet.spatial import GridIndex, get_station_index
+
+
+def random_position():
+    return [39.4 + random.random() * 0.2, -0.5 + random.random() * 0.2]
+
+
+def test_grid_index_nearest_matches_full_scan():
+    random.seed(0)
+    index = GridIndex(cell_size=0.005)
+    positions = {}
+    for i in range(300):
+        positions[i] = random_position()
+        index.update(i, positions[i], "free" if i % 3 else "busy")
+    # move some items to other cells
+    for i in range(0, 300, 7):
+        positions[i] = random_position()
+        index.update(i, positions[i], "free" if i % 3 else "busy")
+    index.remove(1)
+    del positions[1]
+
+    point = [39.47, -0.37]
+    nearest = index.nearest(
+        point, k=5, condition=lambda key, value: value == "free"
+    )
+
+    def distance(key):
+        return haversine_in_meters(point[0], point[1], *positions[key])
+
+    expected = sorted((key for key in positions if key % 3), key=distance)[:5]
+    assert [key for key, _ in nearest] == expected
+    assert len(index) == 299
+
+
+def test_station_index_is_reused_and_filters_free_places():
+    stations = {
+        "near@host": {"position": [39.47, -0.37], "status": "BUSY_STATION"},
+        "far@host": {"position": [39.50, -0.40], "status": "FREE_STATION"},
+    }
+    index = get_station_index(stations)
+    assert get_station_index(dict(stations), index) is index
+    near = {"near@host": stations["near@host"]}
+    assert get_station_index(near, index) is not index
+
+    point = [39.471, -0.371]
+    nearest = index.nearest(point, k=2)
+    assert [key for key, _ in nearest] == ["near@host", "far@host"]
+    free = index.nearest(
+        point, condition=lambda key, status: status == "FREE_STATION"
+    )
+    assert [key for key, _ in free] == ["far@host"]
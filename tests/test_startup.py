@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.startup` module."""
+
+import asyncio
+
+from simfleet.startup import StartupPipeline
+
+
+class FakeBehaviour(object):
+    def __init__(self):
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class FakeAgent(object):
+    running = 0
+    max_running = 0
+
+    def __init__(self, jid, failures=0, hangs=0):
+        self.jid = jid
+        self.failures = failures
+        self.hangs = hangs
+        self.attempts = 0
+        self.behaviours = []
+        self.client = None
+
+    async def start(self):
+        FakeAgent.running += 1
+        FakeAgent.max_running = max(FakeAgent.max_running, FakeAgent.running)
+        try:
+            await asyncio.sleep(0.001)
+            self.attempts += 1
+            if self.attempts <= self.failures:
+                raise ConnectionError("login failed")
+            self.client = FakeClient()
+            # setup
+            self.behaviours.append(FakeBehaviour())
+            if self.attempts <= self.hangs:
+                await asyncio.sleep(10)
+        finally:
+            FakeAgent.running -= 1
+
+
+def test_pipeline_bounds_concurrency_and_retries():
+    FakeAgent.max_running = 0
+    agents = [FakeAgent("agent{}@localhost".format(i)) for i in range(50)]
+    agents[3].failures = 2
+    agents[7].failures = 10
+    pipeline = StartupPipeline(
+        window=5, max_window=5, retries=2, retry_delay=0
+    )
+
+    report = asyncio.run(pipeline.run(agents))
+
+    assert FakeAgent.max_running <= 5
+    assert report.started == 49
+    assert report.failed == ["agent7@localhost"]
+    assert report.retried == 4
+    assert agents[3].attempts == 3
+
+
+def test_pipeline_window_adapts_to_latency():
+    pipeline = StartupPipeline(window=2, max_window=50)
+    for _ in range(100):
+        pipeline._adapt(latency=0.01)
+    grown = pipeline.window
+    assert grown > 10
+    pipeline._adapt(latency=0.1)
+    assert pipeline.window == grown // 2
+    pipeline._adapt(failed=True)
+    assert pipeline.window == grown // 4
+
+
+def test_pipeline_retry_undoes_partial_start():
+    agent = FakeAgent("agent@localhost", hangs=1)
+    constructed = FakeBehaviour()
+    agent.behaviours.append(constructed)
+    pipeline = StartupPipeline(
+        window=1, retries=1, retry_delay=0, timeout=0.05
+    )
+    clients = []
+    reset_agent = pipeline.reset_agent
+
+    async def reset(agent, behaviours=0):
+        clients.append(agent.client)
+        await reset_agent(agent, behaviours)
+
+    pipeline.reset_agent = reset
+
+    report = asyncio.run(pipeline.run([agent]))
+
+    assert report.started == 1
+    assert report.retried == 1
+    assert len(clients) == 1 and not clients[0].running
+    assert agent.client.running
+    assert len(agent.behaviours) == 2
+    assert agent.behaviours[0] is constructed
+    assert not any(behaviour.killed for behaviour in agent.behaviours)
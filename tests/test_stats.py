@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.stats` module."""
+
+import pytest
+
+from simfleet.customer import CustomerAgent, CustomerStrategyBehaviour
+from simfleet.stats import StatsAggregator
+
+
+def test_stats_aggregator_averages():
+    stats = StatsAggregator()
+    stats.customer_started("c1", 0)
+    stats.customer_started("c2", 10)
+    stats.customer_picked_up("c1", 0, 30)
+    stats.customer_in_destination("c1", 0, 100)
+
+    averages = stats.get_averages(now=50)
+    assert averages["waiting"] == pytest.approx((30 + 40) / 2)
+    assert averages["totaltime"] == pytest.approx(100)
+
+    stats.transport_travelled("t1", 1000)
+    stats.transport_travelled("t1", 500)
+    stats.transport_travelled("t2", 500)
+    stats.transport_travelled("t3", 0)
+    stats.transport_charged("t1", 60)
+    averages = stats.get_averages(now=50)
+    assert averages["distance"] == pytest.approx(1000)
+    assert averages["t_charging"] == pytest.approx(60)
+    assert averages["t_waiting"] == 0
+
+
+def test_stats_aggregator_counts_arrivals_once():
+    stats = StatsAggregator()
+    arrived = []
+    stats.watch_arrivals(arrived.append)
+    stats.customer_started("c1", 0)
+    stats.customer_in_destination("c1", 0, 10)
+    stats.customer_in_destination("c1", 0, 10)
+    stats.customer_in_destination("unknown", 0, 10)
+    assert stats.customers_arrived == 1
+    assert arrived == ["c1"]
+
+    stats.forget_customers(["c1"])
+    assert stats.customers_arrived == 0
+
+
+def test_customers_are_counted_with_any_strategy(use_stats_aggregator):
+    class CustomStrategy(CustomerStrategyBehaviour):
+        async def on_start(self):  # does not call super()
+            pass
+
+        async def run(self):
+            pass
+
+    stats = use_stats_aggregator(StatsAggregator())
+    customer = CustomerAgent("counted@127.0.0.1", "secret")
+    customer.strategy = CustomStrategy
+    customer.add_behaviour = lambda behaviour, template=None: None
+    customer.run_strategy()
+    end_time = customer.init_time + 60
+    stats.customer_in_destination(customer.name, customer.init_time, end_time)
+    assert stats.customers_arrived == 1
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.stream` module."""
+
+import asyncio
+import json
+
+from aiohttp import web as aioweb
+from aiohttp.test_utils import TestClient, TestServer
+
+from simfleet.stream import EntityStream
+
+
+class Entities(object):
+    """
+    Returns a full snapshot for new observers and a delta with one moved
+    transport otherwise.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.cursor = 0
+
+    def __call__(self, cursor, epoch, tree):
+        self.calls.append(cursor)
+        self.cursor += 1
+        return {
+            "transports": [{"id": "transport1", "position": [39.47, -0.37]}],
+            "customers": [],
+            "stations": [],
+            "stats": {},
+            "cursor": self.cursor,
+            "epoch": 1,
+            "full": cursor is None,
+        }
+
+
+def test_frames_are_serialized_once_per_cursor():
+    entities = Entities()
+    stream = EntityStream(entities)
+    assert stream.get_frame(None, None) is stream.get_frame(None, None)
+    stream.get_frame(3, 1)
+    assert entities.calls == [None, 3]
+
+
+def test_stream_sends_server_sent_events():
+    entities = Entities()
+    stream = EntityStream(entities, fps=100)
+
+    async def scenario():
+        app = aioweb.Application()
+        app.router.add_get("/stream", stream.handle)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get("/stream")
+            assert response.headers["Content-Type"] == "text/event-stream"
+            events = []
+            while len(events) < 2:
+                line = (await response.content.readline()).decode()
+                if line.startswith("data: "):
+                    events.append(json.loads(line[len("data: "):]))
+            response.close()
+        await stream.close()
+        return events
+
+    events = asyncio.run(scenario())
+    assert events[0]["full"] is True
+    assert events[1]["full"] is False
+    assert entities.calls[:2] == [None, 1]
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.utils` module."""
+
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from simfleet import utils
+from simfleet.helpers import distance_in_meters
+from simfleet.routing import OSRMBackend
+from simfleet.utils import (
+    PathCursor,
+    chunk_path,
+    current_version,
+    next_version,
+    request_table_to_server,
+)
+
+
+class TableRoutingClient(object):
+    """
+    A routing client that answers table requests with the latitude
+    difference of the coordinates.
+    """
+
+    def __init__(self):
+        self.requests = 0
+
+    async def get_json(self, url):
+        self.requests += 1
+        parsed = urlsplit(url)
+        coords = parsed.path.split("/")[-1].split(";")
+        query = parse_qs(parsed.query)
+        sources = [int(i) for i in query["sources"][0].split(";")]
+        destinations = [int(i) for i in query["destinations"][0].split(";")]
+        lats = [float(coord.split(",")[1]) for coord in coords]
+        matrix = [
+            [abs(lats[s] - lats[d]) for d in destinations] for s in sources
+        ]
+        return {"durations": matrix, "distances": matrix}
+
+
+def test_request_table_is_split_in_blocks(
+    use_routing_client, use_routing_backend
+):
+    client = use_routing_client(TableRoutingClient())
+    use_routing_backend(OSRMBackend("http://osrm/", max_table_size=4))
+    sources = [[float(i), 0.0] for i in range(3)]
+    destinations = [[float(i), 0.0] for i in range(10, 17)]
+    durations, distances = asyncio.run(
+        request_table_to_server(sources, destinations)
+    )
+    assert client.requests > 1
+    assert durations == [
+        [abs(s[0] - d[0]) for d in destinations] for s in sources
+    ]
+    assert distances == durations
+
+
+def test_chunk_path_splits_segments_by_speed():
+    path = [[39.47, -0.37], [39.47, -0.37], [39.48, -0.37], [39.4801, -0.37]]
+    speed_in_kmh = 360  # 100 meters per step
+    chunks = chunk_path(path, speed_in_kmh, method="geodesic")
+
+    first_segment = distance_in_meters(path[1], path[2])
+    assert len(chunks) == int(first_segment // 100) + 2
+    first_chunk = distance_in_meters(path[0], chunks[0])
+    assert first_chunk == pytest.approx(100, rel=1e-3)
+    assert chunks[-2] == path[2]
+    assert chunks[-1] == path[-1]
+
+    for method in ("haversine", "equirectangular"):
+        approximated = chunk_path(path, speed_in_kmh, method=method)
+        assert len(approximated) == len(chunks)
+
+
+def test_path_cursor_interpolates_on_demand():
+    path = [[39.47, -0.37], [39.47, -0.37], [39.48, -0.37], [39.48, -0.36]]
+    cursor = PathCursor(path, method="geodesic")
+    first_segment = distance_in_meters(path[0], path[2])
+
+    position, distance = cursor.advance(100)
+    assert distance == 100
+    travelled = distance_in_meters(path[0], position)
+    assert travelled == pytest.approx(100, rel=1e-3)
+
+    position, _ = cursor.advance(first_segment - 100)
+    assert position == pytest.approx(path[2])
+    assert cursor
+
+    position, distance = cursor.advance(cursor.length)
+    assert position is path[-1]
+    assert distance == pytest.approx(distance_in_meters(path[2], path[3]))
+    assert not cursor
+
+
+def test_version_increases():
+    last = current_version()
+    assert next_version() == last + 1
+    assert current_version() == last + 1
+
+
+def test_concurrent_path_requests_are_coalesced(path_requests):
+    async def burst():
+        return await asyncio.gather(
+            utils.request_path(None, [39.47, -0.37], [39.48, -0.38], "host"),
+            utils.request_path(
+                None, [39.470001, -0.37], [39.48, -0.38], "host"
+            ),
+            utils.request_path(None, [39.47, -0.37], [39.49, -0.38], "host"),
+        )
+
+    first, second, other = asyncio.run(burst())
+
+    assert len(path_requests) == 2
+    assert second == first
+    assert second[0] is not first[0]
+    assert other[0][-1] == [39.49, -0.38]
+    assert utils._inflight_paths == {}
+
+
+def test_coalesced_requests_survive_a_cancelled_leader(path_requests):
+    async def burst():
+        origin, destination = [39.47, -0.37], [39.48, -0.38]
+        leader = asyncio.ensure_future(
+            utils.request_path(None, origin, destination, "host")
+        )
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(
+            utils.request_path(None, origin, destination, "host")
+        )
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    path, distance, _ = asyncio.run(burst())
+
+    assert len(path_requests) == 2
+    assert path == [[39.47, -0.37], [39.48, -0.38]] and distance == 100.0
+    assert utils._inflight_paths == {}
+
+
+def test_coalesced_requests_share_errors(monkeypatch):
+    async def fake_request_path(agent, origin, destination, route_host):
+        await asyncio.sleep(0.01)
+        raise ConnectionError("routing agent down")
+
+    monkeypatch.setattr(utils, "_request_path", fake_request_path)
+
+    async def burst():
+        return await asyncio.gather(
+            utils.request_path(None, [39.47, -0.37], [39.48, -0.38], "host"),
+            utils.request_path(None, [39.47, -0.37], [39.48, -0.38], "host"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(burst())
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert utils._inflight_paths == {}
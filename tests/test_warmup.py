@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `simfleet.warmup` module."""
+
+import asyncio
+
+from simfleet.routing import RouteCache, RoutingPolicy
+from simfleet.utils import request_path
+from simfleet.warmup import RouteWarmup
+
+
+def test_warmup_pairs_include_the_closest_transports():
+    warmup = RouteWarmup(neighbours=1)
+    transports = [[39.47, -0.37], [39.50, -0.40], None]
+    customers = [
+        ([39.471, -0.371], [39.48, -0.38]),
+        ([39.471, -0.371], [39.48, -0.38]),
+        ([39.499, -0.399], None),
+    ]
+    pairs = warmup.pairs(transports, customers)
+    assert pairs == [
+        ([39.471, -0.371], [39.48, -0.38]),
+        ([39.47, -0.37], [39.471, -0.371]),
+        ([39.50, -0.40], [39.499, -0.399]),
+    ]
+
+
+def test_warmup_pairs_use_the_precision_of_the_cache(use_route_cache):
+    use_route_cache(RouteCache(size=10, precision=2))
+    customers = [
+        ([39.471, -0.371], [39.48, -0.38]),
+        ([39.472, -0.372], [39.48, -0.38]),
+    ]
+    pairs = RouteWarmup(neighbours=0).pairs([], customers)
+    assert pairs == [([39.471, -0.371], [39.48, -0.38])]
+
+
+def test_warmup_counts_fallback_routes_as_not_cached(
+    failing_backend, use_routing_backend, use_routing_policy, use_route_cache
+):
+    use_routing_backend(failing_backend)
+    use_routing_policy(RoutingPolicy(retries=0, fallback="straight_line"))
+    use_route_cache(RouteCache(size=10))
+
+    pairs = [([39.47, -0.37], [39.48, -0.38])]
+    report = asyncio.run(RouteWarmup().run(pairs, "host"))
+
+    assert (report.fetched, report.uncached, report.failed) == (0, 1, 0)
+
+
+def test_warmup_wait_is_bounded():
+    async def wait():
+        warmup = asyncio.ensure_future(asyncio.sleep(0.05, result="done"))
+        await RouteWarmup(timeout=0.01).wait(warmup)
+        assert not warmup.done()
+        # the warm-up goes on in the background
+        assert await warmup == "done"
+
+    asyncio.run(wait())
+
+
+def test_warmup_prefetches_routes_for_request_path(
+    straight_backend, use_routing_backend, use_route_cache
+):
+    use_routing_backend(straight_backend)
+    cache = use_route_cache(RouteCache(size=10))
+    pairs = [
+        ([39.47, -0.37], [39.48, -0.38]),
+        ([39.49, -0.39], [39.48, -0.38]),
+    ]
+    report = asyncio.run(RouteWarmup(concurrency=1).run(pairs, "host"))
+    assert (report.fetched, report.failed) == (2, 0)
+    assert len(cache) == 2
+
+    # the prefetched route is returned without requesting it (no agent needed)
+    path, distance, _ = asyncio.run(
+        request_path(None, [39.47, -0.37], [39.48, -0.38], "host")
+    )
+    assert path == [[39.47, -0.37], [39.48, -0.38]] and distance == 100.0
+    assert straight_backend.calls == 2